@@ -2,14 +2,15 @@ import pendulum
 from airflow.decorators import dag, task
 
 # Pipeline imports
+# The scheduler re-parses this file every cycle: only lightweight modules are imported
+# here, the pipeline modules (pandas, pyarrow, xgboost, yfinance...) are imported
+# inside the tasks. Check with airflow/scripts/check_dag_import_time.py.
 import logging
 import os
+from contextlib import contextmanager
 from pathlib import Path
-from src.config import get_db_config
-from src.init_db import init_db, verify_db
-from src.update_db import update_db, get_latest_date_in_db, save_permanent_backup_parquet, save_prediction, create_prediction_table
-from src.xgboost_training import training_task
-from src.data_fetching import pull_data_from_yfinance
+from src.config import get_db_config, get_horizons, get_symbols
+from src.symbols import file_prefix, symbol_lake_dir
 
 from datetime import datetime, timedelta
 
@@ -18,6 +19,26 @@ logger = logging.getLogger(__name__)
 CURRENT_DIR = Path(__file__).resolve().parent.parent
 DATA_LAKE_PATH = CURRENT_DIR / "data_lake" / "btc_usd"
 output_dir = os.getenv("DATA_LAKE_PATH", DATA_LAKE_PATH)
+# Each ticker gets its own directory next to the BTC-USD one (data_lake/<symbol_slug>)
+lake_root = os.getenv("DATA_LAKE_ROOT", Path(output_dir).parent)
+MODEL_PATH = CURRENT_DIR / "shared_models"
+
+
+@contextmanager
+def instrumented(name, symbol=None):
+    """
+    Measures a stage of a task under the Airflow run_id and saves it to the
+    pipeline_runs table (see src.instrumentation).
+    """
+    from airflow.operators.python import get_current_context
+    from src.instrumentation import flush_spans, stage, start_run
+
+    start_run(get_current_context()["run_id"])
+    try:
+        with stage(name, symbol) as span:
+            yield span
+    finally:
+        flush_spans()
 
 
 # Default arguments for the DAG (retries, owner, etc.)
@@ -43,99 +64,173 @@ default_args = {
 def finance_ml_pipeline():
 
     @task
-    def init_db_if_necessary(output_dir: str) -> str:
+    def init_db_if_necessary(lake_root: str) -> str:
+        from src.init_db import bootstrap_pending, init_db, migrate_db, verify_db
+
         db_config = get_db_config()
-        if verify_db(db_config) is False:
-            logger.info("Initializing database...")
-            init_db(output_dir)
-        return str(output_dir)  # Pass the output_dir to the next task
+        bootstrap_dir = symbol_lake_dir(lake_root, "BTC-USD")
+        with instrumented("init_db"):
+            # A partial bootstrap leaves the table behind, its checkpoint tells it apart
+            if verify_db(db_config) is False or bootstrap_pending(bootstrap_dir):
+                logger.info("Initializing database...")
+                init_db(bootstrap_dir, db_config)
+            migrate_db(db_config)
+        return str(lake_root)  # Pass the lake_root to the next task
 
     @task(multiple_outputs=True)
-    def extract_data(output_dir: str) -> str:
+    def extract_data(lake_root: str) -> dict:
+        from src.data_fetching import pull_data_for_symbols
+        from src.instrumentation import parquet_rows
+        from src.update_db import get_latest_date_in_db
+
         logging.getLogger("src").parent = logging.getLogger("airflow.task")
         # Get database configuration
         db_config = get_db_config()
+        symbols = get_symbols()
         
-        # Calculate dates
-        start_date = get_latest_date_in_db(db_config)
+        # Calculate dates, each symbol from its own latest date
+        start_dates = {symbol: get_latest_date_in_db(db_config, symbol) for symbol in symbols}
         end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
         
-        logger.info(f"Extracting data from {start_date} to {end_date}")
+        logger.info(f"Extracting {symbols} from {start_dates} to {end_date}")
         
         # Pull new data and save to parquet
-        data_path = pull_data_from_yfinance(output_dir, start_date, end_date)
+        with instrumented("fetch") as span:
+            data_paths = pull_data_for_symbols(lake_root, symbols, start_dates, end_date)
+            span.record(rows_out=sum(parquet_rows(path) for path in data_paths.values() if path))
         
-        # Return the path so downstream tasks can use it via XCom
+        # Return the paths so downstream tasks can use them via XCom
         return {
-                'data_path': data_path,
-                'output_dir': output_dir,
-                'start_date': start_date,
+                'data_paths': data_paths,
+                'lake_root': lake_root,
+                'start_dates': start_dates,
                 'end_date': end_date
             }
 
     @task
-    def backup_to_parquet(data_path: str, start_date: str, end_date: str):
+    def backup_to_parquet(data_paths: dict, start_dates: dict, end_date: str):
+        from src.instrumentation import parquet_rows
+        from src.run_state import RunState, file_hash, stage_key
+        from src.update_db import save_permanent_backup_parquet
+
         logging.getLogger("src").parent = logging.getLogger("airflow.task")
-        # Save permanent backup in parquet
-        logger.info(f"Backing up data from {data_path} for dates {start_date} to {end_date}")
-        # Assuming your function can extract dates from the data or path
-        save_permanent_backup_parquet(data_path, start_date, end_date)
+        state = RunState(lake_root)
+        # Save permanent backup in parquet, unless these bars were already backed up
+        for symbol, data_path in data_paths.items():
+            if data_path is None:
+                continue
+            logger.info(
+                f"Backing up {symbol} from {data_path} for dates {start_dates[symbol]} to {end_date}")
+            with instrumented("backup", symbol) as span:
+                span.record(rows_in=parquet_rows(data_path))
+                state.run(stage_key("backup", symbol), {"data": file_hash(data_path)},
+                          lambda: save_permanent_backup_parquet(
+                              data_path, start_dates[symbol], end_date, symbol))
 
     @task
-    def load_to_db(data_path: str):
+    def load_to_db(data_paths: dict):
+        from src.instrumentation import parquet_rows
+        from src.run_state import RunState, db_target, file_hash, stage_key
+        from src.update_db import update_db
+
         logging.getLogger("src").parent = logging.getLogger("airflow.task")
         # Update DB with new data (from parquet to postgres)
         db_config = get_db_config()
-        logger.info("Loading new data to database...")
-        update_db(db_config, data_path)
+        state = RunState(lake_root)
+        for symbol, data_path in data_paths.items():
+            if data_path is None:
+                continue
+            logger.info(f"Loading new {symbol} data to database...")
+            with instrumented("load", symbol) as span:
+                span.record(rows_in=parquet_rows(data_path), rows_out=state.run(
+                    stage_key("load", symbol),
+                    {"data": file_hash(data_path), "db": db_target(db_config)},
+                    lambda: update_db(db_config, data_path, symbol),
+                    succeeded=lambda merged: merged is not None) or 0)
 
     @task
-    def train_xgboost(output_dir: str) -> float:
+    def compact_parquet(lake_root: str):
+        from src.compaction import compact_data_lake
+
         logging.getLogger("src").parent = logging.getLogger("airflow.task")
-        # Clean Data and Train XGBoost model and get prediction
-        logger.info("Training XGBoost model...")
-        predicted_return = training_task(output_dir)
+        # Merge the daily backups into yearly files once the scratch files are consumed
+        for symbol in get_symbols():
+            logger.info(f"Compacting the {symbol} data lake...")
+            with instrumented("compact", symbol):
+                compact_data_lake(symbol_lake_dir(lake_root, symbol), prefix=file_prefix(symbol))
+
+    @task
+    def train_xgboost(lake_root: str) -> dict:
+        from src.multi_asset import train_symbols
+        from src.run_state import RunState
+
+        logging.getLogger("src").parent = logging.getLogger("airflow.task")
+        # Clean Data and Train one XGBoost model per symbol and horizon over a process
+        # pool, the features of a symbol being built once for all of its horizons
+        logger.info("Training XGBoost models...")
+        # The feature build and fit spans of the workers are saved with this one, the
+        # tickers whose data, code and parameters are unchanged keep their last model
+        with instrumented("train"):
+            predictions = train_symbols(
+                get_symbols(), lake_root, model_root=os.getenv("MODEL_DIR", MODEL_PATH),
+                start_date=os.getenv("TRAINING_START_DATE"), state=RunState(lake_root),
+                horizons=get_horizons())
         
-        # Return only the float value for the next task
-        return float(predicted_return[0])
+        # Return the predicted returns by symbol and horizon for the next task
+        return predictions
 
     @task
-    def save_model_prediction(prediction: float):
+    def save_model_prediction(predictions: dict):
+        from src.model_registry import register_models
+        from src.run_state import RunState, db_target
+        from src.update_db import create_prediction_table, save_predictions
+
         logging.getLogger("src").parent = logging.getLogger("airflow.task")
-        # Ensure prediction table exists and save the predicted return
+        # Ensure prediction table exists and save the predicted returns in one insert
         db_config = get_db_config()
-        create_prediction_table(db_config)
-        save_prediction(db_config, prediction)
-        logger.info(f"Successfully saved prediction: {prediction}")
+        with instrumented("save_predictions") as span:
+            create_prediction_table(db_config)
+            versions = register_models(
+                db_config, os.getenv("MODEL_DIR", MODEL_PATH), list(predictions), get_horizons())
+            # A retry after a later failure does not save the same predictions twice
+            saved = RunState(lake_root).run(
+                "save_predictions",
+                {"predictions": predictions, "versions": versions, "db": db_target(db_config)},
+                lambda: save_predictions(db_config, predictions, versions),
+                succeeded=lambda saved: saved is not None)
+            span.record(rows_out=saved or 0)
+        logger.info(f"Successfully saved predictions: {predictions}")
 
     # --- DAG Execution Flow ---
     
-    # Define output directory variable (could also be an Airflow Variable)
-    output_directory = "/path/to/your/output"
-    output_dir = str(os.getenv("DATA_LAKE_PATH", DATA_LAKE_PATH))
+    # Define the data lake root (could also be an Airflow Variable)
+    root = str(lake_root)
     # 1. Extract data
-    output_dir = init_db_if_necessary(output_dir)  # Ensure DB is initialized before extraction
-    extracted_data = extract_data(output_dir)
+    root = init_db_if_necessary(root)  # Ensure DB is initialized before extraction
+    extracted_data = extract_data(root)
 
     # 2. Parallel tasks: Backup and Database Load
-    # Both tasks take the output from extract_data (file_path)
+    # Both tasks take the output from extract_data (file paths)
     backup_task = backup_to_parquet(
-        data_path=extracted_data['data_path'],
-        start_date=extracted_data['start_date'],
+        data_paths=extracted_data['data_paths'],
+        start_dates=extracted_data['start_dates'],
         end_date=extracted_data['end_date']
     )    
-    load_task = load_to_db(data_path=extracted_data['data_path'])
+    load_task = load_to_db(data_paths=extracted_data['data_paths'])
+
+    # 3. Compact the data lake once both the backup and the load are done
+    compact_task = compact_parquet(lake_root=extracted_data['lake_root'])
 
-    # 3. Train the model
-    # We pass the output_dir, but we must ensure it runs AFTER the database is loaded
-    model_prediction = train_xgboost(output_dir=extracted_data['output_dir'])
+    # 4. Train the models
+    # We pass the lake_root, but we must ensure it runs AFTER the database is loaded
+    model_prediction = train_xgboost(lake_root=extracted_data['lake_root'])
 
-    # 4. Save the prediction
+    # 5. Save the predictions
     final_save = save_model_prediction(model_prediction)
 
     # Define explicit dependencies for tasks that don't pass XCom data directly
     # We want training to wait until the database load is complete
-    load_task >> model_prediction >> final_save
+    [backup_task, load_task] >> compact_task >> model_prediction >> final_save
 
 
 # Instantiate the DAG
@@ -0,0 +1,64 @@
+import pendulum
+from airflow.decorators import dag, task
+
+# Pipeline imports
+# Only lightweight modules at parse time, xgboost and pandas are imported by the task
+import logging
+import os
+from pathlib import Path
+from src.config import get_symbols
+from src.symbols import symbol_lake_dir, symbol_slug
+
+logger = logging.getLogger(__name__)
+
+CURRENT_DIR = Path(__file__).resolve().parent.parent
+DATA_LAKE_PATH = CURRENT_DIR / "data_lake" / "btc_usd"
+output_dir = os.getenv("DATA_LAKE_PATH", DATA_LAKE_PATH)
+lake_root = os.getenv("DATA_LAKE_ROOT", Path(output_dir).parent)
+MODEL_PATH = CURRENT_DIR / "shared_models"
+
+
+default_args = {
+    'owner': 'me',
+    'retries': 1,
+    'retry_delay': pendulum.duration(minutes=15),
+}
+
+
+# Runs overnight, the winning configuration is picked up by the next daily training
+@dag(
+    dag_id='tuning_pipeline',
+    default_args=default_args,
+    start_date=pendulum.datetime(2023, 1, 1, tz="UTC"),
+    schedule_interval='0 1 * * *',
+    catchup=False,
+    max_active_runs=1,
+    tags=['ml', 'tuning']
+)
+def xgboost_tuning_pipeline():
+
+    @task
+    def tune_symbol(symbol: str) -> dict:
+        from src.xgboost_training import extract_df, convert_to_float, correct_data_types, create_features_for_xgboost
+        from src.tuning import tune_xgboost
+
+        logging.getLogger("src").parent = logging.getLogger("airflow.task")
+        logger.info(f"Tuning the XGBoost hyperparameters of {symbol}...")
+        df = extract_df(symbol_lake_dir(lake_root, symbol),
+                        start_date=os.getenv("TRAINING_START_DATE"))
+        df = create_features_for_xgboost(correct_data_types(convert_to_float(df)))
+        model_dir = os.path.join(str(os.getenv("MODEL_DIR", MODEL_PATH)), symbol_slug(symbol))
+        n_trials = os.getenv("TUNING_TRIALS")
+        return tune_xgboost(df, n_trials=int(n_trials) if n_trials else None, model_dir=model_dir)
+
+    # One task per ticker, run one after the other so each gets the whole core budget
+    previous = None
+    for symbol in get_symbols():
+        current = tune_symbol.override(task_id=f"tune_{symbol_slug(symbol)}")(symbol)
+        if previous is not None:
+            previous >> current
+        previous = current
+
+
+# Instantiate the DAG
+dag_instance = xgboost_tuning_pipeline()
@@ -0,0 +1,76 @@
+"""
+Measures how long each DAG file takes to import and checks that parsing it pulls in
+no heavy library. The scheduler re-parses the DAG files every cycle, so the pipeline
+modules must only be imported inside the tasks.
+
+Usage (with the etl/ directory on the PYTHONPATH, as in the Airflow containers):
+    python airflow/scripts/check_dag_import_time.py --budget 0.5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+DAGS_DIR = Path(__file__).resolve().parent.parent / "dags"
+
+# Top-level packages that must not be imported while parsing a DAG file
+HEAVY_MODULES = ["xgboost", "sklearn", "pandas", "numpy", "pyarrow", "yfinance", "psycopg2"]
+
+# Runs in a fresh interpreter: Airflow itself is imported first and excluded from the
+# measure, then the DAG file is timed and the newly imported modules are listed.
+PROBE = """
+import importlib.util, json, sys, time
+import pendulum
+import airflow.decorators
+before = set(sys.modules)
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("dag_under_test", sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+elapsed = time.perf_counter() - start
+new = sorted({name.split(".")[0] for name in set(sys.modules) - before})
+print(json.dumps({"seconds": elapsed, "new_modules": new}))
+"""
+
+
+def probe_dag(path, runs=3):
+    """
+    Imports a DAG file in `runs` fresh interpreters.
+    Returns:
+        dict: The best import time in seconds and the top-level modules it imported.
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE, str(path)],
+                                check=True, capture_output=True, text=True, env=os.environ)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        "seconds": min(result["seconds"] for result in results),
+        "new_modules": results[0]["new_modules"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the DAG files import fast and light.")
+    parser.add_argument("--dags-dir", default=str(DAGS_DIR))
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="Maximum import time of one DAG file in seconds.")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = []
+    for path in sorted(Path(args.dags_dir).glob("*.py")):
+        result = probe_dag(path, args.runs)
+        heavy = [name for name in result["new_modules"] if name in HEAVY_MODULES]
+        print(f"{path.name}: {result['seconds'] * 1000:.1f} ms"
+              + (f", heavy imports: {', '.join(heavy)}" if heavy else ""))
+        if heavy:
+            failures.append(f"{path.name} imports {', '.join(heavy)} at parse time")
+        if result["seconds"] > args.budget:
+            failures.append(
+                f"{path.name} took {result['seconds']:.3f}s to import (budget {args.budget}s)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,153 @@
+import logging
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from app.metrics import CACHE_HITS, CACHE_MISSES
+from app.model import DEFAULT_HORIZON
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_payload(payload):
+    """
+    Returns the (symbol, horizon) cache key of a notification payload "<symbol>:<horizon>",
+    a bare symbol standing for the default horizon.
+    """
+    symbol, _, horizon = payload.partition(":")
+    return symbol, int(horizon) if horizon else DEFAULT_HORIZON
+
+
+class PredictionCache:
+    """
+    In-process cache of the latest prediction of each symbol and horizon.
+    Entries expire after `ttl` seconds as a fallback, and are refreshed eagerly by
+    the PredictionListener when the ETL notifies a new prediction.
+    """
+
+    def __init__(self, loader, ttl=300.0):
+        self.loader = loader
+        self.ttl = ttl
+        self._entries = {}
+        # Sequence number of the latest load started per key, until it completes
+        self._loading = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached prediction, loading it from the database when missing or stale.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            CACHE_HITS.inc()
+            return entry[0]
+        CACHE_MISSES.inc()
+        return self.refresh(key)
+
+    def refresh(self, key):
+        """
+        Loads the prediction of a key and caches it. The query runs outside the lock,
+        so a slow one does not hold up the other keys; a load overtaken by a later
+        refresh or invalidation of its key is returned but not cached.
+        """
+        with self._lock:
+            self._sequence += 1
+            sequence = self._loading[key] = self._sequence
+        try:
+            value = self.loader(key)
+        except Exception:
+            with self._lock:
+                if self._loading.get(key) == sequence:
+                    del self._loading[key]
+            raise
+        with self._lock:
+            if self._loading.get(key) == sequence:
+                del self._loading[key]
+                # Misses are not cached so that the first prediction shows up immediately
+                if value is not None:
+                    self._entries[key] = (value, time.monotonic() + self.ttl)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._loading.clear()
+            else:
+                self._entries.pop(key, None)
+                self._loading.pop(key, None)
+
+
+class PredictionListener(threading.Thread):
+    """
+    Background thread holding a dedicated LISTEN connection and refreshing the cache
+    on every notification. It reconnects with a capped backoff if the connection drops.
+    """
+
+    def __init__(self, db_config, cache, channel="new_prediction", poll_interval=5.0):
+        super().__init__(name="prediction-listener", daemon=True)
+        self.db_config = db_config
+        self.cache = cache
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def _connect(self):
+        connection = psycopg2.connect(
+            user=self.db_config["user"],
+            password=self.db_config["pass"],
+            host=self.db_config["host"],
+            port=self.db_config["port"],
+            database=self.db_config["name"]
+        )
+        connection.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}";')
+        logger.info(f"Listening for new predictions on '{self.channel}'.")
+        return connection
+
+    def _listen(self, connection):
+        while not self._stop_event.is_set():
+            ready, _, _ = select.select([connection], [], [], self.poll_interval)
+            if not ready:
+                continue
+            connection.poll()
+            if connection.notifies:
+                # The payload is the symbol and horizon of the new prediction
+                payloads = {notify.payload for notify in connection.notifies}
+                connection.notifies.clear()
+                logger.info(f"New prediction notified for: {', '.join(sorted(payloads))}")
+                for payload in payloads:
+                    key = parse_payload(payload)
+                    try:
+                        self.cache.refresh(key)
+                    except Exception as e:
+                        logger.error(f"Failed to refresh the prediction cache: {e}")
+                        self.cache.invalidate(key)
+
+    def run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                backoff = 1.0
+                self._listen(connection)
+            except Exception as e:
+                # Notifications may have been missed, fall back to a reload
+                self.cache.invalidate()
+                logger.error(f"Prediction listener failed, retrying in {backoff}s: {e}")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def stop(self):
+        self._stop_event.set()
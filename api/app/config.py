@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 
 
 def get_db_config():
@@ -31,3 +32,64 @@ def get_origins():
     return [
         os.getenv("BACKEND_CORS_ORIGINS"),
     ]
+
+
+def get_pool_config():
+    """
+    Pulls connection pool settings from environment variables with default values.
+    Returns:
+        dict: Pool bounds, checkout timeout and idle time before a health check.
+    """
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        "check_idle_after": float(os.getenv("DB_POOL_CHECK_IDLE_AFTER", "30")),
+    }
+
+
+def get_cache_config():
+    """
+    Pulls prediction cache settings from environment variables with default values.
+    Returns:
+        dict: Cache TTL in seconds and the Postgres channel notified on new predictions.
+    """
+    return {
+        "ttl": float(os.getenv("PREDICTION_CACHE_TTL", "300")),
+        "channel": os.getenv("PREDICTION_CHANNEL", "new_prediction"),
+    }
+
+
+def get_model_config():
+    """
+    Pulls model serving settings from environment variables with default values.
+    Returns:
+        dict: Directory of the shared model artifacts, how often to check it for a new
+            one, and how many model versions to keep loaded.
+    """
+    default_dir = Path(__file__).resolve().parents[2] / "shared_models"
+    return {
+        "model_dir": os.getenv("MODEL_DIR", str(default_dir)),
+        "check_interval": float(os.getenv("MODEL_CHECK_INTERVAL", "30")),
+        "cache_size": int(os.getenv("MODEL_CACHE_SIZE", "8")),
+    }
+
+
+def get_symbols():
+    """
+    Pulls the list of served tickers from the SYMBOLS environment variable, as the ETL does.
+    Returns:
+        list: Ticker symbols, e.g. ["BTC-USD", "ETH-USD"].
+    """
+    symbols = os.getenv("SYMBOLS", "BTC-USD")
+    return [symbol.strip().upper() for symbol in symbols.split(",") if symbol.strip()]
+
+
+def get_horizons():
+    """
+    Pulls the forecast horizons from the FORECAST_HORIZONS environment variable, as the ETL does.
+    Returns:
+        list: Horizons in days a model is trained for, e.g. [1, 3, 7, 14, 30].
+    """
+    horizons = os.getenv("FORECAST_HORIZONS", "1,3,7,14,30")
+    return sorted({int(horizon) for horizon in horizons.split(",") if horizon.strip()})
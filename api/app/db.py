@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+
+from app.config import get_db_config, get_pool_config
+from app.metrics import DB_POOL_IN_USE, DB_POOL_MAX, DB_POOL_TIMEOUTS, DB_POOL_WAIT, timed_query
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe PostgreSQL connection pool.
+    Checkouts block up to `timeout` seconds when every connection is in use, and a
+    connection idle for longer than `check_idle_after` seconds is pinged before use.
+    Returned connections are kept idle up to `max_size` (unlike psycopg2's pools,
+    which close those beyond their minimum), so a burst of requests reuses them;
+    `min_size` connections are opened upfront.
+    """
+
+    def __init__(self, db_config, min_size=1, max_size=10, timeout=5.0, check_idle_after=30.0):
+        self.db_config = db_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle_after = check_idle_after
+        # Idle connections, None while the pool is closed. The slots bound the
+        # checkouts, and so the idle connections, to max_size
+        self._idle = None
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        return psycopg2.connect(
+            user=self.db_config["user"],
+            password=self.db_config["pass"],
+            host=self.db_config["host"],
+            port=self.db_config["port"],
+            database=self.db_config["name"]
+        )
+
+    def open(self):
+        self._idle = deque(self._connect() for _ in range(self.min_size))
+        logger.info(
+            f"Database pool opened (min={self.min_size}, max={self.max_size}).")
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, None
+        if idle is not None:
+            for connection in idle:
+                self._discard(connection)
+            logger.info("Database pool closed.")
+
+    def _is_healthy(self, connection):
+        if connection.closed:
+            return False
+        last_used = self._last_used.get(id(connection))
+        if last_used is None or time.monotonic() - last_used < self.check_idle_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        with self._lock:
+            # Most recently used first, the others age out through the health check
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            return self._connect()
+        if not self._is_healthy(connection):
+            logger.warning("Discarding a stale pooled connection.")
+            self._discard(connection)
+            return self._connect()
+        return connection
+
+    def _checkin(self, connection):
+        if not connection.closed:
+            with self._lock:
+                if self._idle is not None:
+                    self._last_used[id(connection)] = time.monotonic()
+                    self._idle.append(connection)
+                    return
+        self._discard(connection)
+
+    def _discard(self, connection):
+        # A new connection may reuse the id of a closed one, it must not inherit its timestamp
+        self._last_used.pop(id(connection), None)
+        if not connection.closed:
+            connection.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection, committing on success and rolling back on error.
+        """
+        if self._idle is None:
+            raise RuntimeError("Database pool is not open.")
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            DB_POOL_TIMEOUTS.inc()
+            raise pool.PoolError(
+                f"No database connection available after {self.timeout}s.")
+        connection = None
+        try:
+            connection = self._checkout()
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+            with self._lock:
+                self._in_use += 1
+            yield connection
+            connection.commit()
+        except Exception as e:
+            if connection and not connection.closed:
+                connection.rollback()  # Rollback transaction on error
+            logger.error(f"Database transaction failed: {e}")
+            raise e
+        finally:
+            if connection is not None:
+                with self._lock:
+                    self._in_use -= 1
+                self._checkin(connection)
+            self._slots.release()
+
+    def stats(self):
+        return {"in_use": self._in_use, "max_size": self.max_size}
+
+
+db_pool = ConnectionPool(get_db_config(), **get_pool_config())
+# Read at scrape time, the pool itself does no extra work
+DB_POOL_IN_USE.set_function(lambda: db_pool.stats()["in_use"])
+DB_POOL_MAX.set(db_pool.max_size)
+
+
+@contextmanager
+def get_db_connection():
+    """
+    Context manager borrowing a PostgreSQL connection from the application pool.
+    """
+    with db_pool.connection() as connection:
+        yield connection
+
+
+def check_database():
+    """
+    Runs a trivial query through the pool to verify the database is reachable.
+    """
+    try:
+        with get_db_connection() as connection:
+            with connection.cursor() as cursor, timed_query("health"):
+                cursor.execute("SELECT 1;")
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,136 @@
+import base64
+import json
+import logging
+from contextlib import ExitStack
+from datetime import datetime
+
+from app.db import get_db_connection
+from app.metrics import timed_query
+
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round-trip by the server-side cursor
+FETCH_SIZE = 500
+
+
+def encode_cursor(created_at, prediction_id):
+    """
+    Encodes the (created_at, id) keyset position of a row as an opaque token.
+    """
+    raw = f"{created_at.isoformat()}|{prediction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a token produced by encode_cursor.
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        created_at, prediction_id = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(prediction_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def build_history_query(symbol, horizon, start=None, end=None, cursor=None, order="desc",
+                        limit=100):
+    """
+    Builds the keyset-paginated query over the predictions of a symbol and horizon,
+    served by the (symbol, horizon_days, created_at, id) index.
+    Returns:
+        tuple: The SQL string and its parameters.
+    """
+    conditions = ["symbol = %s", "horizon_days = %s"]
+    params = [symbol, horizon]
+    if start is not None:
+        conditions.append("created_at >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("created_at < %s")
+        params.append(end)
+    if cursor is not None:
+        comparison = "<" if order == "desc" else ">"
+        conditions.append(f"(created_at, id) {comparison} (%s, %s)")
+        params.extend(decode_cursor(cursor))
+
+    where = f"WHERE {' AND '.join(conditions)}"
+    direction = "DESC" if order == "desc" else "ASC"
+    query = f"""
+        SELECT id, symbol, horizon_days, predicted_return_pct as value, model_version,
+               created_at, as_of_date
+        FROM predictions
+        {where}
+        ORDER BY created_at {direction}, id {direction}
+        LIMIT %s;
+    """
+    params.append(limit)
+    return query, params
+
+
+def _serialize(row):
+    prediction_id, symbol, horizon, value, model_version, created_at, as_of_date = row
+    return {
+        "id": prediction_id,
+        "symbol": symbol,
+        "horizon_days": horizon,
+        "value": float(value) if value is not None else None,
+        "model_version": model_version,
+        "created_at": str(created_at),
+        "as_of_date": str(as_of_date) if as_of_date is not None else None,
+    }
+
+
+def open_history(query, params):
+    """
+    Checks out a connection, runs a history query on a server-side cursor and fetches
+    its first batch, so that a failure is raised before any of the response is sent.
+    Returns:
+        tuple: The ExitStack releasing the cursor and the connection, the cursor and
+            the first rows, to pass to stream_history.
+    Raises:
+        psycopg2.Error, psycopg2.pool.PoolError: If the query cannot be run.
+    """
+    with ExitStack() as stack:
+        connection = stack.enter_context(get_db_connection())
+        cursor = stack.enter_context(connection.cursor(name="prediction_history"))
+        with timed_query("prediction_history"):
+            cursor.execute(query, params)
+            rows = cursor.fetchmany(FETCH_SIZE)
+        return stack.pop_all(), cursor, rows
+
+
+def stream_history(history, limit, fmt="json"):
+    """
+    Streams the rows of a query opened by open_history batch by batch, so the page
+    is never materialized in memory.
+    The JSON format yields {"items": [...], "next_cursor": ...}. The NDJSON format
+    yields one prediction per line, followed by a {"next_cursor": ...} line when
+    more rows may follow.
+    """
+    stack, cursor, rows = history
+    count = 0
+    last = None
+    with stack:
+        if fmt == "json":
+            yield '{"items": ['
+        while rows:
+            for row in rows:
+                item = json.dumps(_serialize(row))
+                if fmt == "json":
+                    yield item if count == 0 else f", {item}"
+                else:
+                    yield f"{item}\n"
+                count += 1
+                last = row
+            # The following batches are fetched while the body streams
+            rows = cursor.fetchmany(FETCH_SIZE)
+
+    next_cursor = encode_cursor(last[5], last[0]) if count == limit else None
+    if fmt == "json":
+        yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+    elif next_cursor is not None:
+        yield json.dumps({"next_cursor": next_cursor}) + "\n"
@@ -1,36 +1,88 @@
 import logging
+import os
 from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
 import psycopg2
+import psycopg2.pool
 from psycopg2.extras import RealDictCursor
-from contextlib import contextmanager
 
-from app.config import get_db_config, get_origins
+from app.cache import PredictionCache, PredictionListener
+from app.config import (
+    get_cache_config, get_db_config, get_horizons, get_model_config, get_origins, get_symbols)
+from app.db import check_database, db_pool, get_db_connection
+from app.history import build_history_query, open_history, stream_history
+from app.metrics import MetricsMiddleware, render_metrics, timed_query
+from app.model import DEFAULT_HORIZON, ModelCache, ModelStore, symbol_slug
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db_config = get_db_config()
+cache_config = get_cache_config()
+model_config = get_model_config()
+# One model store per served symbol and horizon, created on first use, sharing the loaded versions
+model_stores = {}
+served_symbols = get_symbols()
+served_horizons = get_horizons()
+# Horizon of the requests that do not name one, always one of the served horizons
+default_horizon = DEFAULT_HORIZON if DEFAULT_HORIZON in served_horizons else served_horizons[0]
+model_cache = ModelCache(max_size=model_config["cache_size"])
+
+DEFAULT_SYMBOL = "BTC-USD"
 
 
 class PredictionResponse(BaseModel):
     id: int
+    symbol: str
+    horizon_days: int
     value: float
     model_version: str
     created_at: str
 
 
+class InferenceRequest(BaseModel):
+    rows: List[Dict[str, float]] = Field(min_length=1)
+    symbol: str = DEFAULT_SYMBOL
+    horizon: int = default_horizon
+    model_version: Optional[str] = None
+
+
+class InferenceResponse(BaseModel):
+    values: List[float]
+    trained_at: Optional[str] = None
+    model_version: Optional[str] = None
+
+
+class ComparisonRequest(BaseModel):
+    rows: List[Dict[str, float]] = Field(min_length=1)
+    symbol: str = DEFAULT_SYMBOL
+    horizon: int = default_horizon
+    model_versions: List[str]
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: You could check DB connection here
+    # Startup: open the connection pool shared by all requests
     logger.info("API is starting up...")
+    db_pool.open()
+    for symbol in served_symbols:
+        for horizon in served_horizons:
+            get_model_store(symbol, horizon)
+    listener = PredictionListener(
+        get_db_config(), prediction_cache, channel=cache_config["channel"])
+    listener.start()
     yield
-    # Shutdown: Clean up resources if needed
+    # Shutdown: stop the listener and release every pooled connection
     logger.info("API is shutting down...")
+    listener.stop()
+    db_pool.close()
 
 app = FastAPI(
     title="Prediction API",
@@ -48,78 +100,250 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the CORS handling is timed too
+app.add_middleware(MetricsMiddleware)
 
 
-@contextmanager
-def get_db_connection(db_config=db_config):
+@app.get("/health", status_code=status.HTTP_200_OK)
+def health_check():
     """
-    Context manager for PostgreSQL database connection.
+    Simple health check to ensure the API is running and the database pool is usable.
     """
-    connection = None
-    try:
-        connection = psycopg2.connect(
-            user=db_config["user"],
-            password=db_config["pass"],
-            host=db_config["host"],
-            port=db_config["port"],
-            database=db_config["name"]
-        )
-        yield connection
-        connection.commit()
-    except Exception as e:
-        if connection:
-            connection.rollback()  # Rollback transaction on error
-        logger.error(f"Database transaction failed: {e}")
-        raise e
-    finally:
-        if connection:
-            connection.close()  # Always close the connection
+    return {
+        "status": "ok",
+        "message": "API is online",
+        "database": "ok" if check_database() else "unavailable",
+        "pool": db_pool.stats(),
+    }
 
 
-@app.get("/health", status_code=status.HTTP_200_OK)
-def health_check():
+@app.get("/metrics", include_in_schema=False)
+def metrics():
     """
-    Simple health check to ensure the API is running.
+    Exposes request, database, pool, cache and model metrics to Prometheus.
     """
-    return {"status": "ok", "message": "API is online"}
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
 
 
-@app.get("/predictions/latest", response_model=PredictionResponse)
-def get_latest_prediction():
+def get_model_store(symbol, horizon=default_horizon):
     """
-    Fetches the most recent prediction from the database.
+    Returns the model store of a symbol and horizon, loading its model on first use.
+    Only the configured symbols and horizons have a store, which bounds their number
+    and keeps the symbol out of the model paths otherwise.
+    Raises:
+        HTTPException: 404 if the symbol or the horizon is not served.
+    """
+    if symbol not in served_symbols:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Unknown symbol: {symbol}")
+    if horizon not in served_horizons:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Unknown horizon: {horizon}")
+    key = (symbol, horizon)
+    if key not in model_stores:
+        store = ModelStore(
+            os.path.join(model_config["model_dir"], symbol_slug(symbol)),
+            check_interval=model_config["check_interval"], cache=model_cache, horizon=horizon)
+        store.load()
+        model_stores[key] = store
+    return model_stores[key]
+
+
+def fetch_latest_prediction(key):
+    """
+    Fetches the most recent live prediction of a (symbol, horizon) key from the database,
+    or None if there is none. Backfilled predictions are left out.
     """
     query = """
-        SELECT id, predicted_return_pct as value, model_version, created_at 
+        SELECT id, symbol, horizon_days, predicted_return_pct as value, model_version, created_at 
         FROM predictions 
+        WHERE symbol = %s AND horizon_days = %s AND as_of_date IS NULL
         ORDER BY created_at DESC 
         LIMIT 1;
     """
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor, timed_query("latest_prediction"):
+            cursor.execute(query, key)
+            result = cursor.fetchone()
+
+    if result:
+        # Convert timestamp to string for JSON serialization compatibility
+        result['created_at'] = str(result['created_at'])
+    return result
+
+
+prediction_cache = PredictionCache(
+    fetch_latest_prediction, ttl=cache_config["ttl"])
+
+
+@app.get("/predictions/latest", response_model=PredictionResponse)
+def get_latest_prediction(symbol: str = DEFAULT_SYMBOL, horizon: int = Query(default_horizon, ge=1)):
+    """
+    Returns the most recent prediction of a symbol over a horizon in days, served from
+    the in-process cache.
+    """
+    try:
+        result = prediction_cache.get((symbol.upper(), horizon))
+    except (psycopg2.Error, psycopg2.pool.PoolError) as e:
+        logger.error(f"Database query error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal Database Error"
+        )
 
-    conn = None
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No predictions found in the database."
+        )
+    return result
+
+
+@app.get("/predictions/horizons", response_model=List[PredictionResponse])
+def get_latest_predictions_by_horizon(symbol: str = DEFAULT_SYMBOL):
+    """
+    Returns the most recent live prediction of a symbol for every horizon, the shortest first.
+    """
+    query = """
+        SELECT DISTINCT ON (horizon_days)
+               id, symbol, horizon_days, predicted_return_pct as value, model_version, created_at
+        FROM predictions
+        WHERE symbol = %s AND as_of_date IS NULL
+        ORDER BY horizon_days, created_at DESC;
+    """
     try:
         with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(query)
-                result = cursor.fetchone()
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor, \
+                    timed_query("latest_predictions_by_horizon"):
+                cursor.execute(query, (symbol.upper(),))
+                rows = cursor.fetchall()
+    except (psycopg2.Error, psycopg2.pool.PoolError) as e:
+        logger.error(f"Database query error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal Database Error"
+        )
+    for row in rows:
+        row['created_at'] = str(row['created_at'])
+    return rows
+
+
+@app.get("/predictions")
+def get_prediction_history(
+    symbol: str = DEFAULT_SYMBOL,
+    horizon: int = Query(default_horizon, ge=1),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=10000),
+    order: Literal["asc", "desc"] = "desc",
+    format: Literal["json", "ndjson"] = "json",
+):
+    """
+    Streams the prediction history of a symbol and horizon in [start, end), paginated
+    by keyset on (created_at, id). Pass the returned next_cursor to fetch the following page.
+    Backfilled predictions are included, dated at the close of their as_of_date.
+    """
+    try:
+        query, params = build_history_query(
+            symbol.upper(), horizon, start, end, cursor, order, limit)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # The query runs before the response starts, a failure is still a proper 500
+    try:
+        history = open_history(query, params)
+    except (psycopg2.Error, psycopg2.pool.PoolError) as e:
+        logger.error(f"Database query error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal Database Error"
+        )
+    media_type = "application/json" if format == "json" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_history(history, limit, format), media_type=media_type)
+
+
+@app.post("/predictions/infer", response_model=InferenceResponse)
+def infer(request: InferenceRequest):
+    """
+    Scores fresh feature rows with the latest trained model of a symbol and horizon,
+    or with the registered version given, in-process.
+    Each row must provide every feature listed in the model schema.
+    """
+    values, schema = score_rows(
+        request.symbol, request.rows, request.model_version, request.horizon)
+    return {"values": values.tolist(), "trained_at": schema.get("trained_at"),
+            "model_version": schema.get("version")}
 
-            if not result:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No predictions found in the database."
-                )
 
-            # Convert timestamp to string for JSON serialization compatibility
-            result['created_at'] = str(result['created_at'])
+@app.post("/predictions/compare")
+def compare(request: ComparisonRequest):
+    """
+    Scores the same feature rows with several registered versions of a model,
+    e.g. to compare a candidate with the current model before rolling it out.
+    """
+    results = {}
+    for version in request.model_versions:
+        values, schema = score_rows(request.symbol, request.rows, version, request.horizon)
+        results[version] = {"values": values.tolist(), "trained_at": schema.get("trained_at")}
+    return {"symbol": request.symbol.upper(), "results": results}
 
-            return result
 
-    except psycopg2.Error as e:
+@app.get("/models")
+def list_models(symbol: str = DEFAULT_SYMBOL, horizon: Optional[int] = Query(None, ge=1),
+                limit: int = Query(20, ge=1, le=1000)):
+    """
+    Lists the registered model versions of a symbol, of every horizon or of the one
+    given, the most recently trained first.
+    """
+    query = f"""
+        SELECT version, horizon_days, trained_at, data_hash, train_start, train_end,
+               train_rows, params, metrics
+        FROM models
+        WHERE symbol = %s{" AND horizon_days = %s" if horizon is not None else ""}
+        ORDER BY trained_at DESC
+        LIMIT %s;
+    """
+    params = [symbol.upper()] + ([horizon] if horizon is not None else []) + [limit]
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor, timed_query("models"):
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+    except (psycopg2.Error, psycopg2.pool.PoolError) as e:
         logger.error(f"Database query error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal Database Error"
         )
+    served = symbol.upper() in served_symbols
+    for row in rows:
+        # Models of a horizon no longer served are never current
+        current = {}
+        if served and row["horizon_days"] in served_horizons:
+            current = get_model_store(symbol.upper(), row["horizon_days"]).get()[1] or {}
+        row["current"] = row["version"] == current.get("version")
+    return jsonable_encoder(rows)
+
+
+def score_rows(symbol, rows, version=None, horizon=default_horizon):
+    """
+    Scores rows with a model version of a symbol and horizon, mapping the failures to
+    HTTP errors.
+    """
+    try:
+        return get_model_store(symbol.upper(), horizon).predict(rows, version)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Missing feature: {e.args[0]}")
+    except LookupError as e:
+        code = status.HTTP_404_NOT_FOUND if version else status.HTTP_503_SERVICE_UNAVAILABLE
+        raise HTTPException(status_code=code, detail=str(e))
+
 
 # Command to run the app from api/ folder :
 # python -m uvicorn src.main:app --reload
@@ -0,0 +1,102 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+# Buckets around the latency of a cached read (sub-millisecond) up to a slow query
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled, by route template and status.",
+    ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to serve an HTTP request, body included.",
+    ["method", "route"], buckets=LATENCY_BUCKETS)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Time spent executing and fetching a database query.",
+    ["query"], buckets=LATENCY_BUCKETS)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time to check a connection out of the pool.",
+    buckets=LATENCY_BUCKETS)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total", "Checkouts that gave up because every connection was in use.")
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Pooled connections currently borrowed.")
+DB_POOL_MAX = Gauge(
+    "db_pool_connections_max", "Maximum size of the connection pool.")
+CACHE_REQUESTS = Counter(
+    "prediction_cache_requests_total", "Lookups of the latest prediction cache.", ["result"])
+CACHE_HITS = CACHE_REQUESTS.labels("hit")
+CACHE_MISSES = CACHE_REQUESTS.labels("miss")
+MODEL_CACHE_REQUESTS = Counter(
+    "model_cache_requests_total", "Lookups of the booster cache by model version.", ["result"])
+MODEL_CACHE_HITS = MODEL_CACHE_REQUESTS.labels("hit")
+MODEL_CACHE_MISSES = MODEL_CACHE_REQUESTS.labels("miss")
+MODEL_LOADED = Gauge(
+    "model_loaded_timestamp_seconds", "Unix time the served model of a symbol was loaded.",
+    ["model"])
+MODEL_TRAINED = Gauge(
+    "model_trained_timestamp_seconds", "Unix time the served model of a symbol was trained.",
+    ["model"])
+MODEL_LOAD_FAILURES = Counter(
+    "model_load_failures_total", "Model artifacts that could not be loaded.", ["model"])
+
+
+@contextmanager
+def timed_query(name):
+    """
+    Observes the duration of the enclosed database query under db_query_duration_seconds.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_QUERY_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+
+def render_metrics():
+    """
+    Returns the current metrics in the Prometheus text format, and its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting requests and timing them until the last body
+    chunk is sent, streamed responses included. Requests are labelled by route
+    template rather than raw path, so the label set stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route(self, scope):
+        # Starlette stores the matched endpoint in the scope, map it back to its path
+        if self._routes is None:
+            self._routes = {
+                getattr(route, "endpoint", None): route.path for route in scope["app"].routes}
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = self._route(scope)
+            REQUEST_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - start)
+            REQUESTS.labels(scope["method"], route, str(status)).inc()
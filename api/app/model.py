@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import xgboost as xgb
+
+from app.metrics import (
+    MODEL_CACHE_HITS, MODEL_CACHE_MISSES, MODEL_LOAD_FAILURES, MODEL_LOADED, MODEL_TRAINED)
+
+
+logger = logging.getLogger(__name__)
+
+# Written by the ETL training step (etl/src/model_artifacts.py)
+MODEL_FILENAME = "xgboost_model.ubj"
+SCHEMA_FILENAME = "xgboost_model.json"
+VERSIONS_DIR = "versions"
+# Versions are the first 16 hex digits of the booster's SHA-256 (etl/src/model_artifacts.py)
+VERSION_PATTERN = re.compile(r"[0-9a-f]{16}")
+# Horizon in days of the model whose schema is SCHEMA_FILENAME
+DEFAULT_HORIZON = 7
+
+
+def schema_filename(horizon=DEFAULT_HORIZON):
+    """
+    Returns the name of the schema file of the current model of a horizon, as the ETL writes it.
+    """
+    return SCHEMA_FILENAME if horizon == DEFAULT_HORIZON else f"xgboost_model_h{horizon}.json"
+
+
+def symbol_slug(symbol):
+    """
+    Returns the directory name of a ticker, e.g. 'BTC-USD' -> 'btc_usd', as used by the ETL.
+    """
+    return symbol.lower().replace("-", "_").replace("/", "_")
+
+
+def load_booster(model_dir, schema):
+    booster = xgb.Booster()
+    booster.load_model(os.path.join(model_dir, schema["model_file"]))
+    return booster
+
+
+class ModelCache:
+    """
+    Bounded LRU cache of loaded boosters keyed by model directory and version, shared
+    by the model stores. Versions are immutable (content-addressed by the ETL), so a cached
+    booster never needs to be checked against the disk again.
+    """
+
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_dir, version, loader=None):
+        """
+        Returns the (booster, schema) pair of a version saved in model_dir, loading
+        it on a miss and evicting the least recently used version past max_size.
+        Raises:
+            LookupError: If the version does not exist.
+        """
+        key = (model_dir, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                MODEL_CACHE_HITS.inc()
+                return entry
+        MODEL_CACHE_MISSES.inc()
+        entry = loader() if loader else self._load(model_dir, version)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                (_, evicted), _ = self._entries.popitem(last=False)
+                logger.info(f"Evicted model {evicted} from the cache.")
+        return entry
+
+    def _load(self, model_dir, version):
+        # Client-given versions only ever name a directory of the registry
+        if not VERSION_PATTERN.fullmatch(version):
+            raise LookupError(f"Unknown model version: {version}")
+        version_dir = os.path.join(model_dir, VERSIONS_DIR, version)
+        try:
+            with open(os.path.join(version_dir, SCHEMA_FILENAME)) as f:
+                schema = json.load(f)
+        except FileNotFoundError:
+            raise LookupError(f"Unknown model version: {version}")
+        return load_booster(version_dir, schema), schema
+
+    def versions(self):
+        with self._lock:
+            return [version for _, version in self._entries]
+
+
+class ModelStore:
+    """
+    Serves the current model of a symbol and horizon trained by the ETL, and any
+    of its previous versions through the shared ModelCache.
+    The store only keeps the schema of its current version, the booster is held by
+    the cache alone, so the loaded boosters are bounded by its size.
+    The schema file is written last by the ETL, so a change of its modification time
+    means a complete new artifact is available. It is checked at most once every
+    `check_interval` seconds, keeping the stat off the hot path.
+    """
+
+    def __init__(self, model_dir, check_interval=30.0, cache=None, horizon=DEFAULT_HORIZON):
+        self.model_dir = model_dir
+        self.horizon = horizon
+        self.check_interval = check_interval
+        self.cache = cache or ModelCache()
+        self.schema = None
+        self._key = None
+        self.loaded_at = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def schema_path(self):
+        return os.path.join(self.model_dir, schema_filename(self.horizon))
+
+    @property
+    def name(self):
+        # Metrics label: the symbol directory, suffixed by the horizon if not the default one
+        name = os.path.basename(os.path.normpath(self.model_dir))
+        return name if self.horizon == DEFAULT_HORIZON else f"{name}_h{self.horizon}"
+
+    def load(self):
+        """
+        Loads the booster and its schema from disk.
+        Returns:
+            bool: True if a model was loaded.
+        """
+        try:
+            mtime = os.path.getmtime(self.schema_path)
+        except FileNotFoundError:
+            logger.warning(f"No model artifact found at {self.schema_path}.")
+            return False
+
+        with open(self.schema_path) as f:
+            schema = json.load(f)
+        # Saved before the registry: cached under its modification time instead
+        key = schema.get("version") or f"unversioned-{mtime}"
+        self.cache.get(self.model_dir, key, loader=self._loader(schema))
+        with self._lock:
+            self.schema, self._key = schema, key
+            self._mtime = mtime
+            self.loaded_at = time.time()
+        MODEL_LOADED.labels(self.name).set(self.loaded_at)
+        if schema.get("trained_at"):
+            MODEL_TRAINED.labels(self.name).set(
+                datetime.fromisoformat(schema["trained_at"]).timestamp())
+        logger.info(
+            f"Model loaded from {self.model_dir} (trained at {schema.get('trained_at')}).")
+        return True
+
+    def _loader(self, schema):
+        return lambda: (load_booster(self.model_dir, schema), schema)
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.path.getmtime(self.schema_path)
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            try:
+                self.load()
+            except Exception as e:
+                # Keep serving the previous booster if the new one cannot be read
+                MODEL_LOAD_FAILURES.labels(self.name).inc()
+                logger.error(f"Failed to reload the model: {e}")
+
+    def get(self, version=None):
+        """
+        Returns the (booster, schema) pair of a version, by default of the current
+        model after hot-reloading a new artifact.
+        Raises:
+            LookupError: If the version does not exist.
+        """
+        if version is not None:
+            return self.cache.get(self.model_dir, version)
+        self.reload_if_changed()
+        with self._lock:
+            schema, key = self.schema, self._key
+        if key is None:
+            return None, None
+        # Reloaded from disk if the cache evicted it
+        return self.cache.get(self.model_dir, key, loader=self._loader(schema))
+
+    def predict(self, rows, version=None):
+        """
+        Scores feature rows in-process.
+        Args:
+            rows (list): Dicts mapping each schema feature to its value.
+            version (str, optional): Model version to use, the current one by default.
+        Returns:
+            tuple: Predicted returns in percent, and the schema of the model used.
+        Raises:
+            LookupError: If no model is loaded or the version does not exist.
+            KeyError: If a row misses a feature of the schema.
+        """
+        booster, schema = self.get(version)
+        if booster is None:
+            raise LookupError("No model is loaded.")
+        features = schema["features"]
+        # Shaped explicitly, so that no rows still make a (0, n_features) matrix
+        X = np.array([[row[name] for name in features] for row in rows],
+                     dtype=np.float64).reshape(len(rows), len(features))
+        log_returns = booster.inplace_predict(X)
+        # Convert log return back to percentage, as the training step does
+        return (np.exp(log_returns) - 1) * 100, schema
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import psycopg2
+import pytest
+import xgboost as xgb
+
+from app.config import get_db_config
+from app.model import (
+    DEFAULT_HORIZON, MODEL_FILENAME, SCHEMA_FILENAME, VERSIONS_DIR, schema_filename)
+
+
+@pytest.fixture(scope="session")
+def db_config():
+    """
+    Returns the configuration of the DB_* server, skipping the test if it is unreachable.
+    """
+    config = get_db_config()
+    try:
+        psycopg2.connect(
+            user=config["user"],
+            password=config["pass"],
+            host=config["host"],
+            port=config["port"],
+            database=config["name"],
+            connect_timeout=2
+        ).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"No Postgres available: {e}")
+    return config
+
+
+@pytest.fixture
+def save_model(tmp_path):
+    """
+    Returns a factory training a tiny booster and saving it in model_dir (tmp_path by
+    default) with the layout of the ETL registry (etl/src/model_artifacts.py). It
+    returns the version.
+    """
+    def save(seed=0, features=("Close", "Volume"), horizon=DEFAULT_HORIZON, promote=True,
+             model_dir=tmp_path):
+        rng = np.random.default_rng(seed)
+        X = rng.normal(size=(64, len(features)))
+        booster = xgb.train({"max_depth": 2}, xgb.DMatrix(X, label=X[:, 0] / 10),
+                            num_boost_round=3)
+        raw = bytes(booster.save_raw(raw_format="ubj"))
+        version = hashlib.sha256(raw).hexdigest()[:16]
+        version_dir = model_dir / VERSIONS_DIR / version
+        version_dir.mkdir(parents=True, exist_ok=True)
+        (version_dir / MODEL_FILENAME).write_bytes(raw)
+        schema = {"version": version, "model_file": MODEL_FILENAME, "features": list(features),
+                  "horizon": horizon, "trained_at": datetime.now().isoformat()}
+        (version_dir / SCHEMA_FILENAME).write_text(json.dumps(schema))
+        if promote:
+            current = model_dir / schema_filename(horizon)
+            schema["model_file"] = f"{VERSIONS_DIR}/{version}/{MODEL_FILENAME}"
+            current.write_text(json.dumps(schema))
+            # The stores compare modification times, make each promotion visible
+            mtime = current.stat().st_mtime + seed + 1
+            os.utime(current, (mtime, mtime))
+        return version
+    return save
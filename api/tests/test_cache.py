@@ -0,0 +1,140 @@
+import threading
+import time
+import uuid
+
+import psycopg2
+import pytest
+
+from app.cache import PredictionCache, PredictionListener, parse_payload
+
+
+class CountingLoader:
+    def __init__(self, value="prediction"):
+        self.value = value
+        self.calls = []
+
+    def __call__(self, key):
+        self.calls.append(key)
+        return self.value
+
+
+def test_parse_payload():
+    assert parse_payload("ETH-USD:30") == ("ETH-USD", 30)
+    # Payloads of the single-horizon ETL stand for the default horizon
+    assert parse_payload("BTC-USD") == ("BTC-USD", 7)
+
+
+def test_hits_are_served_until_the_ttl_expires():
+    loader = CountingLoader()
+    cache = PredictionCache(loader, ttl=60)
+
+    assert cache.get(("BTC-USD", 7)) == "prediction"
+    assert cache.get(("BTC-USD", 7)) == "prediction"
+    assert loader.calls == [("BTC-USD", 7)]
+
+    cache = PredictionCache(loader, ttl=0)
+    cache.get(("BTC-USD", 7))
+    cache.get(("BTC-USD", 7))
+    assert len(loader.calls) == 3
+
+
+def test_misses_are_not_cached():
+    loader = CountingLoader(value=None)
+    cache = PredictionCache(loader, ttl=60)
+
+    assert cache.get(("BTC-USD", 7)) is None
+    assert cache.get(("BTC-USD", 7)) is None
+    assert len(loader.calls) == 2
+
+
+def test_refresh_and_invalidate():
+    loader = CountingLoader()
+    cache = PredictionCache(loader, ttl=60)
+    cache.get(("BTC-USD", 7))
+
+    loader.value = "newer"
+    assert cache.refresh(("BTC-USD", 7)) == "newer"
+    assert cache.get(("BTC-USD", 7)) == "newer"
+
+    cache.invalidate(("BTC-USD", 7))
+    cache.get(("BTC-USD", 7))
+    assert len(loader.calls) == 3
+
+
+def test_load_overtaken_by_an_invalidation_is_not_cached():
+    cache = None
+
+    def loader(key):
+        # A notification arrives while the query runs
+        cache.invalidate(key)
+        return "stale"
+    cache = PredictionCache(loader, ttl=60)
+
+    assert cache.refresh(("BTC-USD", 7)) == "stale"
+    assert cache._entries == {}
+
+
+def test_failed_load_is_raised_and_not_cached():
+    def loader(key):
+        raise psycopg2.OperationalError("database down")
+    cache = PredictionCache(loader, ttl=60)
+
+    with pytest.raises(psycopg2.OperationalError):
+        cache.get(("BTC-USD", 7))
+    assert cache._entries == {} and cache._loading == {}
+
+
+def test_slow_load_does_not_block_other_keys():
+    release = threading.Event()
+
+    def loader(key):
+        if key == ("BTC-USD", 7):
+            release.wait(5)
+        return key
+    cache = PredictionCache(loader, ttl=60)
+    slow = threading.Thread(target=cache.get, args=(("BTC-USD", 7),))
+    slow.start()
+
+    start = time.monotonic()
+    assert cache.get(("ETH-USD", 7)) == ("ETH-USD", 7)
+    assert time.monotonic() - start < 1
+    release.set()
+    slow.join()
+    assert cache.get(("BTC-USD", 7)) == ("BTC-USD", 7)
+
+
+def test_listener_refreshes_the_notified_key(db_config):
+    refreshed = threading.Event()
+    loader = CountingLoader()
+
+    def load(key):
+        value = loader(key)
+        refreshed.set()
+        return value
+    cache = PredictionCache(load, ttl=60)
+    channel = f"test_{uuid.uuid4().hex}"
+    listener = PredictionListener(db_config, cache, channel=channel, poll_interval=0.1)
+    listener.start()
+    try:
+        # LISTEN is issued asynchronously, notify until it is heard
+        notifier = psycopg2.connect(
+            user=db_config["user"],
+            password=db_config["pass"],
+            host=db_config["host"],
+            port=db_config["port"],
+            database=db_config["name"]
+        )
+        notifier.autocommit = True
+        deadline = time.monotonic() + 5
+        while not refreshed.is_set() and time.monotonic() < deadline:
+            with notifier.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s);", (channel, "ETH-USD:30"))
+            refreshed.wait(0.2)
+        notifier.close()
+    finally:
+        listener.stop()
+        listener.join(5)
+
+    assert refreshed.is_set()
+    assert loader.calls[0] == ("ETH-USD", 30)
+    assert cache.get(("ETH-USD", 30)) == "prediction"
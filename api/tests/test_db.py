@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+from psycopg2 import pool as pg_pool
+
+from app.db import ConnectionPool
+
+
+@pytest.fixture
+def make_pool(db_config):
+    pools = []
+
+    def make(**kwargs):
+        db_pool = ConnectionPool(db_config, **kwargs)
+        # Counts the connections the pool opens
+        db_pool.connects = 0
+        connect = db_pool._connect
+
+        def counting_connect():
+            db_pool.connects += 1
+            return connect()
+        db_pool._connect = counting_connect
+        db_pool.open()
+        pools.append(db_pool)
+        return db_pool
+
+    yield make
+    for db_pool in pools:
+        db_pool.close()
+
+
+def borrow(db_pool, count):
+    """
+    Holds `count` connections at once and returns them.
+    """
+    contexts = [db_pool.connection() for _ in range(count)]
+    connections = [context.__enter__() for context in contexts]
+    for context in reversed(contexts):
+        context.__exit__(None, None, None)
+    return connections
+
+
+def test_open_connects_min_size(make_pool):
+    db_pool = make_pool(min_size=2, max_size=4)
+
+    assert db_pool.connects == 2
+    assert len(db_pool._idle) == 2
+
+
+def test_returned_connections_are_reused_up_to_max_size(make_pool):
+    db_pool = make_pool(min_size=1, max_size=3)
+
+    first = borrow(db_pool, 3)
+    second = borrow(db_pool, 3)
+
+    assert db_pool.connects == 3
+    assert {id(connection) for connection in second} == {id(connection) for connection in first}
+    assert len(db_pool._idle) == 3
+    assert db_pool.stats() == {"in_use": 0, "max_size": 3}
+
+
+def test_checkout_times_out_when_every_connection_is_in_use(make_pool):
+    db_pool = make_pool(min_size=1, max_size=1, timeout=0.1)
+
+    with db_pool.connection():
+        with pytest.raises(pg_pool.PoolError):
+            with db_pool.connection():
+                pass
+    # The slot is released by the first checkout
+    with db_pool.connection() as connection:
+        assert not connection.closed
+
+
+def test_waiting_checkout_gets_the_returned_connection(make_pool):
+    db_pool = make_pool(min_size=1, max_size=1, timeout=5)
+    borrowed = []
+
+    def wait_for_connection():
+        with db_pool.connection() as connection:
+            borrowed.append(connection)
+
+    with db_pool.connection() as held:
+        waiter = threading.Thread(target=wait_for_connection)
+        waiter.start()
+        time.sleep(0.1)
+    waiter.join()
+
+    assert borrowed == [held]
+    assert db_pool.connects == 1
+
+
+def test_failed_transaction_is_rolled_back(make_pool):
+    db_pool = make_pool(min_size=1, max_size=1)
+    with db_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE pool_test (value int);")
+
+    with pytest.raises(RuntimeError):
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("INSERT INTO pool_test VALUES (1);")
+            raise RuntimeError("request failed")
+
+    with db_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pool_test;")
+            assert cursor.fetchone() == (0,)
+
+
+def test_stale_connection_is_replaced(make_pool):
+    db_pool = make_pool(min_size=1, max_size=2, check_idle_after=0)
+    (stale,) = borrow(db_pool, 1)
+    stale.close()
+
+    with db_pool.connection() as connection:
+        assert connection is not stale
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+
+    assert db_pool.connects == 2
+    assert id(stale) not in db_pool._last_used
+
+
+def test_broken_idle_connection_fails_the_health_check(make_pool, db_config):
+    db_pool = make_pool(min_size=1, max_size=1, check_idle_after=0)
+    with db_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid();")
+            pid = cursor.fetchone()[0]
+    # Killed by the server behind the pool's back
+    admin = ConnectionPool(db_config)._connect()
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute("SELECT pg_terminate_backend(%s);", (pid,))
+    admin.close()
+
+    with db_pool.connection() as fresh:
+        assert fresh is not connection
+        with fresh.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+
+
+def test_closed_pool_discards_its_connections(make_pool):
+    db_pool = make_pool(min_size=2, max_size=2)
+    idle = list(db_pool._idle)
+    context = db_pool.connection()
+    borrowed = context.__enter__()
+
+    db_pool.close()
+    context.__exit__(None, None, None)
+
+    assert all(connection.closed for connection in idle + [borrowed])
+    assert db_pool._last_used == {}
+    with pytest.raises(RuntimeError):
+        with db_pool.connection():
+            pass
@@ -0,0 +1,92 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.model import ModelCache
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    Client of the app serving the models of tmp_path, without the lifespan: the
+    inference routes do not use the database.
+    """
+    monkeypatch.setitem(main.model_config, "model_dir", str(tmp_path))
+    monkeypatch.setattr(main, "model_stores", {})
+    monkeypatch.setattr(main, "model_cache", ModelCache(max_size=2))
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def btc_dir(tmp_path):
+    return tmp_path / "btc_usd"
+
+
+ROWS = [{"Close": 1.0, "Volume": 2.0}, {"Close": -1.0, "Volume": 0.5}]
+
+
+def test_infer_scores_with_the_current_model(client, save_model, btc_dir):
+    version = save_model(model_dir=btc_dir)
+
+    response = client.post("/predictions/infer", json={"rows": ROWS, "symbol": "btc-usd"})
+
+    assert response.status_code == 200
+    assert response.json()["model_version"] == version
+    assert len(response.json()["values"]) == 2
+
+
+def test_infer_scores_with_a_registered_version(client, save_model, btc_dir):
+    old = save_model(seed=0, model_dir=btc_dir)
+    save_model(seed=1, model_dir=btc_dir)
+
+    response = client.post("/predictions/infer", json={"rows": ROWS, "model_version": old})
+
+    assert response.status_code == 200
+    assert response.json()["model_version"] == old
+
+
+@pytest.mark.parametrize("version", ["0123456789abcdef", "../btc_usd", "latest"])
+def test_infer_with_an_unknown_version_is_not_found(client, save_model, btc_dir, version):
+    save_model(model_dir=btc_dir)
+
+    response = client.post("/predictions/infer", json={"rows": ROWS, "model_version": version})
+
+    assert response.status_code == 404
+
+
+def test_infer_of_a_horizon_without_model_is_unavailable(client, save_model, btc_dir):
+    save_model(model_dir=btc_dir)
+
+    response = client.post("/predictions/infer", json={"rows": ROWS, "horizon": 30})
+
+    assert response.status_code == 503
+
+
+@pytest.mark.parametrize("body", [
+    {"rows": ROWS, "symbol": "DOGE-USD"},
+    {"rows": ROWS, "horizon": 2},
+])
+def test_unserved_symbols_and_horizons_are_not_found(client, save_model, btc_dir, body):
+    save_model(model_dir=btc_dir)
+
+    assert client.post("/predictions/infer", json=body).status_code == 404
+
+
+@pytest.mark.parametrize("rows", [[], [{"Close": 1.0}]])
+def test_invalid_rows_are_rejected(client, save_model, btc_dir, rows):
+    save_model(model_dir=btc_dir)
+
+    assert client.post("/predictions/infer", json={"rows": rows}).status_code == 422
+
+
+def test_compare_scores_each_version(client, save_model, btc_dir):
+    versions = [save_model(seed=seed, model_dir=btc_dir) for seed in range(3)]
+
+    response = client.post("/predictions/compare", json={"rows": ROWS, "model_versions": versions})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert list(results) == versions
+    assert results[versions[0]]["values"] != results[versions[2]]["values"]
+    # Only max_size boosters stay loaded
+    assert len(main.model_cache.versions()) == 2
@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.model import ModelCache, ModelStore, schema_filename
+
+
+def rows(*values):
+    return [{"Close": close, "Volume": volume} for close, volume in values]
+
+
+def test_schema_filename_of_each_horizon():
+    assert schema_filename(7) == "xgboost_model.json"
+    assert schema_filename(30) == "xgboost_model_h30.json"
+
+
+def test_store_serves_the_current_version(tmp_path, save_model):
+    version = save_model()
+    store = ModelStore(str(tmp_path))
+
+    assert store.load()
+    booster, schema = store.get()
+
+    assert schema["version"] == version
+    X = np.array([[1.0, 2.0]])
+    values, _ = store.predict(rows((1.0, 2.0)))
+    np.testing.assert_allclose(values, (np.exp(booster.inplace_predict(X)) - 1) * 100)
+
+
+def test_store_without_model_serves_nothing(tmp_path):
+    store = ModelStore(str(tmp_path))
+
+    assert not store.load()
+    assert store.get() == (None, None)
+    with pytest.raises(LookupError):
+        store.predict(rows((1.0, 2.0)))
+
+
+def test_store_hot_reloads_a_promoted_version(tmp_path, save_model):
+    save_model(seed=0)
+    store = ModelStore(str(tmp_path), check_interval=0)
+    store.load()
+
+    newer = save_model(seed=1)
+
+    assert store.get()[1]["version"] == newer
+
+
+def test_store_keeps_serving_when_the_new_artifact_is_broken(tmp_path, save_model):
+    version = save_model()
+    store = ModelStore(str(tmp_path), check_interval=0)
+    store.load()
+
+    current = tmp_path / schema_filename()
+    schema = json.loads(current.read_text())
+    current.write_text(json.dumps({**schema, "version": "0" * 16, "model_file": "missing.ubj"}))
+
+    assert store.get()[1]["version"] == version
+
+
+def test_previous_versions_are_served_from_the_registry(tmp_path, save_model):
+    old = save_model(seed=0)
+    save_model(seed=1)
+    store = ModelStore(str(tmp_path))
+    store.load()
+
+    _, schema = store.get(old)
+
+    assert schema["version"] == old
+    assert store.predict(rows((1.0, 2.0)), version=old)[1]["version"] == old
+
+
+@pytest.mark.parametrize("version", ["0123456789abcdef", "../../etc", "ABCDEF0123456789", ""])
+def test_unknown_or_malformed_versions_are_not_found(tmp_path, save_model, version):
+    save_model()
+    store = ModelStore(str(tmp_path))
+    store.load()
+
+    with pytest.raises(LookupError):
+        store.get(version)
+
+
+def test_cache_evicts_the_least_recently_used_version(tmp_path, save_model):
+    versions = [save_model(seed=seed, promote=False) for seed in range(3)]
+    cache = ModelCache(max_size=2)
+
+    cache.get(str(tmp_path), versions[0])
+    cache.get(str(tmp_path), versions[1])
+    cache.get(str(tmp_path), versions[0])
+    cache.get(str(tmp_path), versions[2])
+
+    assert cache.versions() == [versions[0], versions[2]]
+
+
+def test_boosters_are_only_held_by_the_cache(tmp_path, save_model):
+    current = save_model(seed=0)
+    others = [save_model(seed=seed, promote=False) for seed in (1, 2)]
+    cache = ModelCache(max_size=1)
+    store = ModelStore(str(tmp_path), cache=cache)
+    store.load()
+
+    for version in others:
+        store.get(version)
+    assert cache.versions() == [others[-1]]
+
+    # The evicted current version is loaded again
+    assert store.get()[1]["version"] == current
+    assert cache.versions() == [current]
+
+
+def test_predict_checks_the_features(tmp_path, save_model):
+    save_model()
+    store = ModelStore(str(tmp_path))
+    store.load()
+
+    with pytest.raises(KeyError):
+        store.predict([{"Close": 1.0}])
+    values, _ = store.predict([])
+    assert values.shape == (0,)
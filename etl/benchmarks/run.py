@@ -0,0 +1,241 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+from benchmarks.synthetic import generate_lakes, generate_market_data
+from src.config import get_db_config
+from src.xgboost_training import (
+    build_training_arrays, convert_to_float, correct_data_types, create_features_for_xgboost,
+    extract_df, train_from_lake, train_xgboost_model)
+
+logger = logging.getLogger(__name__)
+
+
+def rss_mb():
+    """
+    Returns the current resident set size of the process in MB, read from /proc (Linux).
+    """
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+@contextmanager
+def rss_growth(interval=0.005):
+    """
+    Samples the resident set size from a background thread while the block runs.
+    The yielded dict gets 'rss_delta_mb' on exit: the peak RSS over the block minus
+    the RSS at its start, i.e. the memory of this step alone, native allocations
+    (XGBoost, Arrow) included, unlike the process-wide ru_maxrss.
+    """
+    gc.collect()
+    baseline = rss_mb()
+    sample = {"peak": baseline}
+    done = threading.Event()
+
+    def poll():
+        while not done.wait(interval):
+            sample["peak"] = max(sample["peak"], rss_mb())
+
+    poller = threading.Thread(target=poll, daemon=True)
+    poller.start()
+    try:
+        yield sample
+    finally:
+        done.set()
+        poller.join()
+        sample["rss_delta_mb"] = max(sample["peak"], rss_mb()) - baseline
+
+
+def measure(func, setup=None, repeat=3):
+    """
+    Times `func` over `repeat` runs, then runs it once more to record the memory of
+    the step: its peak Python/numpy allocation under tracemalloc, and its peak RSS
+    growth, which also counts the native allocations. `setup` builds the arguments
+    of each run outside the timed section, since most steps mutate their input frame.
+    Returns:
+        dict: Min and median wall time in seconds and the peak memory in MB.
+    """
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+
+    args = setup() if setup else ()
+    with rss_growth() as rss:
+        tracemalloc.start()
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "min_s": round(min(timings), 4),
+        "median_s": round(statistics.median(timings), 4),
+        "peak_mb": round(peak / 2**20, 1),
+        "rss_delta_mb": round(rss["rss_delta_mb"], 1),
+    }
+
+
+def benchmark_training(scale, workdir, repeat=3):
+    """
+    Benchmarks the training hot paths over `scale` synthetic tickers, each one with
+    the length of the BTC history in its own data lake, as the pipeline trains them
+    symbol by symbol.
+    """
+    lakes, rows = generate_lakes(os.path.join(workdir, f"lakes_{scale}x"), scale)
+    raws = [extract_df(lake) for lake in lakes]
+    cleans = [correct_data_types(convert_to_float(raw.copy())) for raw in raws]
+    features = [create_features_for_xgboost(clean.copy()) for clean in cleans]
+
+    steps = {
+        "extract_df": (lambda: [extract_df(lake) for lake in lakes], None),
+        "convert_to_float+correct_data_types": (
+            lambda dfs: [correct_data_types(convert_to_float(df)) for df in dfs],
+            lambda: ([raw.copy() for raw in raws],)),
+        "create_features_for_xgboost": (
+            lambda dfs: [create_features_for_xgboost(df) for df in dfs],
+            lambda: ([clean.copy() for clean in cleans],)),
+        "train_xgboost_model": (lambda: [train_xgboost_model(df) for df in features], None),
+        # The projected, array-based path, end to end from the lake
+        "build_training_arrays": (lambda: [build_training_arrays(lake) for lake in lakes], None),
+        "train_from_lake": (lambda: [train_from_lake(lake) for lake in lakes], None),
+    }
+    results = []
+    for name, (func, setup) in steps.items():
+        result = {"name": name, "scale": scale, "rows": rows,
+                  **measure(func, setup, repeat)}
+        logger.info(f"{name} @ {scale}x: {result}")
+        results.append(result)
+    return results
+
+
+def _admin_connection(db_config):
+    connection = psycopg2.connect(
+        user=db_config["user"],
+        password=db_config["pass"],
+        host=db_config["host"],
+        port=db_config["port"],
+        database=db_config["name"],
+        connect_timeout=3
+    )
+    connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    return connection
+
+
+def benchmark_update_db(scales, workdir, repeat=3):
+    """
+    Benchmarks update_db against a throwaway database created on the server of
+    the DB_* environment variables, and dropped afterwards.
+    Returns an empty list if the server cannot be reached.
+    """
+    from src.init_db import create_market_data_table
+    from src.update_db import get_db_connection, update_db
+
+    server_config = get_db_config()
+    try:
+        admin = _admin_connection(server_config)
+    except psycopg2.OperationalError as e:
+        logger.warning(f"Skipping the update_db benchmark, no Postgres available: {e}")
+        return []
+
+    db_config = {**server_config, "name": f"benchmark_{os.getpid()}"}
+    results = []
+    try:
+        with admin.cursor() as cursor:
+            cursor.execute(f'CREATE DATABASE "{db_config["name"]}";')
+        with get_db_connection(db_config) as connection:
+            with connection.cursor() as cursor:
+                create_market_data_table(cursor)
+
+        def empty_table(data_path):
+            # Every run measures the insert path, not a no-op upsert
+            with get_db_connection(db_config) as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("TRUNCATE market_data;")
+            return db_config, data_path
+
+        for scale in scales:
+            df = generate_market_data(scale)
+            data_path = os.path.join(workdir, f"market_data_{scale}x.parquet")
+            df.to_parquet(data_path, index=False)
+            result = {"name": "update_db", "scale": scale, "rows": len(df),
+                      **measure(update_db, lambda: empty_table(data_path), repeat)}
+            logger.info(f"update_db @ {scale}x: {result}")
+            results.append(result)
+    finally:
+        with admin.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{db_config["name"]}";')
+        admin.close()
+    return results
+
+
+def compare(results, baseline, tolerance=0.2, memory_slack_mb=1.0):
+    """
+    Lists the benchmarks whose median time or peak memory exceeds the baseline
+    by more than `tolerance` (a fraction). Memory within `memory_slack_mb` of the
+    baseline is never a regression, the RSS growth of small steps being noisy.
+    """
+    previous = {(entry["name"], entry["scale"]): entry for entry in baseline}
+    regressions = []
+    for result in results:
+        reference = previous.get((result["name"], result["scale"]))
+        if reference is None:
+            continue
+        for metric in ("median_s", "peak_mb", "rss_delta_mb"):
+            # Baselines recorded before a metric existed are not compared on it
+            if metric not in reference:
+                continue
+            slack = 0.0 if metric == "median_s" else memory_slack_mb
+            if result[metric] > reference[metric] * (1 + tolerance) + slack:
+                regressions.append(
+                    f"{result['name']} @ {result['scale']}x: {metric} "
+                    f"{reference[metric]} -> {result[metric]}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the ETL and training hot paths on synthetic data.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="Numbers of synthetic tickers with the BTC history to benchmark.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-db", action="store_true",
+                        help="Skip the update_db benchmark.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Fail if the results regress against this JSON file.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    with tempfile.TemporaryDirectory(prefix="benchmarks_") as workdir:
+        results = []
+        for scale in args.scales:
+            results.extend(benchmark_training(scale, workdir, args.repeat))
+        if not args.skip_db:
+            results.extend(benchmark_update_db(args.scales, workdir, args.repeat))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        sys.exit(1 if regressions else 0)
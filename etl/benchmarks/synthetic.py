@@ -0,0 +1,92 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.compaction import compact_data_lake
+from src.data_lake import OHLCV_COLUMNS, write_partitioned
+from src.symbols import file_prefix, symbol_slug
+
+logger = logging.getLogger(__name__)
+
+# Daily bars of the real BTC-USD history since 2016, the history of each synthetic ticker
+BASE_ROWS = 3_000
+BASE_START = "2016-01-01"
+
+
+def synthetic_symbol(i):
+    """
+    Returns the ticker of the i-th synthetic asset.
+    """
+    return f"SYN{i}-USD"
+
+
+def generate_ohlcv(rows, start=BASE_START, seed=0, start_price=400.0):
+    """
+    Generates a deterministic OHLCV frame shaped like the yfinance download: a
+    geometric random walk for the close, with open/high/low around it and a
+    volume correlated with the absolute return.
+    Dates are daily and millisecond-based, as read back from the data lake.
+    Args:
+        rows (int): Number of daily bars.
+        seed (int): Seed of the random generator, the same seed gives the same frame.
+    Returns:
+        pd.DataFrame: A 'Date' column followed by the OHLCV columns.
+    """
+    rng = np.random.default_rng(seed)
+    # No drift, the synthetic tickers wander around their start price
+    log_returns = rng.normal(0.0, 0.035, rows)
+    close = start_price * np.exp(np.cumsum(log_returns))
+    open_ = close * np.exp(-log_returns * rng.uniform(0.0, 1.0, rows))
+    high = np.maximum(open_, close) * (1 + rng.exponential(0.01, rows))
+    low = np.minimum(open_, close) * (1 - rng.exponential(0.01, rows))
+    volume = (1e9 * (1 + 20 * np.abs(log_returns)) * rng.lognormal(0.0, 0.3, rows)).round()
+
+    df = pd.DataFrame({
+        "Date": np.arange(np.datetime64(start, "D"), np.datetime64(start, "D") + rows,
+                          dtype="datetime64[D]").astype("datetime64[ms]"),
+        "Open": open_,
+        "High": high,
+        "Low": low,
+        "Close": close,
+        "Volume": volume.astype(np.int64),
+    })
+    return df[["Date"] + OHLCV_COLUMNS]
+
+
+def generate_lakes(root, scale=1, seed=0):
+    """
+    Writes `scale` synthetic tickers with the length of the BTC history as one data
+    lake each under root, compacted into yearly files like the production lakes after
+    the nightly run. The data grows with the number of assets, as in production,
+    rather than with an ever longer daily history.
+    Returns:
+        tuple: The data lake directories and the total number of rows written.
+    """
+    lakes, rows = [], 0
+    for i in range(scale):
+        symbol = synthetic_symbol(i)
+        lake = os.path.join(root, symbol_slug(symbol))
+        df = generate_ohlcv(BASE_ROWS, seed=seed + i)
+        write_partitioned(df, lake, file_prefix(symbol))
+        compact_data_lake(lake, prefix=file_prefix(symbol))
+        lakes.append(lake)
+        rows += len(df)
+    logger.info(f"{scale} synthetic data lake(s) of {rows} rows written to {root}")
+    return lakes, rows
+
+
+def generate_market_data(scale=1, seed=0):
+    """
+    Generates `scale` times the BTC history for the database load, as `scale`
+    synthetic tickers of daily bars so every (symbol, trading_date) key is unique.
+    Returns:
+        pd.DataFrame: A 'Symbol' column followed by 'Date' and the OHLCV columns.
+    """
+    frames = [
+        generate_ohlcv(BASE_ROWS, seed=seed + i).assign(Symbol=synthetic_symbol(i))
+        for i in range(scale)
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    return df[["Symbol", "Date"] + OHLCV_COLUMNS]
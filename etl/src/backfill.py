@@ -0,0 +1,196 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from psycopg2 import extras
+
+from src.config import get_db_config, get_horizons, get_symbols
+from src.data_lake import read_data_lake_table, symbol_lake_dir
+from src.run_state import TRAINING_MODULES, code_version
+from src.update_db import create_prediction_table, get_db_connection
+from src.xgboost_training import build_training_arrays, thread_budget, train_horizons
+
+logger = logging.getLogger(__name__)
+
+# As-of dates per pool task: the results of a shard are saved as soon as it completes,
+# so a crash loses at most the shards in flight
+SHARD_DAYS = 16
+# Rows with a known target required to fit the models of an as-of date
+MIN_TRAIN_ROWS = 365
+
+# Feature matrices of the tickers seen by a pool worker, built once by _arrays()
+_worker_state = {}
+
+
+def as_of_targets(Y, horizons, end):
+    """
+    Returns the targets of the first `end` rows as known at the close of row end - 1:
+    the target of a row over h bars is only known h bars later, so the last h rows
+    of each horizon are masked.
+    """
+    Y = Y[:end].copy()
+    for column, horizon in enumerate(horizons):
+        Y[max(end - horizon, 0):, column] = np.nan
+    return Y
+
+
+def _init_worker(lake_root, training_start_date, horizons, n_jobs, min_train_rows):
+    _worker_state.update(lake_root=lake_root, training_start_date=training_start_date,
+                         horizons=horizons, n_jobs=n_jobs, min_train_rows=min_train_rows,
+                         arrays={})
+
+
+def _arrays(symbol):
+    arrays = _worker_state["arrays"]
+    if symbol not in arrays:
+        X, Y, dates = build_training_arrays(
+            symbol_lake_dir(_worker_state["lake_root"], symbol),
+            start_date=_worker_state["training_start_date"], horizons=_worker_state["horizons"])
+        arrays[symbol] = X, Y, dates.astype('datetime64[D]')
+    return arrays[symbol]
+
+
+def _run_shard(symbol, as_of_dates):
+    """
+    Trains the models of each as-of date of a shard on the rows known at its close
+    and predicts from its bar.
+    Returns:
+        tuple: The symbol and its (as_of_date, horizon, value) predictions.
+    """
+    X, Y, dates = _arrays(symbol)
+    horizons = _worker_state["horizons"]
+    predictions = []
+    for as_of in as_of_dates:
+        # The features only look back, so the first `end` rows are as they were at as_of
+        end = int(np.searchsorted(dates, np.datetime64(as_of, 'D'), side="right"))
+        if end == 0 or dates[end - 1] != np.datetime64(as_of, 'D'):
+            continue
+        if end - max(horizons) < _worker_state["min_train_rows"]:
+            continue
+        values = train_horizons(X[:end], as_of_targets(Y, horizons, end), dates[:end], horizons,
+                                n_jobs=_worker_state["n_jobs"])
+        predictions.extend((as_of, horizon, value) for horizon, value in values.items())
+    return symbol, predictions
+
+
+def completed_dates(db_config, symbol, horizons, start_date, end_date):
+    """
+    Returns the as-of dates of a symbol already backfilled for every horizon.
+    """
+    query = """
+        SELECT as_of_date FROM predictions
+        WHERE symbol = %s AND as_of_date BETWEEN %s AND %s AND horizon_days = ANY(%s)
+        GROUP BY as_of_date
+        HAVING count(DISTINCT horizon_days) = %s;
+    """
+    with get_db_connection(db_config) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, (symbol, start_date, end_date, list(horizons), len(horizons)))
+            return {str(row[0]) for row in cursor.fetchall()}
+
+
+def save_backfill(db_config, symbol, predictions, model_version):
+    """
+    Bulk-inserts as-of predictions. A prediction is dated at the close of its as-of
+    day, and replaces a previous backfill of the same symbol, horizon and date.
+    No notification is sent, the latest predictions are unchanged.
+    Returns:
+        int: The number of saved predictions.
+    """
+    query = """
+        INSERT INTO predictions (symbol, predicted_return_pct, model_version, horizon_days,
+                                 as_of_date, created_at)
+        VALUES %s
+        ON CONFLICT (symbol, horizon_days, as_of_date) WHERE as_of_date IS NOT NULL
+        DO UPDATE SET predicted_return_pct = EXCLUDED.predicted_return_pct,
+                      model_version = EXCLUDED.model_version,
+                      created_at = EXCLUDED.created_at;
+    """
+    rows = [(symbol, value, model_version, horizon, as_of,
+             pd.Timestamp(as_of) + pd.Timedelta(days=1))
+            for as_of, horizon, value in predictions]
+    if not rows:
+        return 0
+    with get_db_connection(db_config) as conn:
+        with conn.cursor() as cursor:
+            extras.execute_values(cursor, query, rows, page_size=1000)
+    return len(rows)
+
+
+def backfill(symbols, lake_root, start_date, end_date, horizons=None, db_config=None,
+             training_start_date=None, max_workers=None, min_train_rows=MIN_TRAIN_ROWS,
+             shard_days=SHARD_DAYS):
+    """
+    Backfills the predictions the models would have made at the close of each bar
+    in [start_date, end_date]. For each as-of date the models of every horizon are
+    trained only on the bars up to that date and on the targets already known then,
+    with the default hyperparameters (the tuned ones were chosen on the whole history).
+    The dates are sharded over a process pool, and the dates already in the predictions
+    table are skipped, so a crashed backfill resumes where it stopped.
+    Args:
+        symbols (list): Tickers to backfill.
+        lake_root (str): Parent directory of the per-ticker data lakes.
+        horizons (list, optional): Horizons in days, defaults to $FORECAST_HORIZONS.
+        training_start_date (str, optional): Lower bound of the training windows.
+        max_workers (int, optional): Pool size, defaults to the cpu count.
+    Returns:
+        int: The number of saved predictions.
+    """
+    horizons = horizons or get_horizons()
+    db_config = db_config or get_db_config()
+    create_prediction_table(db_config)
+    # Backfilled predictions are labelled with the training code that made them
+    model_version = f"backfill-{code_version(TRAINING_MODULES)}"
+
+    tasks = []
+    for symbol in symbols:
+        table = read_data_lake_table(symbol_lake_dir(lake_root, symbol), start_date=start_date,
+                                     end_date=end_date, columns=['Close'])
+        done = completed_dates(db_config, symbol, horizons, start_date, end_date)
+        dates = [str(date) for date in table.column('Date').to_pylist() if str(date) not in done]
+        logger.info(f"Backfilling {len(dates)} as-of date(s) of {symbol}, {len(done)} already done.")
+        tasks.extend((symbol, dates[i:i + shard_days]) for i in range(0, len(dates), shard_days))
+    if not tasks:
+        return 0
+
+    workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+    initargs = (lake_root, training_start_date, horizons, thread_budget(workers), min_train_rows)
+    saved = 0
+    if workers == 1:
+        _init_worker(*initargs)
+        for task in tasks:
+            symbol, predictions = _run_shard(*task)
+            saved += save_backfill(db_config, symbol, predictions, model_version)
+        return saved
+
+    logger.info(f"Backfilling {len(tasks)} shard(s) on {workers} worker(s)...")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=initargs) as executor:
+        futures = [executor.submit(_run_shard, *task) for task in tasks]
+        for done_shards, future in enumerate(as_completed(futures), start=1):
+            symbol, predictions = future.result()
+            saved += save_backfill(db_config, symbol, predictions, model_version)
+            logger.info(f"Backfilled {done_shards}/{len(tasks)} shard(s), {saved} prediction(s).")
+    return saved
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Backfill point-in-time predictions.")
+    parser.add_argument("--start", required=True, help="First as-of date (YYYY-MM-DD).")
+    parser.add_argument("--end", required=True, help="Last as-of date (YYYY-MM-DD).")
+    parser.add_argument("--symbols", nargs="+", default=None, help="Defaults to $SYMBOLS.")
+    parser.add_argument("--horizons", nargs="+", type=int, default=None,
+                        help="Defaults to $FORECAST_HORIZONS.")
+    parser.add_argument("--data-lake-root", default=os.getenv("DATA_LAKE_ROOT", "data_lake"))
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--min-train-rows", type=int, default=MIN_TRAIN_ROWS)
+    args = parser.parse_args()
+
+    count = backfill(args.symbols or get_symbols(), args.data_lake_root, args.start, args.end,
+                     horizons=args.horizons, training_start_date=os.getenv("TRAINING_START_DATE"),
+                     max_workers=args.max_workers, min_train_rows=args.min_train_rows)
+    print(f"Saved {count} backfilled prediction(s).")
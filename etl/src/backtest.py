@@ -0,0 +1,177 @@
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from src.xgboost_training import thread_budget
+
+logger = logging.getLogger(__name__)
+
+# Same model as train_xgboost_model, expressed for the native training API
+DEFAULT_PARAMS = {
+    "objective": "reg:squarederror",
+    "tree_method": "hist",
+}
+
+# Arrays shared by the folds of a pool worker, set once by _init_worker
+_worker_state = {}
+
+
+def make_folds(n_rows, horizon=7, retrain_every=7, window="expanding", window_size=730,
+               min_train_size=365):
+    """
+    Lists the walk-forward folds as (train_start, train_end, test_start, test_end) row
+    positions. A model scoring row i only sees rows whose target was known at i,
+    i.e. rows up to i - horizon, so there is no lookahead.
+    """
+    folds = []
+    for test_start in range(min_train_size + horizon, n_rows, retrain_every):
+        train_end = test_start - horizon
+        train_start = 0 if window == "expanding" else max(0, train_end - window_size)
+        folds.append((train_start, train_end, test_start,
+                      min(test_start + retrain_every, n_rows)))
+    return folds
+
+
+def _init_worker(X, y, params, num_boost_round):
+    _worker_state.update(X=X, y=y, params=params, num_boost_round=num_boost_round)
+
+
+def _run_fold(fold):
+    train_start, train_end, test_start, test_end = fold
+    X, y = _worker_state["X"], _worker_state["y"]
+    dtrain = xgb.DMatrix(X[train_start:train_end], label=y[train_start:train_end])
+    booster = xgb.train(_worker_state["params"], dtrain,
+                        num_boost_round=_worker_state["num_boost_round"])
+    return booster.inplace_predict(X[test_start:test_end])
+
+
+def _run_warm_started(X, y, folds, params, num_boost_round, warm_start_rounds, refit_every):
+    """
+    Runs the folds sequentially, each one continuing to boost the previous booster
+    with a few extra rounds instead of refitting from scratch.
+    Every `refit_every` folds the booster is refit from scratch, so the ensemble never
+    exceeds num_boost_round + (refit_every - 1) * warm_start_rounds trees and the
+    early folds' trees do not keep weighing on the later predictions.
+    """
+    booster = None
+    predictions = []
+    for i, (train_start, train_end, test_start, test_end) in enumerate(folds):
+        if i % refit_every == 0:
+            booster = None
+        dtrain = xgb.DMatrix(X[train_start:train_end], label=y[train_start:train_end])
+        booster = xgb.train(
+            params, dtrain,
+            num_boost_round=num_boost_round if booster is None else warm_start_rounds,
+            xgb_model=booster)
+        predictions.append(booster.inplace_predict(X[test_start:test_end]))
+    return predictions
+
+
+def summarize_backtest(results, horizon=7):
+    """
+    Computes the hit rate, the MAE and a simple long/short strategy PnL.
+    The strategy takes the sign of the forecast and holds it for `horizon` days, only
+    non-overlapping positions being counted.
+    """
+    y_true = results['target'].to_numpy()
+    y_pred = results['prediction'].to_numpy()
+    positions = np.sign(y_pred[::horizon])
+    realized = y_true[::horizon]
+    return {
+        "predictions": int(len(results)),
+        "hit_rate": float(np.mean(np.sign(y_pred) == np.sign(y_true))),
+        "mae": float(np.mean(np.abs(y_pred - y_true))),
+        "strategy_log_return": float(np.sum(positions * realized)),
+        "buy_and_hold_log_return": float(np.sum(realized)),
+        "trades": int(len(positions)),
+    }
+
+
+def walk_forward_backtest(df, features_to_drop=['target', 'Open', 'High', 'Low'], horizon=7,
+                          retrain_every=7, window="expanding", window_size=730,
+                          min_train_size=365, warm_start=False, warm_start_rounds=10,
+                          refit_every=10, params=None, num_boost_round=100, max_workers=None):
+    """
+    Walk-forward backtest over the frame returned by create_features_for_xgboost.
+    The model is retrained every `retrain_every` rows on an expanding or rolling window
+    and scores the following block of rows in one vectorized call.
+    Args:
+        df (pd.DataFrame): Features and target indexed by date.
+        horizon (int): Forecast horizon in rows, used to embargo the training window.
+        window (str): 'expanding' or 'rolling' (of `window_size` rows).
+        warm_start (bool): Continue boosting the previous booster by `warm_start_rounds`
+            rounds instead of refitting, which makes the folds sequential.
+        refit_every (int): With warm_start, folds after which the booster is refit from
+            scratch, bounding the size of the ensemble.
+        max_workers (int, optional): Processes running the independent folds in parallel.
+    Returns:
+        tuple: A frame of out-of-sample predictions and the metrics dictionary.
+    """
+    df = df.dropna(subset=['target'])
+    X = np.ascontiguousarray(df.drop(columns=features_to_drop).to_numpy(dtype=np.float32))
+    y = df['target'].to_numpy(dtype=np.float32)
+    folds = make_folds(len(df), horizon, retrain_every, window, window_size, min_train_size)
+    if not folds:
+        raise ValueError(
+            f"Not enough rows ({len(df)}) for min_train_size={min_train_size} and horizon={horizon}.")
+    if refit_every < 1:
+        raise ValueError(f"refit_every must be at least 1, got {refit_every}.")
+    params = {**DEFAULT_PARAMS, **(params or {})}
+
+    workers = 1 if warm_start else (max_workers or os.cpu_count() or 1)
+    logger.info(
+        f"Backtesting {len(folds)} fold(s) on {workers} worker(s) ({window} window)...")
+    if warm_start:
+        predictions = _run_warm_started(
+            X, y, folds, params, num_boost_round, warm_start_rounds, refit_every)
+    elif workers == 1:
+        _init_worker(X, y, params, num_boost_round)
+        predictions = [_run_fold(fold) for fold in folds]
+    else:
+        params["nthread"] = thread_budget(workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(X, y, params, num_boost_round)) as executor:
+            chunksize = max(1, len(folds) // (workers * 4))
+            predictions = list(executor.map(_run_fold, folds, chunksize=chunksize))
+
+    test_start, test_end = folds[0][2], folds[-1][3]
+    results = pd.DataFrame({
+        'target': y[test_start:test_end],
+        'prediction': np.concatenate(predictions),
+    }, index=df.index[test_start:test_end])
+    metrics = summarize_backtest(results, horizon)
+    logger.info(f"Backtest metrics: {metrics}")
+    return results, metrics
+
+
+if __name__ == "__main__":
+    from src.xgboost_training import (
+        convert_to_float, correct_data_types, create_features_for_xgboost, extract_df)
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the XGBoost forecast.")
+    parser.add_argument("--data-lake", default=os.getenv("DATA_LAKE_PATH"),
+                        help="Data lake of one ticker (defaults to $DATA_LAKE_PATH).")
+    parser.add_argument("--retrain-every", type=int, default=7)
+    parser.add_argument("--window", choices=["expanding", "rolling"], default="expanding")
+    parser.add_argument("--window-size", type=int, default=730)
+    parser.add_argument("--min-train-size", type=int, default=365)
+    parser.add_argument("--warm-start", action="store_true")
+    parser.add_argument("--refit-every", type=int, default=10,
+                        help="With --warm-start, folds between two refits from scratch.")
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    df = extract_df(args.data_lake)
+    df = create_features_for_xgboost(correct_data_types(convert_to_float(df)))
+    _, metrics = walk_forward_backtest(
+        df, retrain_every=args.retrain_every, window=args.window,
+        window_size=args.window_size, min_train_size=args.min_train_size,
+        warm_start=args.warm_start, refit_every=args.refit_every, max_workers=args.max_workers)
+    print(json.dumps(metrics, indent=2))
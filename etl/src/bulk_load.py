@@ -0,0 +1,102 @@
+import logging
+
+import pandas as pd
+
+from src.data_lake import OHLCV_COLUMNS
+from src.market_data_schema import DEFAULT_INTERVAL, ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+# Order of the market_data columns matching ['Symbol', 'Interval', 'Date'] + OHLCV_COLUMNS
+MARKET_DATA_COLUMNS = ["symbol", "bar_interval", "bar_time", "open_price", "high_price",
+                       "low_price", "close_price", "volume"]
+MARKET_DATA_KEY = ["symbol", "bar_interval", "bar_time"]
+
+
+class CsvChunkStream:
+    """
+    File-like object rendering a dataframe as CSV one chunk at a time, so that
+    COPY FROM STDIN streams the frame without materializing Python row objects
+    or the whole CSV text at once.
+    """
+
+    def __init__(self, df, chunk_rows=50_000):
+        self.df = df
+        self.chunk_rows = chunk_rows
+        self.position = 0
+
+    def read(self, size=-1):
+        if self.position >= len(self.df):
+            return ""
+        chunk = self.df.iloc[self.position:self.position + self.chunk_rows]
+        self.position += self.chunk_rows
+        return chunk.to_csv(header=False, index=False, date_format="%Y-%m-%d %H:%M:%S")
+
+
+def prepare_ohlcv_frame(df, symbol=None, interval=DEFAULT_INTERVAL):
+    """
+    Selects the OHLCV columns in table order, keeps the last bar of each symbol and
+    date, and casts volume to a nullable integer so it renders as a BIGINT literal.
+    Frames without a 'Symbol' column are tagged with `symbol`, and bars are tagged
+    with their `interval`.
+    """
+    if 'Symbol' not in df.columns:
+        df = df.assign(Symbol=symbol)
+    df = df.assign(Interval=interval, Date=pd.to_datetime(df['Date']))
+    df = df[['Symbol', 'Interval', 'Date'] + OHLCV_COLUMNS].drop_duplicates(
+        subset=['Symbol', 'Date'], keep='last')
+    df = df.assign(Volume=pd.to_numeric(df['Volume']).round().astype('Int64'))
+    return df
+
+
+def load_market_data(connection, df, symbol="BTC-USD", chunk_rows=50_000,
+                     interval=DEFAULT_INTERVAL):
+    """
+    Streams the dataframe into a temporary staging table with COPY and merges it
+    into market_data, updating the OHLCV values of revised bars. The monthly
+    partitions the bars fall in are created first if needed.
+    The caller owns the transaction.
+    Args:
+        connection: An open psycopg2 connection.
+        df (pd.DataFrame): Frame with a 'Date' column, the OHLCV columns and
+            optionally a 'Symbol' column for multi-asset loads.
+        symbol (str): Ticker of the rows when the frame has no 'Symbol' column.
+        chunk_rows (int): Rows rendered per CSV chunk.
+        interval (str): Bar size of the rows, e.g. '1d'.
+    Returns:
+        int: Number of rows inserted or updated.
+    """
+    df = prepare_ohlcv_frame(df, symbol, interval)
+    columns = ", ".join(MARKET_DATA_COLUMNS)
+    key = ", ".join(MARKET_DATA_KEY)
+    updates = ",\n                ".join(
+        f"{col} = EXCLUDED.{col}" for col in MARKET_DATA_COLUMNS if col not in MARKET_DATA_KEY)
+    with connection.cursor() as cursor:
+        # Bar times are naive UTC in the frames
+        cursor.execute("SET LOCAL TIME ZONE 'UTC';")
+        if not df.empty:
+            ensure_partitions(cursor, df['Date'].min(), df['Date'].max())
+        cursor.execute("""
+            CREATE TEMP TABLE market_data_staging
+            (LIKE market_data INCLUDING DEFAULTS);
+        """)
+        cursor.copy_expert(
+            f"COPY market_data_staging ({columns}) FROM STDIN WITH (FORMAT csv)",
+            CsvChunkStream(df, chunk_rows)
+        )
+        logger.info(f"Copied {len(df)} rows into the staging table.")
+        cursor.execute(f"""
+            INSERT INTO market_data ({columns})
+            SELECT {columns} FROM market_data_staging
+            ON CONFLICT ({key})
+            DO UPDATE SET
+                {updates}
+            WHERE (market_data.open_price, market_data.high_price, market_data.low_price,
+                   market_data.close_price, market_data.volume)
+                IS DISTINCT FROM
+                  (EXCLUDED.open_price, EXCLUDED.high_price, EXCLUDED.low_price,
+                   EXCLUDED.close_price, EXCLUDED.volume);
+        """)
+        merged = cursor.rowcount
+        cursor.execute("DROP TABLE market_data_staging;")
+    return merged
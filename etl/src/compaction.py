@@ -0,0 +1,139 @@
+import argparse
+import logging
+import os
+
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.data_lake import (
+    OHLCV_SCHEMA, SCRATCH_FILENAME, STAGING_DIR, load_manifest, migrate_flat_layout,
+    save_manifest, table_to_frame, to_ohlcv_table)
+
+logger = logging.getLogger(__name__)
+
+
+def _write_sorted_table(table, path, row_group_size=None):
+    """
+    Writes a sorted table to a temporary file and atomically moves it into place.
+    Without an explicit row_group_size, one row group is written per month so that
+    the Date statistics of each row group stay narrow.
+    """
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with pq.ParquetWriter(tmp_path, table.schema) as writer:
+        if row_group_size:
+            writer.write_table(table, row_group_size=row_group_size)
+        else:
+            months = pc.month(table.column('Date')).to_numpy()
+            start = 0
+            for end in range(1, len(months) + 1):
+                if end == len(months) or months[end] != months[start]:
+                    writer.write_table(table.slice(start, end - start))
+                    start = end
+    os.replace(tmp_path, path)
+
+
+def _deduplicate_sorted(table):
+    """
+    Sorts by Date and keeps the last occurrence of each date, the input being in
+    manifest (write) order.
+    """
+    df = table_to_frame(table)
+    df = df.drop_duplicates(subset=['Date'], keep='last').sort_values('Date')
+    return to_ohlcv_table(df)
+
+
+def tidy_staging(root):
+    """
+    Removes the scratch file left by the extraction step, in both the staging area
+    and the former flat layout.
+    """
+    for path in (os.path.join(root, STAGING_DIR, SCRATCH_FILENAME),
+                 os.path.join(root, SCRATCH_FILENAME)):
+        if os.path.exists(path):
+            os.remove(path)
+            logger.info(f"Removed scratch file {path}")
+
+
+def compact_data_lake(root, row_group_size=None, min_files=2, prefix="btc_data"):
+    """
+    Merges the partition files of each year into a single sorted and deduplicated
+    yearly file, then atomically swaps it into the manifest.
+    Args:
+        root (str): Data lake root directory.
+        row_group_size (int, optional): Rows per row group, defaults to one per month.
+        min_files (int): Years with fewer files than this are left untouched.
+        prefix (str): Prefix of the yearly file names.
+    Returns:
+        int: The number of input files that were merged away.
+    """
+    root = str(root)
+    migrate_flat_layout(root)
+    manifest = load_manifest(root)
+
+    by_year = {}
+    for entry in manifest["files"]:
+        by_year.setdefault(entry["year"], []).append(entry)
+
+    compacted = {}
+    for year, entries in sorted(by_year.items()):
+        if len(entries) < min_files:
+            continue
+        paths = [os.path.join(root, entry["path"]) for entry in entries]
+        table = _deduplicate_sorted(
+            ds.dataset(paths, schema=OHLCV_SCHEMA, format="parquet").to_table())
+
+        relative_path = os.path.join(f"year={year}", f"{prefix}_{year}.parquet")
+        _write_sorted_table(table, os.path.join(root, relative_path), row_group_size)
+        dates = table_to_frame(table.select(['Date']))['Date']
+        compacted[year] = ({
+            "path": relative_path,
+            "year": int(year),
+            "month": None,
+            "start_date": dates.min().strftime("%Y-%m-%d"),
+            "end_date": dates.max().strftime("%Y-%m-%d"),
+            "rows": int(table.num_rows),
+            "created_at": max(entry["created_at"] for entry in entries),
+        }, entries)
+        logger.info(
+            f"Compacted {len(entries)} file(s) of {year} into {relative_path} "
+            f"({table.num_rows} rows)")
+
+    if compacted:
+        # The manifest is the source of truth: swap it first, then drop the inputs.
+        merged_years = set(compacted)
+        manifest["files"] = [entry for entry, _ in compacted.values()] + [
+            entry for entry in manifest["files"] if entry["year"] not in merged_years]
+        save_manifest(root, manifest)
+
+    removed = 0
+    for output, inputs in compacted.values():
+        for entry in inputs:
+            if entry["path"] == output["path"]:
+                continue
+            path = os.path.join(root, entry["path"])
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+            month_dir = os.path.dirname(path)
+            if os.path.isdir(month_dir) and not os.listdir(month_dir):
+                os.rmdir(month_dir)
+
+    tidy_staging(root)
+    logger.info(f"Compaction complete, {removed} file(s) merged away.")
+    return removed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Merge the data lake partition files into yearly files.")
+    parser.add_argument("--data-lake", default=os.getenv("DATA_LAKE_PATH"),
+                        help="Data lake root (defaults to $DATA_LAKE_PATH).")
+    parser.add_argument("--prefix", default="btc_data",
+                        help="Prefix of the yearly file names.")
+    parser.add_argument("--row-group-size", type=int, default=None,
+                        help="Rows per row group (defaults to one row group per month).")
+    args = parser.parse_args()
+    compact_data_lake(args.data_lake, row_group_size=args.row_group_size,
+                      prefix=args.prefix)
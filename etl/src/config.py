@@ -20,3 +20,23 @@ def get_db_config():
         "pass": DB_PASS,
         "port": DB_PORT
     }
+
+
+def get_symbols():
+    """
+    Pulls the list of tracked tickers from the SYMBOLS environment variable.
+    Returns:
+        list: Ticker symbols, e.g. ["BTC-USD", "ETH-USD"].
+    """
+    symbols = os.getenv("SYMBOLS", "BTC-USD")
+    return [symbol.strip().upper() for symbol in symbols.split(",") if symbol.strip()]
+
+
+def get_horizons():
+    """
+    Pulls the forecast horizons from the FORECAST_HORIZONS environment variable.
+    Returns:
+        list: Horizons in days, one model is trained per horizon, e.g. [1, 3, 7, 14, 30].
+    """
+    horizons = os.getenv("FORECAST_HORIZONS", "1,3,7,14,30")
+    return sorted({int(horizon) for horizon in horizons.split(",") if horizon.strip()})
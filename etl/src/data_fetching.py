@@ -1,6 +1,9 @@
-import yfinance as yf
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from src.data_lake import (
+    STAGING_DIR, SCRATCH_FILENAME, normalize_ohlcv, symbol_lake_dir, write_ohlcv_parquet)
+from src.market_data_source import YFinanceSource, fetch_missing, get_source
 
 logger = logging.getLogger(__name__)
 
@@ -8,6 +11,8 @@ logger = logging.getLogger(__name__)
 def save_to_parquet(df, output_dir, filename="btc_data.parquet"):
     """
     Saves the dataframe to a parquet file acting as a Data Lake / Backup.
+    The OHLCV schema of the data lake (date32 'Date', float64 prices, int64 volume)
+    is enforced, so readers never have to parse text.
     """
     try:
         # Create directory if it doesn't exist
@@ -16,7 +21,7 @@ def save_to_parquet(df, output_dir, filename="btc_data.parquet"):
         path = os.path.join(output_dir, filename)
 
         # Save to parquet (with compression usually enabled by default)
-        df.to_parquet(path)
+        write_ohlcv_parquet(normalize_ohlcv(df), path)
         logger.info(f"Data successfully saved to Parquet at {path}")
         return path
     except Exception as e:
@@ -24,16 +29,74 @@ def save_to_parquet(df, output_dir, filename="btc_data.parquet"):
         return None
 
 
-def pull_data_from_yfinance(output_dir, start_date, end_date):
+def pull_market_data(output_dir, start_date, end_date, symbol="BTC-USD", source=None,
+                     **fetch_kwargs):
     """
-    Pulls historical BTC-USD data from yfinance and saves it as a parquet file.
+    Pulls the bars of one ticker in [start_date, end_date) and stages them as a parquet
+    file in the staging area of its data lake. Only the dates missing from the data
+    lake are downloaded, see fetch_missing, which the keyword arguments are passed to.
+    Returns:
+        str: Path of the staged file, None if there are no bars in the range.
+    Raises:
+        MarketDataFetchError: If a missing range cannot be fetched.
+    """
+    df = fetch_missing(output_dir, symbol, start_date, end_date, source=source, **fetch_kwargs)
+    if df.empty:
+        logger.warning(f"No {symbol} data between {start_date} and {end_date}.")
+        return None
+    return save_to_parquet(df, os.path.join(output_dir, STAGING_DIR), filename=SCRATCH_FILENAME)
+
+
+def pull_data_from_yfinance(output_dir, start_date, end_date, symbol="BTC-USD"):
+    """
+    Pulls historical data of one ticker (BTC-USD by default) from yfinance and saves
+    it as a parquet file in the staging area of the data lake.
     """
     try:
         logger.info(
-            f"Fetching historical crypto data from yfinance from {start_date} to {end_date}...")
-        df = yf.download("BTC-USD", start=start_date,
-                         end=end_date, progress=False)
-        return save_to_parquet(df, output_dir, filename="extraction_to_ingestion.parquet")
+            f"Fetching historical {symbol} data from yfinance from {start_date} to {end_date}...")
+        return pull_market_data(output_dir, start_date, end_date, symbol, YFinanceSource())
     except Exception as e:
         logger.error(f"Error while fetching data from yfinance: {e}")
         return None
+
+
+def pull_data_for_symbols(lake_root, symbols, start_date, end_date, source=None,
+                          max_workers=4, retries=3, backoff=1.0):
+    """
+    Pulls several tickers concurrently and stages each of them in its own data lake
+    directory, each one from its own start date. The gaps of each ticker are detected separately, and the requests of
+    all tickers share one budget: at most `max_workers` are in flight, each retried
+    with the same policy.
+    Args:
+        lake_root (str): Parent directory of the per-ticker data lakes.
+        symbols (list): Ticker symbols to fetch.
+        start_date (dict or str): First date to fetch per symbol, or one for all of them.
+        source (MarketDataSource, optional): Backend, $MARKET_DATA_SOURCE by default.
+        max_workers (int): Concurrent requests across all tickers.
+        retries (int): Retries of a failed request, with an exponential backoff.
+        backoff (float): Base delay of the backoff in seconds.
+    Returns:
+        dict: Staged parquet path per symbol, None for the symbols that failed or
+            have no new bars.
+    """
+    start_dates = start_date if isinstance(start_date, dict) else dict.fromkeys(symbols, start_date)
+    logger.info(f"Fetching {len(symbols)} symbol(s) up to {end_date}...")
+    if not symbols:
+        return {}
+    source = source or get_source()
+    # Tickers in parallel, and the rest of the budget to the chunks of each ticker
+    ticker_workers = min(len(symbols), max_workers)
+    chunk_workers = max(1, max_workers // ticker_workers)
+
+    def pull(symbol):
+        try:
+            return pull_market_data(
+                symbol_lake_dir(lake_root, symbol), start_dates[symbol], end_date, symbol, source,
+                max_workers=chunk_workers, retries=retries, backoff=backoff)
+        except Exception as e:
+            logger.error(f"Error while fetching {symbol}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=ticker_workers) as executor:
+        return dict(zip(symbols, executor.map(pull, symbols)))
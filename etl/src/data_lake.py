@@ -0,0 +1,277 @@
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Re-exported: the naming helpers live in a dependency-free module for the DAGs
+from src.symbols import file_prefix, symbol_lake_dir, symbol_slug  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "_manifest.json"
+STAGING_DIR = "_staging"
+LEGACY_DIR = "_legacy"
+SCRATCH_FILENAME = "extraction_to_ingestion.parquet"
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+
+# Schema of every parquet file written to the data lake (daily bars)
+OHLCV_SCHEMA = pa.schema([
+    ("Date", pa.date32()),
+    ("Open", pa.float64()),
+    ("High", pa.float64()),
+    ("Low", pa.float64()),
+    ("Close", pa.float64()),
+    ("Volume", pa.int64()),
+])
+
+# Multipliers of the abbreviated volumes found in scraped data, e.g. "10K"
+VOLUME_SUFFIXES = {"": 1.0, "K": 1e3, "M": 1e6, "B": 1e9}
+
+
+def parse_numeric(series):
+    """
+    Returns a price column as float64. Numeric columns are returned as is, and only
+    text columns go through a vectorized strip of thousands separators and '$'.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64", copy=False)
+    return pd.to_numeric(series.astype(str).str.replace(r"[,$\s]", "", regex=True))
+
+
+def parse_volume(series):
+    """
+    Returns a volume column as float64, expanding abbreviated text values such as
+    "10K" or "1.5M" with vectorized string operations.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64", copy=False)
+    parts = series.astype(str).str.replace(",", "").str.strip().str.upper().str.extract(
+        r"^([-+]?[\d.]+(?:E[-+]?\d+)?)([KMB]?)$")
+    return pd.to_numeric(parts[0]) * parts[1].map(VOLUME_SUFFIXES).astype("float64")
+
+
+def normalize_ohlcv(df):
+    """
+    Flattens a yfinance dataframe into a 'Date' column followed by the OHLCV columns.
+    yfinance returns (Price, Ticker) MultiIndex columns and a 'Date' index.
+    Prices and volumes that arrive as text are parsed here, so the lake only ever
+    holds numbers.
+    """
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    if 'Date' not in df.columns:
+        df = df.rename_axis('Date').reset_index()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df[['Date'] + OHLCV_COLUMNS]
+    for col in PRICE_COLUMNS:
+        df[col] = parse_numeric(df[col])
+    df['Volume'] = parse_volume(df['Volume'])
+    return df.sort_values('Date').reset_index(drop=True)
+
+
+def to_ohlcv_table(df):
+    """
+    Converts a normalized OHLCV frame into an Arrow table of OHLCV_SCHEMA.
+    Raises:
+        pyarrow.ArrowInvalid: If a value does not fit the schema, e.g. an intraday time.
+    """
+    df = df.assign(Volume=df['Volume'].round().astype("Int64"))
+    return pa.Table.from_pandas(df[['Date'] + OHLCV_COLUMNS], schema=OHLCV_SCHEMA,
+                                preserve_index=False)
+
+
+def write_ohlcv_parquet(df, path):
+    """
+    Writes a normalized OHLCV frame to a parquet file with the enforced schema.
+    """
+    pq.write_table(to_ohlcv_table(df), path)
+
+
+def table_to_frame(table):
+    """
+    Converts an Arrow table read from the lake to pandas, with 'Date' as datetime64.
+    """
+    return table.to_pandas(date_as_object=False)
+
+
+def staging_path(root):
+    """
+    Returns the path of the scratch file used between extraction and ingestion.
+    The underscore prefix keeps it out of the partitioned dataset.
+    """
+    return os.path.join(root, STAGING_DIR, SCRATCH_FILENAME)
+
+
+def lake_root_from_staging(data_path):
+    """
+    Returns the data lake root that owns a staging file.
+    """
+    return str(Path(data_path).resolve().parent.parent)
+
+
+def load_manifest(root):
+    """
+    Loads the manifest listing every partition file with its date range and row count.
+    Entries are kept in write order, so later entries win on overlapping dates.
+    """
+    path = os.path.join(root, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {"files": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(root, manifest):
+    """
+    Atomically replaces the manifest file.
+    """
+    path = os.path.join(root, MANIFEST_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def write_partitioned(df, root, prefix):
+    """
+    Writes a dataframe into the Hive-style year=YYYY/month=MM layout and records
+    each written file in the manifest.
+    Args:
+        df (pd.DataFrame): Raw or normalized OHLCV data.
+        root (str): Data lake root directory.
+        prefix (str): File name prefix, e.g. 'btc_data_2024-01-01_2024-01-02'.
+    Returns:
+        list: The manifest entries of the written files.
+    """
+    df = normalize_ohlcv(df)
+    if df.empty:
+        logger.warning("No rows to write to the data lake.")
+        return []
+
+    manifest = load_manifest(root)
+    entries = []
+    for (year, month), chunk in df.groupby([df['Date'].dt.year, df['Date'].dt.month]):
+        relative_path = os.path.join(
+            f"year={year}", f"month={month:02d}", f"{prefix}.parquet")
+        path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_ohlcv_parquet(chunk, path)
+        entries.append({
+            "path": relative_path,
+            "year": int(year),
+            "month": int(month),
+            "start_date": chunk['Date'].min().strftime("%Y-%m-%d"),
+            "end_date": chunk['Date'].max().strftime("%Y-%m-%d"),
+            "rows": int(len(chunk)),
+            "created_at": datetime.now().isoformat(),
+        })
+
+    written = {entry["path"] for entry in entries}
+    manifest["files"] = [
+        entry for entry in manifest["files"] if entry["path"] not in written] + entries
+    save_manifest(root, manifest)
+    logger.info(
+        f"Wrote {len(df)} rows into {len(entries)} partition file(s) under {root}")
+    return entries
+
+
+def select_files(manifest, start_date=None, end_date=None):
+    """
+    Returns the manifest entries whose date range overlaps [start_date, end_date].
+    """
+    start = pd.Timestamp(start_date).strftime("%Y-%m-%d") if start_date else None
+    end = pd.Timestamp(end_date).strftime("%Y-%m-%d") if end_date else None
+    return [
+        entry for entry in manifest["files"]
+        if (start is None or entry["end_date"] >= start)
+        and (end is None or entry["start_date"] <= end)
+    ]
+
+
+def read_data_lake_table(root, start_date=None, end_date=None, columns=None):
+    """
+    Reads the data lake as an Arrow table, touching only the partition files that
+    overlap the requested date range, the requested columns, and pushing the date
+    predicate down to the parquet row groups.
+    Args:
+        root (str): Data lake root directory.
+        start_date (str, optional): Inclusive lower bound on 'Date'.
+        end_date (str, optional): Inclusive upper bound on 'Date'.
+        columns (list, optional): Columns to read, 'Date' is always included.
+    Returns:
+        pa.Table: Deduplicated rows sorted by 'Date'.
+    """
+    manifest = load_manifest(root)
+    if not manifest["files"]:
+        migrate_flat_layout(root)
+        manifest = load_manifest(root)
+
+    entries = select_files(manifest, start_date, end_date)
+    if columns is not None:
+        columns = ['Date'] + [col for col in columns if col != 'Date']
+    if not entries:
+        logger.warning(f"No partition file matches the requested range in {root}")
+        return OHLCV_SCHEMA.empty_table().select(columns or OHLCV_SCHEMA.names)
+
+    logger.info(
+        f"Reading {len(entries)} of {len(manifest['files'])} partition file(s) from {root}")
+    # Files written before the schema was enforced are cast to it while scanning
+    dataset = ds.dataset([os.path.join(root, entry["path"]) for entry in entries],
+                         schema=OHLCV_SCHEMA, format="parquet")
+    predicate = None
+    if start_date:
+        predicate = ds.field('Date') >= pd.Timestamp(start_date).date()
+    if end_date:
+        upper = ds.field('Date') <= pd.Timestamp(end_date).date()
+        predicate = upper if predicate is None else predicate & upper
+
+    table = dataset.to_table(columns=columns, filter=predicate)
+    # Overlapping backups are resolved in favour of the most recently written file:
+    # a stable sort keeps the file order among equal dates, the last one wins
+    dates = table.column('Date').to_numpy()
+    order = np.argsort(dates, kind='stable')
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = dates[order[1:]] != dates[order[:-1]]
+    return table.take(order[keep])
+
+
+def read_data_lake(root, start_date=None, end_date=None, columns=None):
+    """
+    Reads the data lake into pandas, see read_data_lake_table.
+    Returns:
+        pd.DataFrame: Deduplicated rows sorted by 'Date'.
+    """
+    return table_to_frame(read_data_lake_table(root, start_date, end_date, columns))
+
+
+def migrate_flat_layout(root):
+    """
+    Moves parquet files from the former flat layout into the partitioned layout.
+    The original files are kept under '_legacy/' and the scratch file is ignored.
+    """
+    if not os.path.isdir(root):
+        return
+    flat_files = sorted(
+        name for name in os.listdir(root)
+        if name.endswith(".parquet") and name != SCRATCH_FILENAME
+    )
+    if not flat_files:
+        return
+
+    logger.info(f"Migrating {len(flat_files)} flat parquet file(s) in {root}")
+    # Oldest backups first, so that newer files win on overlapping dates.
+    flat_files.sort(key=lambda name: os.path.getmtime(os.path.join(root, name)))
+    os.makedirs(os.path.join(root, LEGACY_DIR), exist_ok=True)
+    for name in flat_files:
+        path = os.path.join(root, name)
+        write_partitioned(pd.read_parquet(path), root, Path(name).stem)
+        os.replace(path, os.path.join(root, LEGACY_DIR, name))
@@ -0,0 +1,256 @@
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.data_lake import load_manifest, parse_numeric, parse_volume, read_data_lake
+from src.xgboost_training import convert_to_float, correct_data_types, create_features_for_xgboost
+
+logger = logging.getLogger(__name__)
+
+FEATURES_DIR = "_features"
+FEATURES_FILENAME = "features.parquet"
+STATE_FILENAME = "state.json"
+# Functions whose source determines the features, hashed into the store version
+FEATURE_FUNCTIONS = [parse_numeric, parse_volume, convert_to_float, correct_data_types,
+                     create_features_for_xgboost]
+# Raw bars needed before a new bar to compute all of its features:
+# the 30-bar std of log returns needs 31 closes
+TAIL_ROWS = 31
+# Bars whose target looks this far ahead (see create_features_for_xgboost)
+HORIZON = 7
+
+
+def features_version():
+    """
+    Hashes the source of the feature functions: a store built by other code is rebuilt.
+    """
+    digest = hashlib.sha256()
+    for function in FEATURE_FUNCTIONS:
+        digest.update(inspect.getsource(function).encode())
+    return digest.hexdigest()[:16]
+
+
+def manifest_entries(lake_dir):
+    """
+    Returns the [start_date, end_date, rows, created_at] of each data lake file by path.
+    """
+    return {entry["path"]: [entry["start_date"], entry["end_date"], entry["rows"],
+                            entry["created_at"]]
+            for entry in load_manifest(str(lake_dir))["files"]}
+
+
+def only_appended(stored, current, last_date, new_dates):
+    """
+    Tells whether the data lake only gained bars from the last stored date on since
+    the store was saved, from the manifests alone. A file may be new, or merged away
+    by a compaction, if it starts on or after that date. A file may grow at its end
+    by as many rows as there are new dates in its range (a compacted yearly file
+    receiving the latest bars). Anything else, e.g. a gap filled or a file rewritten
+    before that date, means the stored features may be stale.
+    Args:
+        stored (dict): manifest_entries() when the store was saved.
+        current (dict): manifest_entries() now.
+        last_date (str): Last stored date, 'YYYY-MM-DD'.
+        new_dates (pd.Series): Dates of the lake from last_date on.
+    """
+    for path, (start, *_) in stored.items():
+        if path not in current and start < last_date:
+            return False
+    for path, (start, end, rows, created_at) in current.items():
+        if stored.get(path) == [start, end, rows, created_at]:
+            continue
+        if path not in stored:
+            if start < last_date:
+                return False
+            continue
+        old_start, old_end, old_rows, _ = stored[path]
+        appended = ((new_dates > pd.Timestamp(old_end)) & (new_dates <= pd.Timestamp(end))).sum()
+        if start != old_start or end <= old_end or rows - old_rows != appended:
+            return False
+    return True
+
+
+def _store_paths(lake_dir):
+    directory = os.path.join(str(lake_dir), FEATURES_DIR)
+    return (directory, os.path.join(directory, FEATURES_FILENAME),
+            os.path.join(directory, STATE_FILENAME))
+
+
+def load_state(lake_dir):
+    """
+    Loads the state of the feature store of a data lake, or None if there is none.
+    """
+    _, _, state_path = _store_paths(lake_dir)
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def load_features(lake_dir):
+    """
+    Loads the persisted feature table, indexed by Date.
+    """
+    _, features_path, _ = _store_paths(lake_dir)
+    return pd.read_parquet(features_path).set_index('Date')
+
+
+def save_features(lake_dir, df, mode):
+    """
+    Atomically replaces the feature table, then its state file.
+    """
+    directory, features_path, state_path = _store_paths(lake_dir)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".tmp-{FEATURES_FILENAME}")
+    df.reset_index().to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, features_path)
+
+    state = {
+        "version": features_version(),
+        "manifest": manifest_entries(lake_dir),
+        "last_date": str(df.index.max()),
+        "rows": int(len(df)),
+        "mode": mode,
+        "updated_at": datetime.now().isoformat(),
+    }
+    with open(f"{state_path}.tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{state_path}.tmp", state_path)
+
+
+def build_features(lake_dir, start_date=None):
+    """
+    Computes the features over the whole data lake (or from start_date).
+    """
+    df = read_data_lake(lake_dir, start_date=start_date)
+    df = correct_data_types(convert_to_float(df))
+    return create_features_for_xgboost(df)
+
+
+def rebuild_feature_store(lake_dir):
+    """
+    Recomputes the feature table from the full history and persists it.
+    """
+    logger.info(f"Rebuilding the feature store of {lake_dir}...")
+    df = build_features(lake_dir)
+    save_features(lake_dir, df, mode="rebuild")
+    return df
+
+
+def append_features(store, new_bars):
+    """
+    Extends a feature table with the features of new raw bars in O(new bars).
+    Only the last TAIL_ROWS raw bars of the store are used as warm-up, and the
+    targets of the last HORIZON stored bars are recomputed with the new closes.
+    Bars of new_bars already in the store (e.g. a revised last day) replace them.
+    Args:
+        store (pd.DataFrame): Feature table indexed by Date.
+        new_bars (pd.DataFrame): Raw bars with a 'Date' column, sorted.
+    Returns:
+        pd.DataFrame: The extended feature table.
+    """
+    since = pd.Timestamp(new_bars['Date'].min())
+    kept = store[store.index < since]
+    tail = kept[new_bars.columns.drop('Date')].tail(TAIL_ROWS).reset_index()
+    frame = pd.concat([tail, new_bars], ignore_index=True)
+    appended = create_features_for_xgboost(frame)
+    appended = appended[appended.index >= since]
+
+    df = pd.concat([kept, appended])
+    # Targets look HORIZON bars ahead: refresh those that can now see the new closes
+    refreshed = len(appended) + HORIZON
+    close = df['Close'].iloc[-(refreshed + HORIZON):]
+    target = np.log(close.shift(-HORIZON) / close)
+    df.iloc[-refreshed:, df.columns.get_loc('target')] = target.iloc[-refreshed:].to_numpy()
+    return df
+
+
+def update_feature_store(lake_dir, verify=False):
+    """
+    Brings the feature table of a data lake up to date and returns it.
+    Only the bars since the last stored date are read and featurized. The store is
+    rebuilt from scratch when it is missing, was built by other feature code, when
+    the data lake changed otherwise than by new bars after its last date (see
+    only_appended), or when the incremental update fails.
+    Args:
+        lake_dir (str): Data lake directory of one ticker.
+        verify (bool): Compare the result against a full rebuild, and keep the
+            rebuild if they diverge.
+    Returns:
+        pd.DataFrame: Features and target indexed by Date, as create_features_for_xgboost.
+    """
+    state = load_state(lake_dir)
+    if state is None or state.get("version") != features_version():
+        return rebuild_feature_store(lake_dir)
+
+    try:
+        store = load_features(lake_dir)
+        # The last stored bar is read again, yfinance revises the current day
+        new_bars = read_data_lake(lake_dir, start_date=store.index.max())
+        last_date = store.index.max().strftime("%Y-%m-%d")
+        if not only_appended(state.get("manifest", {}), manifest_entries(lake_dir),
+                             last_date, new_bars['Date']):
+            logger.info(f"Bars before {last_date} changed in {lake_dir}.")
+            return rebuild_feature_store(lake_dir)
+        new_bars = correct_data_types(convert_to_float(new_bars))
+        df = append_features(store, new_bars)
+        logger.info(
+            f"Feature store of {lake_dir} updated with {len(new_bars)} bar(s).")
+    except Exception as e:
+        logger.error(f"Incremental feature update failed, rebuilding: {e}")
+        return rebuild_feature_store(lake_dir)
+
+    if verify and not check_consistency(df, build_features(lake_dir)):
+        return rebuild_feature_store(lake_dir)
+    save_features(lake_dir, df, mode="incremental")
+    return df
+
+
+def check_consistency(incremental, full, rtol=1e-9, atol=1e-12):
+    """
+    Compares an incrementally maintained feature table with a full rebuild.
+    Rolling windows accumulate rounding differently depending on where they start,
+    hence the tolerance.
+    Returns:
+        bool: True if both tables hold the same rows and values.
+    """
+    if not incremental.index.equals(full.index) or list(incremental.columns) != list(full.columns):
+        logger.warning(
+            f"Feature store rows differ from a full rebuild "
+            f"({len(incremental)} vs {len(full)} rows).")
+        return False
+    a = incremental.to_numpy(dtype=np.float64)
+    b = full.to_numpy(dtype=np.float64)
+    if not np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True):
+        max_diff = np.nanmax(np.abs(a - b))
+        logger.warning(f"Feature store values differ from a full rebuild (max diff {max_diff}).")
+        return False
+    logger.info("Feature store is consistent with a full rebuild.")
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the feature table of a data lake.")
+    parser.add_argument("--data-lake", default=os.getenv("DATA_LAKE_PATH"),
+                        help="Data lake of one ticker (defaults to $DATA_LAKE_PATH).")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute from scratch.")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check the store against a full rebuild.")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild_feature_store(args.data_lake)
+    elif args.verify:
+        consistent = check_consistency(load_features(args.data_lake),
+                                       build_features(args.data_lake))
+        raise SystemExit(0 if consistent else 1)
+    else:
+        update_feature_store(args.data_lake)
@@ -1,27 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import json
 import logging
+import os
+import threading
 import psycopg2
-from psycopg2 import extras
 import pandas as pd
-import os
-import shutil
-from pathlib import Path
 from src.config import get_db_config
-from src.data_fetching import pull_data_from_yfinance
+from src.market_data_source import fetch_missing, get_source, split_range
+from src.bulk_load import load_market_data
+from src.data_lake import file_prefix, migrate_flat_layout, write_partitioned
+from src.market_data_schema import create_market_data_table
 
 
 logger = logging.getLogger(__name__)
 
+# Chunks already loaded by the bootstrap of a data lake, so that it resumes
+BOOTSTRAP_CHECKPOINT = "_bootstrap.json"
 
-now = datetime.now()
-formatted_date = now.strftime("%Y-%m-%d")
-db_config = get_db_config()
 
+class BootstrapError(Exception):
+    """
+    Raised when some chunks of the historical bootstrap failed. The others are
+    checkpointed, rerunning init_db only retries the failed ones.
+    """
 
-def verify_db(db_config=db_config, table_name="market_data"):
+
+def verify_db(db_config=None, table_name="market_data"):
     """
     Verifies the connection to the PostgreSQL database.
     """
+    db_config = db_config or get_db_config()
     try:
         connection = psycopg2.connect(
             user=db_config["user"],
@@ -45,64 +54,167 @@ def verify_db(db_config=db_config, table_name="market_data"):
         return False
 
 
-def init_db(output_dir, db_config=db_config, start_date='2016-01-01'):
+def migrate_db(db_config=None):
     """
-    Initializes the PostgreSQL database with historical BTC-USD data from yfinance.
+    Brings the market_data schema up to date on an existing database.
     """
-    initial_data_path = pull_data_from_yfinance(output_dir,
-                                                start_date=start_date, end_date=formatted_date)
-    logger.info("Initial data pulled from yfinance")
-    df = pd.read_parquet(initial_data_path)
-    logger.info("Initial db data fetched from parquet")
-    filename = f"btc_data_{start_date}.parquet"
-    logger.info("Saving permanent backup of initial data...")
-    shutil.copy(initial_data_path, os.path.join(
-        Path(initial_data_path).parent, filename))
-
+    db_config = db_config or get_db_config()
+    connection = psycopg2.connect(
+        user=db_config["user"],
+        password=db_config["pass"],
+        host=db_config["host"],
+        port=db_config["port"],
+        database=db_config["name"]
+    )
     try:
-        logger.info("Connecting to the PostgreSQL database...")
-        connection = psycopg2.connect(
-            user=db_config["user"],
-            password=db_config["pass"],
-            host=db_config["host"],
-            port=db_config["port"],
-            database=db_config["name"]
-        )
-        cursor = connection.cursor()
-        logger.info("Creating table and inserting data...")
-        create_table_query = '''
-        CREATE TABLE IF NOT EXISTS market_data (
-            trading_date DATE PRIMARY KEY,     -- The index (Date)
-            open_price NUMERIC,                -- NUMERIC is best for money (exact precision)
-            high_price NUMERIC,
-            low_price NUMERIC,
-            close_price NUMERIC,
-            volume BIGINT                  -- BIGINT for large volumes (integers)
-        );
-        '''
-        cursor.execute(create_table_query)
-        df_clean = df.reset_index()
-        data_list = [tuple(x) for x in df_clean.to_numpy()]
-        insert_query = """
-            INSERT INTO market_data (
-                trading_date, 
-                open_price, 
-                high_price, 
-                low_price, 
-                close_price, 
-                volume
-            ) VALUES %s
-            ON CONFLICT (trading_date) DO NOTHING;
-        """
-        extras.execute_values(
-            cursor,
-            insert_query,
-            data_list
-        )
+        with connection.cursor() as cursor:
+            create_market_data_table(cursor)
         connection.commit()
-        cursor.close()
+    finally:
         connection.close()
-    except Exception as e:
-        logger.error(f"Error while interacting with the database: {e}")
+
+
+def _connect(db_config):
+    return psycopg2.connect(
+        user=db_config["user"],
+        password=db_config["pass"],
+        host=db_config["host"],
+        port=db_config["port"],
+        database=db_config["name"]
+    )
+
+
+def load_checkpoint(output_dir):
+    """
+    Loads the bootstrap checkpoint of a data lake, None if it was never bootstrapped.
+    """
+    path = os.path.join(str(output_dir), BOOTSTRAP_CHECKPOINT)
+    if not os.path.exists(path):
         return None
-    return True
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(output_dir, checkpoint):
+    """
+    Atomically replaces the bootstrap checkpoint.
+    """
+    os.makedirs(str(output_dir), exist_ok=True)
+    path = os.path.join(str(output_dir), BOOTSTRAP_CHECKPOINT)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def bootstrap_pending(output_dir):
+    """
+    Tells whether a bootstrap of this data lake was started but did not complete.
+    """
+    checkpoint = load_checkpoint(output_dir)
+    return checkpoint is not None and not checkpoint["complete"]
+
+
+def _chunk_key(start, end):
+    return f"{start.strftime('%Y-%m-%d')}_{end.strftime('%Y-%m-%d')}"
+
+
+def bootstrap_chunk(output_dir, db_config, symbol, start, end, source, lake_lock):
+    """
+    Fetches the bars of one chunk, writes them to the data lake and loads them into
+    market_data in their own transaction.
+    Returns:
+        int: Number of rows loaded.
+    """
+    end_date = end.strftime("%Y-%m-%d")
+    df = fetch_missing(output_dir, symbol, start.strftime("%Y-%m-%d"), end_date,
+                       source=source, max_workers=1, lake_lock=lake_lock)
+    if df.empty:
+        logger.warning(f"No {symbol} data from {start.date()} to {end.date()}.")
+        return 0
+    # The manifest is rewritten by each write, the lake is only read under the lock
+    with lake_lock:
+        write_partitioned(df, output_dir, f"{file_prefix(symbol)}_{_chunk_key(start, end)}")
+    connection = _connect(db_config)
+    try:
+        rows = load_market_data(connection, df, symbol)
+        connection.commit()
+    finally:
+        connection.close()
+    return rows
+
+
+def init_db(output_dir, db_config=None, start_date='2016-01-01', symbol="BTC-USD",
+            source=None, chunk_days=None, max_workers=None):
+    """
+    Initializes the PostgreSQL database with the historical data of one ticker
+    (BTC-USD by default), from yfinance unless another source is given.
+    The history is split in chunks of `chunk_days` days, each one fetched, written to
+    the data lake and loaded in its own transaction, several chunks at a time, so the
+    memory holds only the chunks in flight. Loaded chunks are checkpointed in the data
+    lake: a bootstrap that failed part way resumes from the missing chunks.
+    History already in the data lake or in the fetch cache is not downloaded again.
+    Args:
+        output_dir (str): Data lake directory of the ticker.
+        chunk_days (int, optional): Days per chunk, defaults to $BOOTSTRAP_CHUNK_DAYS or 365.
+        max_workers (int, optional): Chunks in flight, defaults to $BOOTSTRAP_WORKERS or 4.
+    Returns:
+        int: Number of rows loaded.
+    Raises:
+        BootstrapError: If some chunks could not be fetched or loaded.
+    """
+    db_config = db_config or get_db_config()
+    source = source or get_source()
+    chunk_days = chunk_days or int(os.getenv("BOOTSTRAP_CHUNK_DAYS", "365"))
+    max_workers = max_workers or int(os.getenv("BOOTSTRAP_WORKERS", "4"))
+
+    logger.info("Connecting to the PostgreSQL database...")
+    connection = _connect(db_config)
+    try:
+        with connection.cursor() as cursor:
+            create_market_data_table(cursor)
+        connection.commit()
+    finally:
+        connection.close()
+
+    # Migrated once before the chunks run: a migration from a worker would rewrite
+    # the lake while the other workers read and write it
+    migrate_flat_layout(output_dir)
+    checkpoint = load_checkpoint(output_dir) or {"symbol": symbol, "chunks": {}}
+    chunks = split_range(pd.Timestamp(start_date), pd.Timestamp(datetime.now().date()),
+                         chunk_days)
+    pending = [chunk for chunk in chunks if _chunk_key(*chunk) not in checkpoint["chunks"]]
+    checkpoint["complete"] = False
+    save_checkpoint(output_dir, checkpoint)
+    logger.info(
+        f"Bootstrapping {symbol} from {start_date}: {len(pending)} of {len(chunks)} "
+        f"chunk(s) of {chunk_days} days to load on {max_workers} worker(s)...")
+
+    lake_lock = threading.Lock()
+    rows, failed = 0, []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(bootstrap_chunk, output_dir, db_config, symbol, *chunk, source,
+                            lake_lock): chunk
+            for chunk in pending
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            key = _chunk_key(*futures[future])
+            try:
+                loaded = future.result()
+            except Exception as e:
+                logger.error(f"Bootstrap chunk {key} of {symbol} failed: {e}")
+                failed.append(key)
+                continue
+            rows += loaded
+            # Checkpointed from this thread only, once the chunk is committed
+            checkpoint["chunks"][key] = loaded
+            save_checkpoint(output_dir, checkpoint)
+            logger.info(f"Bootstrapped {done}/{len(pending)} chunk(s) of {symbol}, {rows} row(s).")
+
+    if failed:
+        raise BootstrapError(
+            f"{len(failed)} bootstrap chunk(s) of {symbol} failed ({', '.join(sorted(failed))}), "
+            f"rerun to resume.")
+    checkpoint["complete"] = True
+    save_checkpoint(output_dir, checkpoint)
+    return rows
@@ -0,0 +1,217 @@
+import json
+import logging
+import resource
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import pyarrow.parquet as pq
+from psycopg2 import extras
+
+from src.update_db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+SPAN_FIELDS = [
+    "run_id", "stage", "symbol", "started_at", "wall_seconds", "cpu_seconds", "peak_rss_mb",
+    "rows_in", "rows_out", "bytes_read", "bytes_written", "status", "error",
+]
+
+CREATE_PIPELINE_RUNS_QUERY = """
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id SERIAL PRIMARY KEY,
+    run_id VARCHAR(64) NOT NULL,
+    stage VARCHAR(100) NOT NULL,
+    symbol VARCHAR(20),
+    started_at TIMESTAMP NOT NULL,
+    wall_seconds DOUBLE PRECISION,
+    cpu_seconds DOUBLE PRECISION,
+    peak_rss_mb DOUBLE PRECISION,
+    rows_in BIGINT,
+    rows_out BIGINT,
+    bytes_read BIGINT,
+    bytes_written BIGINT,
+    status VARCHAR(20) NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS pipeline_runs_stage_started_at_idx
+    ON pipeline_runs (stage, started_at);
+"""
+
+# Spans finished in this process and not saved yet, and the spans being measured
+_pending = []
+_active = []
+_run = {"id": None}
+
+
+def start_run(run_id=None):
+    """
+    Sets the identifier attached to the following spans, e.g. the Airflow run_id.
+    Returns:
+        str: The run identifier, a new random one by default.
+    """
+    _run["id"] = run_id or uuid.uuid4().hex
+    return _run["id"]
+
+
+def current_run_id():
+    return _run["id"] or start_run()
+
+
+def _read_proc(path, fields):
+    try:
+        with open(path) as f:
+            lines = dict(line.split(":", 1) for line in f if ":" in line)
+        return {field: int(lines[field].split()[0]) for field in fields}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _peak_rss_mb():
+    """
+    Returns the peak RSS since the last reset in MB (VmHWM), or the peak of the
+    whole process where /proc is unavailable.
+    """
+    status = _read_proc("/proc/self/status", ["VmHWM"])
+    if status is not None:
+        return status["VmHWM"] / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux only)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _io_bytes():
+    """
+    Returns the bytes read and written through I/O system calls by this process,
+    files and sockets (e.g. the COPY to Postgres) alike.
+    """
+    io = _read_proc("/proc/self/io", ["rchar", "wchar"])
+    return (io["rchar"], io["wchar"]) if io is not None else (None, None)
+
+
+class Span:
+    """
+    Measurements of one pipeline stage. Row counts are reported by the stage
+    itself through record(), the rest is measured by stage().
+    """
+
+    def __init__(self, stage, symbol=None):
+        self.stage = stage
+        self.symbol = symbol
+        self.rows_in = None
+        self.rows_out = None
+        self.peak_rss_mb = 0.0
+
+    def record(self, rows_in=None, rows_out=None):
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + int(rows_in)
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + int(rows_out)
+
+
+@contextmanager
+def stage(name, symbol=None):
+    """
+    Measures a pipeline stage: wall and CPU time, peak RSS, bytes read/written, and
+    the rows reported with span.record(). The result is logged as one JSON line and
+    kept for flush_spans(). Exceptions are recorded and re-raised.
+    Usage:
+        with stage("load", symbol) as span:
+            span.record(rows_in=len(df))
+    """
+    span = Span(name, symbol)
+    if _active:
+        # The reset below would hide the peak of the enclosing stage so far
+        _active[-1].peak_rss_mb = max(_active[-1].peak_rss_mb, _peak_rss_mb())
+    _reset_peak_rss()
+    _active.append(span)
+    started_at = datetime.now()
+    read_start, written_start = _io_bytes()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    status, error = "success", None
+    try:
+        yield span
+    except Exception as e:
+        status, error = "failed", str(e)
+        raise
+    finally:
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        read_end, written_end = _io_bytes()
+        _active.pop()
+        span.peak_rss_mb = max(span.peak_rss_mb, _peak_rss_mb())
+        if _active:
+            _active[-1].peak_rss_mb = max(_active[-1].peak_rss_mb, span.peak_rss_mb)
+        record = {
+            "run_id": current_run_id(),
+            "stage": name,
+            "symbol": symbol,
+            "started_at": started_at.isoformat(),
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "peak_rss_mb": round(span.peak_rss_mb, 1),
+            "rows_in": span.rows_in,
+            "rows_out": span.rows_out,
+            "bytes_read": read_end - read_start if read_start is not None else None,
+            "bytes_written": written_end - written_start if written_start is not None else None,
+            "status": status,
+            "error": error,
+        }
+        _pending.append(record)
+        logger.info(json.dumps(record))
+
+
+def parquet_rows(path):
+    """
+    Returns the row count of a parquet file from its footer, without reading it.
+    """
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def collect_spans():
+    """
+    Returns and forgets the spans recorded in this process, e.g. to send those of a
+    pool worker back to the parent.
+    """
+    spans = list(_pending)
+    _pending.clear()
+    return spans
+
+
+def add_spans(spans):
+    """
+    Queues spans recorded in another process for the next flush_spans().
+    """
+    _pending.extend(spans)
+
+
+def flush_spans(db_config=None):
+    """
+    Saves the recorded spans into the pipeline_runs table (created if needed) in
+    one insert.
+    Failing to save them is logged, it never fails the pipeline.
+    Returns:
+        int: The number of spans saved.
+    """
+    spans = collect_spans()
+    if not spans:
+        return 0
+    query = f"INSERT INTO pipeline_runs ({', '.join(SPAN_FIELDS)}) VALUES %s;"
+    try:
+        with get_db_connection(db_config) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(CREATE_PIPELINE_RUNS_QUERY)
+                extras.execute_values(
+                    cursor, query, [tuple(span[field] for field in SPAN_FIELDS) for span in spans])
+        logger.info(f"Saved {len(spans)} span(s) of run {spans[0]['run_id']}.")
+        return len(spans)
+    except Exception as e:
+        logger.error(f"Failed to save the pipeline spans: {e}")
+        return 0
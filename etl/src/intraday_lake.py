@@ -0,0 +1,102 @@
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.data_lake import OHLCV_COLUMNS, PRICE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Intraday bars live next to the daily files of a ticker, whose Date column is a
+# date32 and cannot hold a bar time: <lake_dir>/_intraday/<interval>/date=<day>/
+INTRADAY_DIR = "_intraday"
+COMPACTED_FILENAME = "bars.parquet"
+INTRADAY_SCHEMA = pa.schema(
+    [pa.field("Date", pa.timestamp("ms"))]
+    + [pa.field(col, pa.float64()) for col in PRICE_COLUMNS]
+    + [pa.field("Volume", pa.int64())]
+)
+
+
+def intraday_dir(lake_dir, interval):
+    return os.path.join(str(lake_dir), INTRADAY_DIR, interval)
+
+
+def write_bars(lake_dir, interval, df):
+    """
+    Appends a micro-batch of closed bars of one ticker to its intraday lake, one
+    file per day touched.
+    Args:
+        df (pd.DataFrame): Bars with a naive UTC 'Date' column and the OHLCV columns.
+    Returns:
+        list: The written file paths.
+    """
+    df = df.assign(Date=pd.to_datetime(df['Date']),
+                   Volume=pd.to_numeric(df['Volume']).round().astype('int64'))
+    paths = []
+    for day, group in df.groupby(df['Date'].dt.normalize()):
+        directory = os.path.join(intraday_dir(lake_dir, interval), f"date={day.date()}")
+        os.makedirs(directory, exist_ok=True)
+        first, last = group['Date'].min(), group['Date'].max()
+        path = os.path.join(
+            directory, f"part-{first.strftime('%H%M%S')}-{last.strftime('%H%M%S')}.parquet")
+        table = pa.Table.from_pandas(
+            group[['Date'] + OHLCV_COLUMNS], schema=INTRADAY_SCHEMA, preserve_index=False)
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        paths.append(path)
+    return paths
+
+
+def compact_days(lake_dir, interval, before):
+    """
+    Merges the micro-batch files of every day before `before` into one file per day.
+    Days still being written are left alone.
+    Returns:
+        int: The number of days compacted.
+    """
+    root = intraday_dir(lake_dir, interval)
+    if not os.path.isdir(root):
+        return 0
+    compacted = 0
+    for name in sorted(os.listdir(root)):
+        if not name.startswith("date=") or name[len("date="):] >= str(pd.Timestamp(before).date()):
+            continue
+        directory = os.path.join(root, name)
+        parts = sorted(f for f in os.listdir(directory) if f.endswith(".parquet"))
+        if parts == [COMPACTED_FILENAME] or not parts:
+            continue
+        table = pa.concat_tables(pq.read_table(os.path.join(directory, f)) for f in parts)
+        table = table.sort_by("Date")
+        path = os.path.join(directory, COMPACTED_FILENAME)
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        for f in parts:
+            if f != COMPACTED_FILENAME:
+                os.remove(os.path.join(directory, f))
+        compacted += 1
+    if compacted:
+        logger.info(f"Compacted {compacted} day(s) of {interval} bars in {root}")
+    return compacted
+
+
+def read_bars(lake_dir, interval, start=None, end=None):
+    """
+    Reads the intraday bars of one ticker in [start, end), sorted by time.
+    """
+    root = intraday_dir(lake_dir, interval)
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=['Date'] + OHLCV_COLUMNS)
+    dataset = ds.dataset(root, format="parquet", schema=INTRADAY_SCHEMA)
+    condition = None
+    for bound, op in ((start, "ge"), (end, "lt")):
+        if bound is not None:
+            clause = getattr(ds.field("Date"), f"__{op}__")(
+                pa.scalar(pd.Timestamp(bound), type=pa.timestamp("ms")))
+            condition = clause if condition is None else condition & clause
+    df = dataset.to_table(filter=condition).to_pandas()
+    return (df.drop_duplicates(subset=['Date'], keep='last')
+            .sort_values('Date').reset_index(drop=True))
@@ -1,11 +1,16 @@
 import logging
 import os
 from pathlib import Path
-from src.config import get_db_config
-from src.init_db import init_db, verify_db
-from src.update_db import update_db, get_latest_date_in_db, save_permanent_backup_parquet, save_prediction, create_prediction_table
-from src.xgboost_training import training_task
-from src.data_fetching import pull_data_from_yfinance
+from src.config import get_db_config, get_horizons, get_symbols
+from src.init_db import bootstrap_pending, init_db, migrate_db, verify_db
+from src.update_db import update_db, get_latest_date_in_db, save_permanent_backup_parquet, save_predictions, create_prediction_table
+from src.multi_asset import train_symbols
+from src.data_fetching import pull_data_for_symbols
+from src.data_lake import file_prefix, symbol_lake_dir
+from src.compaction import compact_data_lake
+from src.instrumentation import flush_spans, parquet_rows, stage, start_run
+from src.model_registry import register_models
+from src.run_state import RunState, db_target, file_hash, stage_key
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -20,38 +25,91 @@ logging.basicConfig(
 CURRENT_DIR = Path(__file__).resolve().parent.parent
 DATA_LAKE_PATH = CURRENT_DIR.parent / "data_lake" / "btc_usd"
 output_dir = os.getenv("DATA_LAKE_PATH", DATA_LAKE_PATH)
+# Each ticker gets its own directory next to the BTC-USD one (data_lake/<symbol_slug>)
+lake_root = os.getenv("DATA_LAKE_ROOT", Path(output_dir).parent)
+MODEL_PATH = CURRENT_DIR.parent / "shared_models"
+model_dir = os.getenv("MODEL_DIR", MODEL_PATH)
+# Optional lower bound on the training window, only these partitions are read
+training_start_date = os.getenv("TRAINING_START_DATE")
 
 
-def pipeline(output_dir=output_dir):
+def pipeline(lake_root=lake_root, symbols=None, force=None):
     """
-    Main ETL pipeline function.
+    Main ETL pipeline function. One model is trained per symbol and horizon
+    ($FORECAST_HORIZONS). The stages whose inputs are unchanged since their
+    last successful run are skipped (see src.run_state), so a rerun resumes from
+    the first stale or failed stage.
     Args:
-        output_dir (Path): Directory to store data files.
+        lake_root (Path): Parent directory of the per-ticker data lakes.
+        symbols (list, optional): Tickers to process, defaults to $SYMBOLS.
+        force (bool, optional): Rerun every stage, defaults to $PIPELINE_FORCE=1.
     Returns:
-        predicted_return (float): The predicted return from the model.
+        predictions (dict): The predicted return of each symbol by horizon.
     """
-    logger.info("Starting ETL Pipeline...")
-    if verify_db() is False:
-        logger.info("Initializing database...")
-        init_db(output_dir)
-    logger.info("Updating database with new data...")
+    symbols = symbols or get_symbols()
+    horizons = get_horizons()
+    run_id = start_run()
+    logger.info(f"Starting ETL Pipeline {run_id} for {', '.join(symbols)}...")
     db_config = get_db_config()
-    start_date = get_latest_date_in_db(db_config)  # Get latest date from DB
-    end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-    # Pull new data and save to parquet
-    data_path = pull_data_from_yfinance(output_dir, start_date, end_date)
-    # Save permanent backup in parquet
-    save_permanent_backup_parquet(data_path, start_date, end_date)
-    # Update DB with new data (from parquet to postgres)
-    update_db(db_config, data_path)
-    logger.info("Training XGBoost model...")
-    # Clean Data and Train XGBoost model and get prediction
-    predicted_return = training_task(output_dir)
-    logger.info("Pipeline completed successfully.")
-    create_prediction_table(db_config)  # Ensure prediction table exists
-    # Save the predicted return to DB
-    save_prediction(db_config, predicted_return[0])
-    return predicted_return
+    state = RunState(lake_root, force)
+    try:
+        with stage("init_db"):
+            bootstrap_dir = symbol_lake_dir(lake_root, "BTC-USD")
+            # A partial bootstrap leaves the table behind, its checkpoint tells it apart
+            if verify_db() is False or bootstrap_pending(bootstrap_dir):
+                logger.info("Initializing database...")
+                init_db(bootstrap_dir)
+            migrate_db()
+        logger.info("Updating database with new data...")
+        # Fetch each symbol from its own latest date, a new symbol does not refetch the others
+        start_dates = {symbol: get_latest_date_in_db(db_config, symbol) for symbol in symbols}
+        end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        # Pull new data and save to parquet
+        with stage("fetch") as span:
+            data_paths = pull_data_for_symbols(lake_root, symbols, start_dates, end_date)
+            span.record(rows_out=sum(parquet_rows(path) for path in data_paths.values() if path))
+        for symbol, data_path in data_paths.items():
+            if data_path is None:
+                continue
+            rows = parquet_rows(data_path)
+            data_hash = file_hash(data_path)
+            # Save permanent backup in parquet, unless these bars were already backed up
+            with stage("backup", symbol) as span:
+                span.record(rows_in=rows)
+                state.run(stage_key("backup", symbol), {"data": data_hash},
+                          lambda: save_permanent_backup_parquet(
+                              data_path, start_dates[symbol], end_date, symbol))
+            # Update DB with new data (from parquet to postgres)
+            with stage("load", symbol) as span:
+                span.record(rows_in=rows, rows_out=state.run(
+                    stage_key("load", symbol), {"data": data_hash, "db": db_target(db_config)},
+                    lambda: update_db(db_config, data_path, symbol),
+                    succeeded=lambda merged: merged is not None) or 0)
+            # Merge the small daily backups into yearly files and drop the scratch file
+            with stage("compact", symbol):
+                compact_data_lake(symbol_lake_dir(lake_root, symbol), prefix=file_prefix(symbol))
+        logger.info("Training XGBoost models...")
+        # Clean Data and Train one XGBoost model per symbol and horizon over a process pool
+        with stage("train"):
+            predictions = train_symbols(
+                symbols, lake_root, model_root=model_dir, start_date=training_start_date,
+                state=state, horizons=horizons)
+        logger.info("Pipeline completed successfully.")
+        with stage("save_predictions") as span:
+            create_prediction_table(db_config)  # Ensure prediction table exists
+            # Record the trained models, the predictions reference their version
+            versions = register_models(db_config, model_dir, symbols, horizons)
+            # Save the predicted returns to DB in one bulk insert, once per model and data
+            saved = state.run(
+                "save_predictions",
+                {"predictions": predictions, "versions": versions, "db": db_target(db_config)},
+                lambda: save_predictions(db_config, predictions, versions),
+                succeeded=lambda saved: saved is not None)
+            span.record(rows_out=saved or 0)
+        return predictions
+    finally:
+        # Keep the timings of failed runs too, they are the interesting ones
+        flush_spans(db_config)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Monthly partitions created past the current month, so inserts never fall back
+# to the default partition in normal operation
+PARTITION_MONTHS_AHEAD = 3
+DEFAULT_INTERVAL = "1d"
+
+CREATE_MARKET_DATA_QUERY = '''
+CREATE TABLE IF NOT EXISTS market_data (
+    symbol VARCHAR(20) NOT NULL,               -- Ticker, e.g. BTC-USD
+    bar_interval VARCHAR(8) NOT NULL DEFAULT '1d',  -- Bar size, e.g. 1d, 1h, 1m
+    bar_time TIMESTAMPTZ NOT NULL,             -- Opening time of the bar (UTC)
+    open_price DOUBLE PRECISION,
+    high_price DOUBLE PRECISION,
+    low_price DOUBLE PRECISION,
+    close_price DOUBLE PRECISION,
+    volume BIGINT,
+    PRIMARY KEY (symbol, bar_interval, bar_time)
+) PARTITION BY RANGE (bar_time);
+-- Catches the bars outside of the monthly partitions, see ensure_partitions
+CREATE TABLE IF NOT EXISTS market_data_default PARTITION OF market_data DEFAULT;
+-- The primary key serves the per-symbol range reads and MAX(bar_time), the BRIN
+-- index the cross-symbol time scans: bars are appended in time order
+CREATE INDEX IF NOT EXISTS market_data_bar_time_brin
+    ON market_data USING brin (bar_time) WITH (pages_per_range = 32);
+'''
+
+
+def partition_name(month):
+    return f"market_data_{month.strftime('%Y%m')}"
+
+
+def month_range(start, end):
+    """
+    Lists the first day of every month overlapping [start, end].
+    """
+    first = pd.Timestamp(start).to_period("M").to_timestamp()
+    last = pd.Timestamp(end).to_period("M").to_timestamp()
+    return list(pd.date_range(first, last, freq="MS"))
+
+
+def _is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('market_data');")
+    row = cursor.fetchone()
+    return None if row is None else row[0] == "p"
+
+
+def _partitions(cursor):
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'market_data'::regclass;
+    """)
+    return {row[0] for row in cursor.fetchall()}
+
+
+def ensure_partitions(cursor, start, end):
+    """
+    Creates the monthly partitions of market_data covering [start, end] that do not
+    exist yet. Bars of those months already in the default partition are moved to
+    the new partition, which is only attached once they are out of the default one.
+    Returns:
+        int: The number of partitions created.
+    """
+    existing = _partitions(cursor)
+    if all(partition_name(month) in existing for month in month_range(start, end)):
+        return 0
+    # Serializes concurrent loaders, then sees the partitions they may have created
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('market_data_partitions'));")
+    existing = _partitions(cursor)
+    created = 0
+    for month in month_range(start, end):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        lower = month.strftime("%Y-%m-%d 00:00:00+00")
+        upper = (month + pd.offsets.MonthBegin()).strftime("%Y-%m-%d 00:00:00+00")
+        cursor.execute(
+            f"CREATE TABLE {name} (LIKE market_data INCLUDING DEFAULTS INCLUDING CONSTRAINTS);")
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM market_data_default
+                WHERE bar_time >= %s AND bar_time < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved;
+        """, (lower, upper))
+        if cursor.rowcount:
+            logger.info(f"Moved {cursor.rowcount} rows from market_data_default to {name}.")
+        cursor.execute(
+            f"ALTER TABLE market_data ATTACH PARTITION {name} "
+            f"FOR VALUES FROM (%s) TO (%s);", (lower, upper))
+        created += 1
+    if created:
+        logger.info(f"Created {created} market_data partition(s) from {start} to {end}.")
+    return created
+
+
+def ensure_partitions_ahead(cursor, months=PARTITION_MONTHS_AHEAD):
+    """
+    Creates the partitions of the current month and of the next `months` months.
+    """
+    now = pd.Timestamp(datetime.now())
+    return ensure_partitions(cursor, now, now + pd.DateOffset(months=months))
+
+
+def migrate_legacy_table(cursor):
+    """
+    Copies a former market_data heap table (NUMERIC prices keyed by symbol and
+    trading_date) into the partitioned table as daily bars, then drops it.
+    The caller owns the transaction, so a failed migration leaves the old table intact.
+    """
+    logger.info("Migrating market_data to the partitioned, timestamp-keyed schema...")
+    # Tables older than the multi-asset schema have no symbol column
+    cursor.execute("""
+        ALTER TABLE market_data
+        ADD COLUMN IF NOT EXISTS symbol VARCHAR(20) NOT NULL DEFAULT 'BTC-USD';
+    """)
+    cursor.execute("ALTER TABLE market_data RENAME TO market_data_legacy;")
+    cursor.execute("ALTER INDEX IF EXISTS market_data_pkey RENAME TO market_data_legacy_pkey;")
+    cursor.execute(CREATE_MARKET_DATA_QUERY)
+    cursor.execute("SELECT MIN(trading_date), MAX(trading_date) FROM market_data_legacy;")
+    first, last = cursor.fetchone()
+    if first is not None:
+        ensure_partitions(cursor, first, last)
+    cursor.execute("""
+        INSERT INTO market_data (symbol, bar_interval, bar_time, open_price, high_price,
+                                 low_price, close_price, volume)
+        SELECT symbol, '1d', trading_date::timestamp AT TIME ZONE 'UTC',
+               open_price::double precision, high_price::double precision,
+               low_price::double precision, close_price::double precision, volume
+        FROM market_data_legacy;
+    """)
+    logger.info(f"Migrated {cursor.rowcount} rows to the partitioned market_data.")
+    cursor.execute("DROP TABLE market_data_legacy;")
+
+
+def create_market_data_table(cursor):
+    """
+    Creates the partitioned market_data table keyed by (symbol, bar_interval,
+    bar_time), migrating a former heap table, and the partitions ahead of time.
+    """
+    partitioned = _is_partitioned(cursor)
+    if partitioned is False:
+        migrate_legacy_table(cursor)
+    else:
+        cursor.execute(CREATE_MARKET_DATA_QUERY)
+    ensure_partitions_ahead(cursor)
@@ -0,0 +1,210 @@
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow.parquet as pq
+import yfinance as yf
+
+from src.data_lake import (
+    OHLCV_COLUMNS, load_manifest, normalize_ohlcv, read_data_lake, symbol_slug, table_to_frame,
+    write_ohlcv_parquet)
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "_cache"
+
+
+class MarketDataFetchError(Exception):
+    """
+    Raised when a date range cannot be fetched after all retries.
+    """
+
+
+class MarketDataSource:
+    """
+    Base class of the market data backends. fetch() returns the daily bars of one
+    ticker in [start, end) as a frame normalized by normalize_ohlcv.
+    """
+
+    name = "source"
+
+    def fetch(self, symbol, start, end):
+        raise NotImplementedError
+
+
+class YFinanceSource(MarketDataSource):
+    """
+    Downloads daily bars from Yahoo Finance.
+    """
+
+    name = "yfinance"
+
+    def fetch(self, symbol, start, end):
+        df = yf.Ticker(symbol).history(start=start, end=end, interval="1d", actions=False,
+                                       raise_errors=True)
+        if df.index.tz is not None:
+            df.index = df.index.tz_localize(None)
+        return normalize_ohlcv(df.rename_axis('Date'))
+
+
+class LocalFileSource(MarketDataSource):
+    """
+    Replays daily bars from local files, one <symbol_slug>.parquet or .csv per ticker
+    (e.g. btc_usd.csv with Date and OHLCV columns). Used offline and in tests.
+    """
+
+    name = "local"
+
+    def __init__(self, root):
+        self.root = str(root)
+
+    def _read(self, symbol):
+        path = os.path.join(self.root, symbol_slug(symbol))
+        if os.path.exists(f"{path}.parquet"):
+            return pd.read_parquet(f"{path}.parquet")
+        if os.path.exists(f"{path}.csv"):
+            return pd.read_csv(f"{path}.csv")
+        raise FileNotFoundError(f"No local market data for {symbol} in {self.root}")
+
+    def fetch(self, symbol, start, end):
+        df = normalize_ohlcv(self._read(symbol))
+        mask = (df['Date'] >= pd.Timestamp(start)) & (df['Date'] < pd.Timestamp(end))
+        return df[mask].reset_index(drop=True)
+
+
+def get_source(name=None):
+    """
+    Returns the backend selected by MARKET_DATA_SOURCE: 'yfinance' (default), or
+    'local' reading the files of MARKET_DATA_PATH.
+    """
+    name = name or os.getenv("MARKET_DATA_SOURCE", "yfinance")
+    if name == "yfinance":
+        return YFinanceSource()
+    if name == "local":
+        return LocalFileSource(os.getenv("MARKET_DATA_PATH", "market_data"))
+    raise ValueError(f"Unknown market data source: {name}")
+
+
+def missing_ranges(manifest, start, end, today=None):
+    """
+    Lists the date ranges of [start, end) that no data lake file covers.
+    Bars from yesterday on are always treated as missing, as the data provider
+    revises them until the day is closed.
+    Returns:
+        list: (start, end) pairs of pd.Timestamp, end exclusive.
+    """
+    days = pd.date_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), freq="D")
+    if days.empty:
+        return []
+    covered = pd.Series(False, index=days)
+    for entry in manifest["files"]:
+        covered[entry["start_date"]:entry["end_date"]] = True
+    revisable = pd.Timestamp(today or datetime.now().date()) - pd.Timedelta(days=1)
+    covered[covered.index >= revisable] = False
+
+    ranges = []
+    # Consecutive missing days share the same number of covered days before them
+    missing = covered[~covered]
+    for _, group in missing.groupby(covered.cumsum()[~covered]):
+        ranges.append((group.index[0], group.index[-1] + pd.Timedelta(days=1)))
+    return ranges
+
+
+def split_range(start, end, chunk_days=365):
+    """
+    Splits [start, end) into consecutive chunks of at most chunk_days days.
+    """
+    chunks = []
+    while start < end:
+        chunk_end = min(start + pd.Timedelta(days=chunk_days), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end
+    return chunks
+
+
+def fetch_with_retry(source, symbol, start, end, retries=3, backoff=1.0):
+    """
+    Fetches one chunk, retrying with an exponential backoff and jitter.
+    Raises:
+        MarketDataFetchError: If every attempt failed.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return source.fetch(symbol, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+        except Exception as e:
+            if attempt == retries:
+                raise MarketDataFetchError(
+                    f"Failed to fetch {symbol} from {start.date()} to {end.date()}: {e}") from e
+            delay = backoff * 2 ** attempt + random.uniform(0, backoff)
+            logger.warning(
+                f"Fetching {symbol} from {start.date()} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def fetch_cached(source, symbol, start, end, cache_dir, today=None, **retry_kwargs):
+    """
+    Fetches one chunk through the on-disk cache. Only chunks that end before
+    yesterday are cached, the more recent bars may still be revised.
+    """
+    path = os.path.join(
+        cache_dir, f"{source.name}_{start.strftime('%Y%m%d')}_{end.strftime('%Y%m%d')}.parquet")
+    if os.path.exists(path):
+        return table_to_frame(pq.read_table(path))
+
+    df = fetch_with_retry(source, symbol, start, end, **retry_kwargs)
+    if end <= pd.Timestamp(today or datetime.now().date()) - pd.Timedelta(days=1):
+        os.makedirs(cache_dir, exist_ok=True)
+        write_ohlcv_parquet(df, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+    return df
+
+
+def fetch_missing(lake_dir, symbol, start_date, end_date, source=None, chunk_days=365,
+                  max_workers=4, retries=3, backoff=1.0, lake_lock=None):
+    """
+    Returns the daily bars of one ticker in [start_date, end_date), downloading only
+    the ranges missing from its data lake. The gaps are split in chunks fetched
+    concurrently, and the bars already in the lake are read back from it.
+    Args:
+        lake_dir (str): Data lake directory of the ticker.
+        source (MarketDataSource, optional): Backend, see get_source().
+        chunk_days (int): Days per request.
+        max_workers (int): Concurrent requests.
+        lake_lock (threading.Lock, optional): Held while reading the data lake, when
+            other threads write to it concurrently.
+    Returns:
+        pd.DataFrame: Normalized bars sorted by date, fetched bars winning over stored ones.
+    Raises:
+        MarketDataFetchError: If a chunk cannot be fetched.
+    """
+    source = source or get_source()
+    today = datetime.now().date()
+    with lake_lock or nullcontext():
+        manifest = load_manifest(lake_dir)
+    gaps = missing_ranges(manifest, start_date, end_date, today)
+    chunks = [chunk for gap in gaps for chunk in split_range(*gap, chunk_days)]
+    logger.info(
+        f"Fetching {symbol} from {source.name}: {len(gaps)} missing range(s) "
+        f"in {len(chunks)} chunk(s) between {start_date} and {end_date}")
+
+    cache_dir = os.path.join(str(lake_dir), CACHE_DIR)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fetched = list(executor.map(
+            lambda chunk: fetch_cached(source, symbol, *chunk, cache_dir, today,
+                                       retries=retries, backoff=backoff),
+            chunks))
+
+    with lake_lock or nullcontext():
+        stored = read_data_lake(
+            lake_dir, start_date=start_date,
+            end_date=(pd.Timestamp(end_date) - timedelta(days=1)).strftime("%Y-%m-%d"))
+    frames = [frame for frame in [stored] + fetched if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=['Date'] + OHLCV_COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates(subset=['Date'], keep='last').sort_values('Date').reset_index(drop=True)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILENAME = "xgboost_model.ubj"
+SCHEMA_FILENAME = "xgboost_model.json"
+TUNED_PARAMS_FILENAME = "xgboost_params.json"
+# Immutable artifacts, one directory per version named after the booster's content hash
+VERSIONS_DIR = "versions"
+# Horizon in days of the model whose schema is SCHEMA_FILENAME, the one served by default.
+# The models of the other horizons share the versions/ directory, see schema_filename().
+DEFAULT_HORIZON = 7
+
+
+def _tmp_path(path):
+    """
+    Returns a hidden temporary path next to `path`, keeping its extension.
+    """
+    return os.path.join(os.path.dirname(path), f".tmp-{os.path.basename(path)}")
+
+
+def schema_filename(horizon=DEFAULT_HORIZON):
+    """
+    Returns the name of the schema file pointing to the current model of a horizon.
+    """
+    return SCHEMA_FILENAME if horizon == DEFAULT_HORIZON else f"xgboost_model_h{horizon}.json"
+
+
+def model_version(raw):
+    """
+    Returns the version of a serialized booster: the start of its SHA-256, so the
+    same model always gets the same version.
+    """
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def data_hash(X, y, feature_names, dates, chunk_rows=65_536):
+    """
+    Hashes the training matrix as the float32 values XGBoost trains on, the target,
+    the feature names and the bar dates. The matrix is hashed by chunks of rows, so
+    a float64 input is never copied whole.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(map(str, feature_names))).encode())
+    for start in range(0, len(X), chunk_rows):
+        digest.update(np.ascontiguousarray(X[start:start + chunk_rows], dtype=np.float32).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float32).tobytes())
+    digest.update(np.asarray(dates, dtype='datetime64[ms]').astype(np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def _write_json(data, path):
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_model_artifacts(model, feature_names, model_dir, metadata=None, horizon=DEFAULT_HORIZON):
+    """
+    Saves the trained booster in XGBoost's native UBJSON format next to its feature schema,
+    under versions/<version>/ where the version is the hash of the booster. The schema
+    at the top of model_dir points to the current version: it is written last, readers
+    watch it to detect a complete new artifact.
+    Args:
+        model (xgb.Booster or xgb.XGBRegressor): The fitted model.
+        feature_names (list): Feature columns in the order the model expects them.
+        model_dir (str): Directory shared with the API (the shared_models volume).
+        metadata (dict, optional): Extra fields stored in the schema file.
+        horizon (int): Days ahead the model predicts the log return over.
+    Returns:
+        str: Path of the saved booster.
+    """
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    raw = bytes(booster.save_raw(raw_format="ubj"))
+    version = model_version(raw)
+    version_dir = os.path.join(model_dir, VERSIONS_DIR, version)
+    os.makedirs(version_dir, exist_ok=True)
+    model_path = os.path.join(version_dir, MODEL_FILENAME)
+
+    # Same content, same version: an existing artifact is kept as is
+    if not os.path.exists(model_path):
+        tmp_model_path = _tmp_path(model_path)
+        with open(tmp_model_path, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_model_path, model_path)
+        _write_json({
+            "version": version,
+            "model_file": MODEL_FILENAME,
+            "features": list(feature_names),
+            "target": f"log return over the next {horizon} days",
+            "horizon": horizon,
+            "trained_at": datetime.now().isoformat(),
+            **(metadata or {}),
+        }, os.path.join(version_dir, SCHEMA_FILENAME))
+    promote_version(model_dir, version)
+    logger.info(f"Model {version} saved to {model_path} with {len(feature_names)} features.")
+    return model_path
+
+
+def load_version_schema(model_dir, version):
+    """
+    Loads the schema of a saved version, or None if there is no such version.
+    """
+    path = os.path.join(model_dir, VERSIONS_DIR, version, SCHEMA_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def list_versions(model_dir):
+    """
+    Returns the schemas of the saved versions, the most recently trained first.
+    """
+    root = os.path.join(model_dir, VERSIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    schemas = [load_version_schema(model_dir, version) for version in os.listdir(root)]
+    return sorted((schema for schema in schemas if schema),
+                  key=lambda schema: schema["trained_at"], reverse=True)
+
+
+def promote_version(model_dir, version):
+    """
+    Makes a saved version the current model of its horizon, e.g. to roll back. Its
+    schema is copied to the top of model_dir with model_file pointing into
+    versions/<version>/.
+    Raises:
+        LookupError: If the version does not exist.
+    """
+    schema = load_version_schema(model_dir, version)
+    if schema is None:
+        raise LookupError(f"No model version {version} in {model_dir}")
+    schema["model_file"] = os.path.join(VERSIONS_DIR, version, MODEL_FILENAME)
+    horizon = schema.get("horizon", DEFAULT_HORIZON)
+    _write_json(schema, os.path.join(model_dir, schema_filename(horizon)))
+    return schema
+
+
+def load_feature_schema(model_dir, horizon=DEFAULT_HORIZON):
+    """
+    Loads the feature schema of the current model of a horizon, or None if no model
+    was saved yet.
+    """
+    path = os.path.join(model_dir, schema_filename(horizon))
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_tuned_params(result, model_dir):
+    """
+    Persists the winning hyperparameter configuration for the daily training to reuse.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, TUNED_PARAMS_FILENAME)
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Tuned hyperparameters saved to {path}")
+    return path
+
+
+def load_tuned_params(model_dir):
+    """
+    Returns the XGBRegressor keyword arguments found by the last tuning run, or an
+    empty dict if the model was never tuned.
+    """
+    path = os.path.join(model_dir, TUNED_PARAMS_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        result = json.load(f)
+    return {**result["params"], "n_estimators": result["n_estimators"]}
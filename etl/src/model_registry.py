@@ -0,0 +1,100 @@
+import argparse
+import json
+import logging
+import os
+
+from src.data_lake import symbol_slug
+from src.model_artifacts import DEFAULT_HORIZON, list_versions, load_feature_schema, promote_version
+from src.update_db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+CREATE_MODELS_QUERY = """
+CREATE TABLE IF NOT EXISTS models (
+    version VARCHAR(64) PRIMARY KEY,      -- Content hash of the booster
+    symbol VARCHAR(20) NOT NULL,
+    trained_at TIMESTAMP NOT NULL,
+    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    data_hash VARCHAR(64),                -- Hash of the training matrix and target
+    train_start DATE,
+    train_end DATE,
+    train_rows INTEGER,
+    features JSONB NOT NULL,              -- Feature columns in model order
+    params JSONB,                         -- Hyperparameters
+    metrics JSONB,
+    artifact_path TEXT NOT NULL           -- Relative to the shared_models directory
+);
+ALTER TABLE models ADD COLUMN IF NOT EXISTS horizon_days SMALLINT NOT NULL DEFAULT 7;
+CREATE INDEX IF NOT EXISTS models_symbol_trained_at_idx ON models (symbol, trained_at);
+"""
+
+
+def register_model(db_config, symbol, schema):
+    """
+    Records a saved model version in the models table. Registering the same version
+    twice is a no-op.
+    """
+    query = """
+        INSERT INTO models (version, symbol, horizon_days, trained_at, data_hash, train_start,
+                            train_end, train_rows, features, params, metrics, artifact_path)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (version) DO NOTHING;
+    """
+    with get_db_connection(db_config) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_MODELS_QUERY)
+            cursor.execute(query, (
+                schema["version"], symbol, schema.get("horizon", DEFAULT_HORIZON),
+                schema["trained_at"], schema.get("data_hash"),
+                schema.get("train_start"), schema.get("train_end"), schema.get("train_rows"),
+                json.dumps(schema["features"]), json.dumps(schema.get("params")),
+                json.dumps(schema.get("metrics")),
+                os.path.join(symbol_slug(symbol), schema["model_file"])))
+
+
+def register_models(db_config, model_root, symbols, horizons=None):
+    """
+    Registers the current model of each ticker, or of each ticker and horizon.
+    Returns:
+        dict: The current model version per symbol (a dict by horizon with horizons),
+            None for the models not versioned. A failed registration is logged, the
+            version is still returned.
+    """
+    versions = {}
+    for symbol in symbols:
+        model_dir = os.path.join(str(model_root), symbol_slug(symbol))
+        symbol_versions = {}
+        for horizon in horizons or [DEFAULT_HORIZON]:
+            schema = load_feature_schema(model_dir, horizon)
+            version = symbol_versions[horizon] = schema.get("version") if schema else None
+            if version is None:
+                continue
+            try:
+                register_model(db_config, symbol, schema)
+            except Exception as e:
+                logger.error(f"Failed to register model {version} of {symbol}: {e}")
+        versions[symbol] = symbol_versions if horizons else symbol_versions[DEFAULT_HORIZON]
+    return versions
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="List or roll back the saved model versions.")
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR", "models"),
+                        help="Parent directory of the per-ticker models.")
+    parser.add_argument("--symbol", default="BTC-USD")
+    parser.add_argument("--promote", metavar="VERSION",
+                        help="Make this version the current model of the symbol and its horizon.")
+    args = parser.parse_args()
+
+    model_dir = os.path.join(args.model_dir, symbol_slug(args.symbol))
+    if args.promote:
+        promote_version(model_dir, args.promote)
+        logger.info(f"{args.symbol} now serves model {args.promote}")
+    else:
+        for schema in list_versions(model_dir):
+            horizon = schema.get("horizon", DEFAULT_HORIZON)
+            current = (load_feature_schema(model_dir, horizon) or {}).get("version")
+            marker = "*" if schema["version"] == current else " "
+            print(f"{marker} {schema['version']}  {horizon:>2}d  {schema['trained_at']}  "
+                  f"{json.dumps(schema.get('metrics'))}")
@@ -0,0 +1,131 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+from src.data_lake import symbol_lake_dir, symbol_slug
+from src.feature_store import update_feature_store
+from src.instrumentation import add_spans, collect_spans, current_run_id, stage, start_run
+from src.run_state import (
+    current_versions, fingerprint, model_still_current, stage_key, training_inputs)
+from src.xgboost_training import (
+    build_training_arrays, thread_budget, train_horizons, train_on_arrays)
+
+logger = logging.getLogger(__name__)
+
+
+def _model_dir(model_root, symbol):
+    return os.path.join(str(model_root), symbol_slug(symbol)) if model_root else None
+
+
+def train_symbol(symbol, lake_root, model_root=None, start_date=None, n_jobs=None, run_id=None,
+                 horizons=None):
+    """
+    Brings the feature store of one ticker up to date for the live scorer, and trains
+    its model, or one model per horizon if horizons are given, on float32 features
+    built from the projected raw columns of its data lake (see build_training_arrays).
+    Runs inside a pool worker.
+    Returns:
+        tuple: The symbol, its predicted return in percent (a dict by horizon with
+            horizons, None on failure), and the instrumentation spans of the worker.
+    """
+    if run_id is not None:
+        start_run(run_id)
+    value = None
+    try:
+        model_dir = _model_dir(model_root, symbol)
+        lake_dir = symbol_lake_dir(lake_root, symbol)
+        with stage("features", symbol) as span:
+            span.record(rows_out=len(update_feature_store(lake_dir)))
+        with stage("fit", symbol) as span:
+            X, y, dates = build_training_arrays(lake_dir, start_date=start_date, horizons=horizons)
+            span.record(rows_in=len(X))
+            if horizons is not None:
+                value = train_horizons(X, y, dates, horizons, model_dir=model_dir, n_jobs=n_jobs)
+            else:
+                value = float(train_on_arrays(X, y, dates, model_dir=model_dir, n_jobs=n_jobs)[0])
+    except Exception as e:
+        logger.error(f"Training failed for {symbol}: {e}")
+    return symbol, value, collect_spans()
+
+
+def train_symbols(symbols, lake_root, model_root=None, start_date=None, max_workers=None,
+                  state=None, horizons=None):
+    """
+    Trains one model per ticker over a process pool, each worker's XGBoost being
+    limited to its share of the cores.
+    Args:
+        symbols (list): Ticker symbols to train.
+        lake_root (str): Parent directory of the per-ticker data lakes.
+        model_root (str, optional): Parent directory of the per-ticker model artifacts.
+        max_workers (int, optional): Pool size, defaults to min(len(symbols), cpu count).
+        state (RunState, optional): Skips the tickers whose bars, training code and
+            hyperparameters are unchanged since their last model, reusing its prediction.
+        horizons (list, optional): Train one model per horizon and ticker, the features
+            of a ticker being built once for all of its horizons.
+    Returns:
+        dict: Predicted return in percent per symbol (a dict by horizon with horizons),
+            None for the failed ones.
+    """
+    predictions, fingerprints = {}, {}
+    for symbol in symbols:
+        if state is None:
+            fingerprints[symbol] = None
+            continue
+        model_dir = _model_dir(model_root, symbol)
+        digest = fingerprint(training_inputs(
+            symbol_lake_dir(lake_root, symbol), model_dir, start_date, horizons))
+        record = state.lookup(
+            stage_key("train", symbol), digest, model_still_current(model_dir, horizons))
+        if record is not None:
+            prediction = record["output"]["prediction"]
+            # JSON turned the horizons into strings
+            predictions[symbol] = ({int(horizon): value for horizon, value in prediction.items()}
+                                   if horizons is not None else prediction)
+        else:
+            fingerprints[symbol] = digest
+    if not fingerprints:
+        return predictions
+
+    trained = _train_symbols(
+        list(fingerprints), lake_root, model_root, start_date, max_workers, horizons)
+    predictions.update(trained)
+    if state is not None:
+        for symbol, value in trained.items():
+            if value is None:
+                state.put(stage_key("train", symbol), fingerprints[symbol], "failed")
+                continue
+            state.put(stage_key("train", symbol), fingerprints[symbol], "success",
+                      {"prediction": value,
+                       "version": current_versions(_model_dir(model_root, symbol), horizons)})
+    return predictions
+
+
+def _train_symbols(symbols, lake_root, model_root, start_date, max_workers, horizons):
+    workers = max_workers or min(len(symbols), os.cpu_count() or 1)
+    n_jobs = thread_budget(workers)
+    run_id = current_run_id()
+    logger.info(
+        f"Training {len(symbols)} symbol(s) on {workers} worker(s) with {n_jobs} thread(s) each...")
+
+    predictions = {}
+    if workers == 1:
+        for symbol in symbols:
+            symbol, value, spans = train_symbol(
+                symbol, lake_root, model_root, start_date, n_jobs, run_id, horizons)
+            predictions[symbol] = value
+            add_spans(spans)
+        return predictions
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(train_symbol, symbol, lake_root, model_root, start_date, n_jobs,
+                            run_id, horizons)
+            for symbol in symbols
+        ]
+        for future in as_completed(futures):
+            symbol, value, spans = future.result()
+            predictions[symbol] = value
+            # The spans of the workers are saved with the ones of the parent
+            add_spans(spans)
+    return predictions
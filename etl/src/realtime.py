@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from src.bulk_load import load_market_data
+from src.config import get_db_config
+from src.data_lake import OHLCV_COLUMNS, symbol_lake_dir, symbol_slug
+from src.feature_store import HORIZON, TAIL_ROWS, append_features, load_features, load_state
+from src.intraday_lake import compact_days, write_bars
+from src.model_artifacts import SCHEMA_FILENAME, load_feature_schema
+from src.tick_feed import ReplayFeed, get_feed
+from src.update_db import create_prediction_table, get_db_connection, save_predictions
+
+logger = logging.getLogger(__name__)
+
+INTERVAL_SECONDS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+
+class BarAggregator:
+    """
+    Aggregates ticks into OHLCV bars of several intervals in memory. A bar is
+    closed when a tick of a later bar arrives or when close_due() is called past
+    its end. Ticks of an already closed bar are dropped and counted in `late_ticks`.
+    Volume is the traded quote volume (price * size), as the daily bars of yfinance.
+    """
+
+    def __init__(self, intervals=("1m", "1h", "1d")):
+        self.intervals = [(interval, INTERVAL_SECONDS[interval]) for interval in intervals]
+        self.late_ticks = 0
+        self._open = {}
+        self._closed = []
+
+    def add(self, tick):
+        for interval, seconds in self.intervals:
+            start = tick.time - tick.time % seconds
+            key = (tick.symbol, interval)
+            bar = self._open.get(key)
+            if bar is None or start > bar[0]:
+                if bar is not None:
+                    self._closed.append((tick.symbol, interval, bar))
+                self._open[key] = [start, tick.price, tick.price, tick.price, tick.price,
+                                   tick.price * tick.size]
+            elif start < bar[0]:
+                self.late_ticks += 1
+            else:
+                bar[2] = max(bar[2], tick.price)
+                bar[3] = min(bar[3], tick.price)
+                bar[4] = tick.price
+                bar[5] += tick.price * tick.size
+
+    def close_due(self, now):
+        """
+        Closes the open bars that end at or before `now` (epoch seconds).
+        """
+        for interval, seconds in self.intervals:
+            for key in [key for key, bar in self._open.items()
+                        if key[1] == interval and bar[0] + seconds <= now]:
+                self._closed.append((key[0], interval, self._open.pop(key)))
+
+    def close_all(self):
+        self.close_due(float("inf"))
+
+    def drain(self):
+        """
+        Returns and forgets the closed bars as a frame with Symbol, Interval, naive
+        UTC Date and the OHLCV columns.
+        """
+        closed, self._closed = self._closed, []
+        return _to_frame(closed)
+
+    def current(self, symbol, interval):
+        """
+        Returns the open bar of a symbol as a one-row frame, or None.
+        """
+        bar = self._open.get((symbol, interval))
+        return None if bar is None else _to_frame([(symbol, interval, bar)])
+
+    def symbols(self):
+        return sorted({symbol for symbol, _ in self._open})
+
+
+def _to_frame(bars):
+    df = pd.DataFrame([[symbol, interval, *bar] for symbol, interval, bar in bars],
+                      columns=['Symbol', 'Interval', 'Date'] + OHLCV_COLUMNS)
+    df['Date'] = pd.to_datetime(df['Date'], unit='s')
+    return df
+
+
+class Scorer:
+    """
+    Scores the bar of the current day with the latest persisted model of each ticker.
+    The daily feature store is kept in memory and reloaded when the daily pipeline
+    updates it, so each score only featurizes the provisional day bar against its
+    TAIL_ROWS predecessors.
+    """
+
+    def __init__(self, lake_root, model_root):
+        self.lake_root = lake_root
+        self.model_root = model_root
+        self._stores = {}
+        self._models = {}
+
+    def _store(self, symbol):
+        lake_dir = symbol_lake_dir(self.lake_root, symbol)
+        state = load_state(lake_dir)
+        if state is None:
+            return None
+        cached = self._stores.get(symbol)
+        if cached is None or cached[0] != state["updated_at"]:
+            # Only the raw bars of the warm-up window and the refreshed targets are needed
+            store = load_features(lake_dir).tail(TAIL_ROWS + HORIZON + 1)
+            cached = self._stores[symbol] = (state["updated_at"], store)
+        return cached[1]
+
+    def _model(self, symbol):
+        model_dir = os.path.join(str(self.model_root), symbol_slug(symbol))
+        try:
+            mtime = os.path.getmtime(os.path.join(model_dir, SCHEMA_FILENAME))
+        except FileNotFoundError:
+            return None, None
+        cached = self._models.get(symbol)
+        if cached is None or cached[0] != mtime:
+            schema = load_feature_schema(model_dir)
+            booster = xgb.Booster()
+            booster.load_model(os.path.join(model_dir, schema["model_file"]))
+            cached = self._models[symbol] = (mtime, booster, schema)
+            logger.info(f"Loaded the model of {symbol} trained at {schema.get('trained_at')}")
+        return cached[1], cached[2]
+
+    def score(self, symbol, day_bar):
+        """
+        Predicts the return over the next days from a provisional day bar.
+        Args:
+            day_bar (pd.DataFrame): One row with the 'Date' and OHLCV columns.
+        Returns:
+            tuple: The predicted return in percent and the model version, None if there
+                is no model or feature store for the symbol yet, or if the bar is older
+                than it.
+        """
+        store = self._store(symbol)
+        booster, schema = self._model(symbol)
+        if store is None or booster is None:
+            return None
+        day = day_bar['Date'].iloc[0]
+        if store.empty or day < store.index.max():
+            return None
+        features = append_features(store, day_bar[['Date'] + OHLCV_COLUMNS].reset_index(drop=True))
+        if features.index[-1] != day:
+            return None
+        X = features[schema["features"]].tail(1).to_numpy(dtype=np.float64)
+        value = float((np.exp(booster.inplace_predict(X)[0]) - 1) * 100)
+        return value, schema.get("version")
+
+
+class IngestionService:
+    """
+    Consumes a tick feed, aggregates it into bars and, every flush_interval seconds,
+    writes the closed bars to Postgres and the intraday data lake in one micro-batch.
+    The provisional bar of the current day is scored with the latest model at most
+    every score_interval seconds, and the predictions saved (which notifies the API).
+    Bars that failed to be written are kept and retried at the next flush.
+    """
+
+    def __init__(self, feed, lake_root, model_root=None, db_config=None, intervals=("1m", "1h"),
+                 flush_interval=5.0, score_interval=60.0):
+        self.feed = feed
+        self.lake_root = lake_root
+        self.db_config = db_config or get_db_config()
+        self.intervals = list(intervals)
+        self.flush_interval = flush_interval
+        self.score_interval = score_interval
+        # The day bars are only kept for scoring, the daily pipeline owns them
+        self.aggregator = BarAggregator(self.intervals + ["1d"])
+        self.scorer = Scorer(lake_root, model_root) if model_root else None
+        self.clock = 0.0
+        self._last_scored = {}
+        self._next_score = 0.0
+        self._pending_lake = []
+        self._pending_db = []
+        self._day = None
+
+    async def consume(self):
+        async for tick in self.feed.ticks():
+            self.aggregator.add(tick)
+            self.clock = max(self.clock, tick.time)
+
+    def now(self):
+        # A quiet live market still closes its bars, a replay follows its own clock
+        return max(self.clock, time.time()) if self.feed.live else self.clock
+
+    def persist(self, bars):
+        """
+        Writes closed bars to the intraday lake, then to market_data. Each sink
+        keeps its own backlog so a failure of one does not duplicate the other.
+        """
+        if not bars.empty:
+            self._pending_lake.append(bars)
+            self._pending_db.append(bars)
+        try:
+            for df in self._pending_lake:
+                for (symbol, interval), group in df.groupby(['Symbol', 'Interval']):
+                    write_bars(symbol_lake_dir(self.lake_root, symbol), interval, group)
+            self._pending_lake = []
+        except Exception as e:
+            logger.error(f"Failed to write bars to the data lake, will retry: {e}")
+        try:
+            if self._pending_db:
+                df = pd.concat(self._pending_db, ignore_index=True)
+                with get_db_connection(self.db_config) as connection:
+                    for interval, group in df.groupby('Interval'):
+                        load_market_data(connection, group, interval=interval)
+                self._pending_db = []
+                logger.info(f"Flushed {len(df)} bar(s) to market_data")
+        except Exception as e:
+            logger.error(f"Failed to write bars to market_data, will retry: {e}")
+
+        if bars.empty:
+            return
+        # Once a day is over its micro-batch files are merged
+        day = bars['Date'].max().normalize()
+        if self._day is None or day > self._day:
+            for symbol in bars['Symbol'].unique():
+                for interval in self.intervals:
+                    compact_days(symbol_lake_dir(self.lake_root, symbol), interval, day)
+        self._day = day
+
+    def day_bars(self):
+        """
+        Snapshots the open day bar of each symbol as one-row frames. Taken on the event
+        loop, so the scoring thread never reads the bars consume() keeps updating.
+        """
+        bars = {symbol: self.aggregator.current(symbol, "1d")
+                for symbol in self.aggregator.symbols()}
+        return {symbol: bar for symbol, bar in bars.items() if bar is not None}
+
+    def score(self, day_bars):
+        """
+        Scores the symbols whose day bar changed since their last score.
+        Args:
+            day_bars (dict): Snapshot of the open day bars by symbol, see day_bars().
+        Returns:
+            dict: Predicted return in percent per scored symbol.
+        """
+        predictions, versions = {}, {}
+        for symbol, day_bar in day_bars.items():
+            key = tuple(day_bar.iloc[0])
+            if self._last_scored.get(symbol) == key:
+                continue
+            try:
+                scored = self.scorer.score(symbol, day_bar)
+            except Exception as e:
+                logger.error(f"Scoring failed for {symbol}: {e}")
+                continue
+            self._last_scored[symbol] = key
+            if scored is not None:
+                predictions[symbol], versions[symbol] = scored
+        if predictions:
+            save_predictions(self.db_config, predictions, versions)
+        return predictions
+
+    async def flush(self, final=False):
+        now = self.now()
+        if final:
+            self.aggregator.close_all()
+        else:
+            self.aggregator.close_due(now)
+        bars = self.aggregator.drain()
+        bars = bars[bars['Interval'].isin(self.intervals)]
+        if not bars.empty or self._pending_db or self._pending_lake:
+            await asyncio.to_thread(self.persist, bars)
+        if self.scorer is not None and (final or now >= self._next_score):
+            self._next_score = now + self.score_interval
+            await asyncio.to_thread(self.score, self.day_bars())
+
+    async def run(self):
+        """
+        Runs until the feed ends (a replay) or the task is cancelled, then flushes
+        the bars still open.
+        """
+        if self.scorer is not None:
+            await asyncio.to_thread(create_prediction_table, self.db_config)
+        consumer = asyncio.create_task(self.consume())
+        try:
+            while not consumer.done():
+                await asyncio.wait([consumer], timeout=self.flush_interval)
+                await self.flush()
+            consumer.result()
+        finally:
+            consumer.cancel()
+            await self.flush(final=True)
+            if self.aggregator.late_ticks:
+                logger.warning(f"Dropped {self.aggregator.late_ticks} late tick(s)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Ingest a tick feed into bars and live predictions.")
+    parser.add_argument("--replay", help="Replay this tick file instead of $TICK_FEED.")
+    parser.add_argument("--speed", type=float, help="Replay speed, as fast as possible by default.")
+    parser.add_argument("--data-lake-root", default=os.getenv("DATA_LAKE_ROOT", "data_lake"))
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR"),
+                        help="Parent directory of the per-ticker models, no scoring if unset.")
+    parser.add_argument("--intervals", nargs="+", default=["1m", "1h"],
+                        choices=[interval for interval in INTERVAL_SECONDS if interval != "1d"])
+    parser.add_argument("--flush-interval", type=float, default=5.0)
+    parser.add_argument("--score-interval", type=float, default=60.0)
+    args = parser.parse_args()
+
+    feed = ReplayFeed(args.replay, speed=args.speed) if args.replay else get_feed()
+    service = IngestionService(
+        feed, args.data_lake_root, model_root=args.model_dir, intervals=args.intervals,
+        flush_interval=args.flush_interval, score_interval=args.score_interval)
+    asyncio.run(service.run())
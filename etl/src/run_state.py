@@ -0,0 +1,191 @@
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+from datetime import datetime
+
+from src.data_lake import load_manifest, symbol_slug
+from src.instrumentation import current_run_id
+from src.model_artifacts import load_feature_schema, load_tuned_params
+
+logger = logging.getLogger(__name__)
+
+RUN_STATE_DIR = "_run_state"
+# Modules whose code determines a trained model, hashed into the training fingerprint
+TRAINING_MODULES = ["src.data_lake", "src.feature_store", "src.xgboost_training",
+                    "src.model_artifacts", "src.multi_asset"]
+
+
+def fingerprint(inputs):
+    """
+    Hashes the JSON-serializable description of a stage's inputs.
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_hash(lake_dir):
+    """
+    Hashes the manifest entries of a data lake (path, date range and row count of
+    each file, in write order) without reading the files: backups and compactions
+    change it, the bars of a ticker cannot change without it.
+    """
+    entries = [[entry["path"], entry["start_date"], entry["end_date"], entry["rows"]]
+               for entry in load_manifest(str(lake_dir))["files"]]
+    return fingerprint(entries)
+
+
+def code_version(modules):
+    """
+    Hashes the source files of the given modules.
+    """
+    digest = hashlib.sha256()
+    for name in modules:
+        digest.update(name.encode())
+        with open(importlib.util.find_spec(name).origin, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def db_target(db_config):
+    """
+    Identifies the database a stage writes to, without its credentials.
+    """
+    return f"{db_config['host']}:{db_config['port']}/{db_config['name']}"
+
+
+def stage_key(stage, symbol=None):
+    return stage if symbol is None else f"{stage}_{symbol_slug(symbol)}"
+
+
+class RunState:
+    """
+    Run-state store of the pipeline stages: one JSON record per stage (and symbol)
+    under <lake_root>/_run_state/, holding the fingerprint of the stage's inputs, its
+    status and its output. A stage whose last run succeeded with the same fingerprint
+    is skipped and its recorded output reused, so a rerun resumes from the first
+    stale or failed stage. One file per record lets parallel tasks write their own.
+    """
+
+    def __init__(self, lake_root, force=None):
+        """
+        Args:
+            force (bool, optional): Rerun every stage, defaults to $PIPELINE_FORCE=1.
+        """
+        self.root = os.path.join(str(lake_root), RUN_STATE_DIR)
+        self.force = os.getenv("PIPELINE_FORCE") == "1" if force is None else force
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def put(self, key, fingerprint, status, output=None, error=None):
+        os.makedirs(self.root, exist_ok=True)
+        record = {
+            "fingerprint": fingerprint,
+            "status": status,
+            "output": output,
+            "error": error,
+            "run_id": current_run_id(),
+            "updated_at": datetime.now().isoformat(),
+        }
+        path = self._path(key)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(record, f, indent=2, default=str)
+        os.replace(f"{path}.tmp", path)
+
+    def lookup(self, key, fingerprint, validate=None):
+        """
+        Returns the last record of a stage if it succeeded with this fingerprint and
+        its output is still valid, else None.
+        """
+        if self.force:
+            return None
+        record = self.get(key)
+        if record is None or record["status"] != "success" or record["fingerprint"] != fingerprint:
+            return None
+        if validate is not None and not validate(record["output"]):
+            return None
+        logger.info(f"Skipping {key}: inputs unchanged since {record['updated_at']}")
+        return record
+
+    def run(self, key, inputs, func, validate=None, succeeded=None):
+        """
+        Runs a stage unless lookup() finds it up to date, recording its outcome.
+        Args:
+            key (str): Stage key, see stage_key().
+            inputs (dict): Description of everything the stage's output depends on.
+            func (callable): Runs the stage, returns its JSON-serializable output.
+            validate (callable, optional): Checks a recorded output is still usable,
+                e.g. that its artifact still exists.
+            succeeded (callable, optional): Tells from its output whether the stage
+                worked, for the stages that log their errors rather than raise them.
+        Returns:
+            The output of the stage, recorded or fresh.
+        """
+        digest = fingerprint(inputs)
+        record = self.lookup(key, digest, validate)
+        if record is not None:
+            return record["output"]
+        self.put(key, digest, "running")
+        try:
+            output = func()
+        except Exception as e:
+            self.put(key, digest, "failed", error=str(e))
+            raise
+        if succeeded is not None and not succeeded(output):
+            self.put(key, digest, "failed", output)
+            return output
+        self.put(key, digest, "success", output)
+        return output
+
+
+def training_inputs(lake_dir, model_dir, start_date=None, horizons=None):
+    """
+    Describes what the models of one ticker depend on: its bars, the training code,
+    the tuned hyperparameters, the training window and the horizons.
+    """
+    return {
+        "data": manifest_hash(lake_dir),
+        "code": code_version(TRAINING_MODULES),
+        "params": load_tuned_params(model_dir) if model_dir else {},
+        "start_date": start_date,
+        "horizons": horizons,
+    }
+
+
+def current_versions(model_dir, horizons=None):
+    """
+    Returns the version of the current model of model_dir, or a dict of the versions
+    by horizon (as strings, as recorded) if horizons are given.
+    """
+    if model_dir is None:
+        return None
+    if horizons is None:
+        return (load_feature_schema(model_dir) or {}).get("version")
+    return {str(horizon): (load_feature_schema(model_dir, horizon) or {}).get("version")
+            for horizon in horizons}
+
+
+def model_still_current(model_dir, horizons=None):
+    """
+    Returns a validator checking that a recorded training output still holds the
+    current models of model_dir (no other version was trained or promoted since).
+    """
+    def validate(output):
+        return output is not None and output.get("version") == current_versions(model_dir, horizons)
+    return validate
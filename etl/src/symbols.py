@@ -0,0 +1,22 @@
+import os
+
+
+def symbol_slug(symbol):
+    """
+    Returns the directory name of a ticker in the data lake, e.g. 'BTC-USD' -> 'btc_usd'.
+    """
+    return symbol.lower().replace("-", "_").replace("/", "_")
+
+
+def symbol_lake_dir(lake_root, symbol):
+    """
+    Returns the data lake directory holding the partitions of one ticker.
+    """
+    return os.path.join(str(lake_root), symbol_slug(symbol))
+
+
+def file_prefix(symbol):
+    """
+    Returns the prefix of the parquet files of a ticker, e.g. 'BTC-USD' -> 'btc_data'.
+    """
+    return f"{symbol.split('-')[0].lower()}_data"
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+from collections import namedtuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# One trade: ticker, UTC time in epoch seconds, price and traded size (base units)
+Tick = namedtuple("Tick", ["symbol", "time", "price", "size"])
+
+
+class TickFeed:
+    """
+    Base class of the trade feeds. ticks() is an async iterator of Tick in time order.
+    Live feeds let the ingestion service close bars on the wall clock when the
+    market is quiet, replayed ones only advance with their own ticks.
+    """
+
+    name = "feed"
+    live = True
+
+    def ticks(self):
+        raise NotImplementedError
+
+
+class ReplayFeed(TickFeed):
+    """
+    Replays trades from a local file with symbol, time, price and size columns
+    (time as epoch seconds or ISO strings). Stands in for an exchange feed offline
+    and in tests.
+    """
+
+    name = "replay"
+    live = False
+
+    def __init__(self, path, speed=None, batch=1000):
+        """
+        Args:
+            path (str): CSV or parquet file of trades.
+            speed (float, optional): Replay speed relative to the recorded time
+                (e.g. 60 replays one minute per second), as fast as possible by default.
+            batch (int): Ticks yielded between two returns to the event loop when
+                replaying as fast as possible.
+        """
+        self.path = str(path)
+        self.speed = speed
+        self.batch = batch
+
+    def _read(self):
+        if self.path.endswith(".parquet"):
+            df = pd.read_parquet(self.path)
+        else:
+            df = pd.read_csv(self.path)
+        if not pd.api.types.is_numeric_dtype(df['time']):
+            df['time'] = pd.to_datetime(df['time']).astype('int64') / 1e9
+        return df[list(Tick._fields)].sort_values('time', kind='stable')
+
+    async def ticks(self):
+        df = self._read()
+        logger.info(f"Replaying {len(df)} ticks from {self.path}")
+        previous = None
+        for count, row in enumerate(df.itertuples(index=False, name="Tick")):
+            if self.speed:
+                if previous is not None and row.time > previous:
+                    await asyncio.sleep((row.time - previous) / self.speed)
+                previous = row.time
+            elif count % self.batch == 0:
+                await asyncio.sleep(0)
+            yield Tick(*row)
+
+
+def get_feed(name=None):
+    """
+    Returns the feed selected by TICK_FEED, only 'replay' (of TICK_REPLAY_PATH at
+    TICK_REPLAY_SPEED) for now.
+    """
+    name = name or os.getenv("TICK_FEED", "replay")
+    if name == "replay":
+        speed = os.getenv("TICK_REPLAY_SPEED")
+        return ReplayFeed(os.getenv("TICK_REPLAY_PATH", "ticks.csv"),
+                          speed=float(speed) if speed else None)
+    raise ValueError(f"Unknown tick feed: {name}")
@@ -0,0 +1,141 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import xgboost as xgb
+from sklearn.model_selection import TimeSeriesSplit
+
+from src.model_artifacts import save_tuned_params
+
+logger = logging.getLogger(__name__)
+
+# Hyperparameter grid searched by tune_xgboost
+SEARCH_SPACE = {
+    "max_depth": [3, 4, 6, 8],
+    "learning_rate": [0.01, 0.03, 0.1, 0.3],
+    "subsample": [0.6, 0.8, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+}
+
+
+def sample_configs(search_space=SEARCH_SPACE, n_trials=None, seed=42):
+    """
+    Lists the grid configurations, or a reproducible random sample of n_trials of them.
+    """
+    keys = list(search_space)
+    configs = [dict(zip(keys, values))
+               for values in itertools.product(*(search_space[key] for key in keys))]
+    if n_trials is not None and n_trials < len(configs):
+        configs = random.Random(seed).sample(configs, n_trials)
+    return configs
+
+
+def build_fold_matrices(X, y, n_splits=5, horizon=7, max_bin=256):
+    """
+    Quantizes every TimeSeriesSplit fold once. The validation matrices reuse the bin
+    edges of their training matrix, and all trials share these matrices.
+    The `horizon` rows between train and validation are dropped to avoid leaking targets.
+    """
+    folds = []
+    for train_idx, valid_idx in TimeSeriesSplit(n_splits=n_splits, gap=horizon).split(X):
+        dtrain = xgb.QuantileDMatrix(X[train_idx], label=y[train_idx], max_bin=max_bin)
+        dvalid = xgb.QuantileDMatrix(X[valid_idx], label=y[valid_idx], ref=dtrain)
+        folds.append((dtrain, dvalid))
+    return folds
+
+
+def run_trial(config, folds, nthread=1, max_rounds=1000, early_stopping_rounds=50):
+    """
+    Cross-validates one configuration with early stopping on each fold.
+    Returns:
+        dict: The configuration, its mean validation RMSE and the mean best round count.
+    """
+    params = {
+        "objective": "reg:squarederror",
+        "tree_method": "hist",
+        "eval_metric": "rmse",
+        "nthread": nthread,
+        **config,
+    }
+    scores, rounds = [], []
+    for dtrain, dvalid in folds:
+        booster = xgb.train(params, dtrain, num_boost_round=max_rounds,
+                            evals=[(dvalid, "valid")],
+                            early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+        scores.append(booster.best_score)
+        rounds.append(booster.best_iteration + 1)
+    return {"params": config, "rmse": float(np.mean(scores)),
+            "n_estimators": int(np.mean(rounds))}
+
+
+def tune_xgboost(df, features_to_drop=['target', 'Open', 'High', 'Low'], n_splits=5, horizon=7,
+                 n_trials=None, max_workers=None, core_budget=None, max_rounds=1000,
+                 early_stopping_rounds=50, model_dir=None):
+    """
+    Time-series hyperparameter search over the frame returned by create_features_for_xgboost.
+    Trials run concurrently on threads (XGBoost releases the GIL while training), and
+    the cores of `core_budget` are split evenly between them. All trials use the
+    same max_bin so they can share the fold matrices.
+    Args:
+        n_trials (int, optional): Random sample of the grid, the full grid by default.
+        max_workers (int, optional): Concurrent trials.
+        core_budget (int, optional): Total XGBoost threads, all cores by default.
+        model_dir (str, optional): Where the winning configuration is persisted.
+    Returns:
+        dict: The best configuration with its CV score and number of rounds.
+    """
+    df = df.dropna(subset=['target'])
+    X = np.ascontiguousarray(df.drop(columns=features_to_drop).to_numpy(dtype=np.float32))
+    y = df['target'].to_numpy(dtype=np.float32)
+    folds = build_fold_matrices(X, y, n_splits=n_splits, horizon=horizon)
+
+    configs = sample_configs(n_trials=n_trials)
+    core_budget = core_budget or os.cpu_count() or 1
+    workers = max_workers or core_budget
+    nthread = max(1, core_budget // workers)
+    logger.info(
+        f"Tuning {len(configs)} configuration(s) on {n_splits} folds with "
+        f"{workers} concurrent trial(s) of {nthread} thread(s)...")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda config: run_trial(config, folds, nthread, max_rounds, early_stopping_rounds),
+            configs))
+
+    best = min(results, key=lambda result: result["rmse"])
+    best["tuned_at"] = datetime.now().isoformat()
+    best["trials"] = len(results)
+    logger.info(f"Best configuration: {best}")
+    if model_dir is not None:
+        save_tuned_params(best, model_dir)
+    return best
+
+
+if __name__ == "__main__":
+    from src.xgboost_training import (
+        convert_to_float, correct_data_types, create_features_for_xgboost, extract_df)
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Time-series hyperparameter search for XGBoost.")
+    parser.add_argument("--data-lake", default=os.getenv("DATA_LAKE_PATH"),
+                        help="Data lake of one ticker (defaults to $DATA_LAKE_PATH).")
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR"),
+                        help="Where the winning configuration is saved.")
+    parser.add_argument("--n-splits", type=int, default=5)
+    parser.add_argument("--n-trials", type=int, default=None)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--core-budget", type=int, default=None)
+    args = parser.parse_args()
+
+    df = extract_df(args.data_lake)
+    df = create_features_for_xgboost(correct_data_types(convert_to_float(df)))
+    best = tune_xgboost(df, n_splits=args.n_splits, n_trials=args.n_trials,
+                        max_workers=args.max_workers, core_budget=args.core_budget,
+                        model_dir=args.model_dir)
+    print(json.dumps(best, indent=2))
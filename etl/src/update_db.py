@@ -1,21 +1,28 @@
 import logging
-import shutil
-import os
 import pandas as pd
 import psycopg2
 from psycopg2 import extras
 from src.config import get_db_config
+from src.bulk_load import load_market_data
+from src.data_lake import file_prefix, lake_root_from_staging, write_partitioned
+from src.model_artifacts import DEFAULT_HORIZON
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
-db_config = get_db_config()
+
+# Channel notified on every new prediction, listened to by the API cache.
+# The payload is "<symbol>:<horizon in days>"
+PREDICTION_CHANNEL = "new_prediction"
+# Label of the predictions made by models saved before the registry
+LEGACY_MODEL_VERSION = "xgboost_v1"
 
 
 @contextmanager
-def get_db_connection(db_config=db_config):
+def get_db_connection(db_config=None):
     """
     Context manager for PostgreSQL database connection.
     """
+    db_config = db_config or get_db_config()
     connection = None
     try:
         connection = psycopg2.connect(
@@ -37,72 +44,65 @@ def get_db_connection(db_config=db_config):
             connection.close()  # Always close the connection
 
 
-def get_latest_date_in_db(db_config=db_config):
+def get_latest_date_in_db(db_config=None, symbol="BTC-USD", interval="1d"):
     """
-    Fetches the latest trading date from the market_data table in the postgres database.
+    Fetches the latest trading date of a ticker from the market_data table in the postgres database.
     """
     try:
         logger.info(
-            "Connecting to the PostgreSQL database to get the latest date...")
+            f"Connecting to the PostgreSQL database to get the latest date of {symbol}...")
         with get_db_connection(db_config) as connection:
             with connection.cursor() as cursor:
-                query = "SELECT MAX(trading_date) FROM market_data;"
-                cursor.execute(query)
+                # Served backwards by the primary key of the newest partitions
+                query = """
+                    SELECT (MAX(bar_time) AT TIME ZONE 'UTC')::date FROM market_data
+                    WHERE symbol = %s AND bar_interval = %s;
+                """
+                cursor.execute(query, (symbol, interval))
                 result = cursor.fetchone()
-                latest_date = result[0] if result[0] is not None else '01/01/2016'
-                logger.info(f"Latest date in DB: {latest_date}")
-                return latest_date.strftime("%Y-%m-%d")
+                if result[0] is None:
+                    logger.info(f"No data in DB for {symbol} yet.")
+                    return '2016-01-01'
+                logger.info(f"Latest date in DB: {result[0]}")
+                return result[0].strftime("%Y-%m-%d")
     except Exception as e:
         logger.error(f"Error while fetching latest date from DB: {e}")
         return '2016-01-01'
 
 
-def save_permanent_backup_parquet(data_path, start_date, end_date):
+def save_permanent_backup_parquet(data_path, start_date, end_date, symbol="BTC-USD"):
     """
-    Saves a permanent backup of the parquet file with a timestamped filename.
+    Saves a permanent backup of the staged parquet file into the partitioned data lake.
     """
-    filename = f"btc_data_{start_date}_{end_date}.parquet"
+    prefix = f"{file_prefix(symbol)}_{start_date}_{end_date}"
     logger.debug(
-        f"Saving permanent backup parquet file from {data_path} as {filename}")
-    shutil.copy(data_path, os.path.join(os.path.dirname(data_path), filename))
+        f"Saving permanent backup parquet file from {data_path} as {prefix}")
+    write_partitioned(pd.read_parquet(data_path),
+                      lake_root_from_staging(data_path), prefix)
 
 
-def update_db(db_config=db_config, data_path=None):
+def update_db(db_config=None, data_path=None, symbol="BTC-USD"):
     """
-    Updates the PostgreSQL database with new data from the parquet file.
+    Updates the PostgreSQL database with new data of a ticker from the parquet file.
+    Returns:
+        int: The number of inserted or updated rows, None on failure.
     """
     df = pd.read_parquet(data_path)
 
     try:
         with get_db_connection(db_config) as connection:
-            with connection.cursor() as cursor:
-                df_clean = df.reset_index()
-                data_list = [tuple(x) for x in df_clean.to_numpy()]
-                logger.info("Inserting new data into the database...")
-                query = """
-                INSERT INTO market_data (
-                        trading_date, 
-                        open_price, 
-                        high_price, 
-                        low_price, 
-                        close_price, 
-                        volume
-                    )
-                VALUES %s
-                ON CONFLICT (trading_date) 
-                DO UPDATE SET 
-                    trading_date = EXCLUDED.trading_date;
-                """
-                extras.execute_values(cursor, query, data_list)
-                logger.info(
-                    f"Database update complete. Added {len(data_list)} records.")
+            logger.info("Inserting new data into the database...")
+            merged = load_market_data(connection, df, symbol)
+            logger.info(
+                f"Database update complete. Upserted {merged} of {len(df)} records.")
+        return merged
 
     except Exception as e:
         logger.error(f"Error while connecting to the database: {e}")
         return None
 
 
-def create_prediction_table(db_config=db_config):
+def create_prediction_table(db_config=None):
     """
     Creates the predictions table if it does not exist.
     """
@@ -113,6 +113,22 @@ def create_prediction_table(db_config=db_config):
         model_version VARCHAR(50),
         predicted_return_pct NUMERIC
     );
+    ALTER TABLE predictions
+        ADD COLUMN IF NOT EXISTS symbol VARCHAR(20) NOT NULL DEFAULT 'BTC-USD';
+    -- Days ahead the predicted return is over, the rows saved before were 7-day ones
+    ALTER TABLE predictions
+        ADD COLUMN IF NOT EXISTS horizon_days SMALLINT NOT NULL DEFAULT 7;
+    -- Close of the bar a backfilled prediction was made at (see src.backfill), NULL
+    -- for the live ones
+    ALTER TABLE predictions ADD COLUMN IF NOT EXISTS as_of_date DATE;
+    CREATE UNIQUE INDEX IF NOT EXISTS predictions_as_of_idx
+        ON predictions (symbol, horizon_days, as_of_date) WHERE as_of_date IS NOT NULL;
+    -- Backs the per-symbol and horizon keyset pagination on (created_at, id) of the
+    -- history endpoint
+    DROP INDEX IF EXISTS predictions_created_at_id_idx;
+    DROP INDEX IF EXISTS predictions_symbol_created_at_id_idx;
+    CREATE INDEX IF NOT EXISTS predictions_symbol_horizon_created_at_id_idx
+        ON predictions (symbol, horizon_days, created_at, id);
     '''
     with get_db_connection(db_config) as conn:
         with conn.cursor() as cursor:
@@ -120,16 +136,61 @@ def create_prediction_table(db_config=db_config):
             logger.info("Table 'predictions' checked/created.")
 
 
-def save_prediction(db_config=db_config, value=None):
+def save_prediction(db_config=None, value=None, symbol="BTC-USD", model_version=None):
+    """
+    Saves the predicted return value into the predictions table and notifies
+    listeners, the notification being delivered when the transaction commits.
+    """
+    save_predictions(db_config, {symbol: value}, {symbol: model_version})
+
+
+def _by_horizon(value):
+    """
+    Maps a value given per horizon, or for the default horizon only, by horizon.
+    The horizons of a dict that went through JSON (XCom, run state) are strings.
+    """
+    if isinstance(value, dict):
+        return {int(horizon): item for horizon, item in value.items()}
+    return {DEFAULT_HORIZON: value}
+
+
+def save_predictions(db_config=None, predictions=None, versions=None):
     """
-    Saves the predicted return value into the predictions table.
+    Saves the predicted return of several tickers in a single bulk insert and
+    notifies listeners once per ticker and horizon.
+    Args:
+        predictions (dict): Predicted return in percent per symbol, or per symbol and
+            horizon ({symbol: {horizon: value}}).
+        versions (dict, optional): Registered model version per symbol, or per symbol
+            and horizon (see src.model_registry), LEGACY_MODEL_VERSION for the missing ones.
+    Returns:
+        int: The number of saved predictions, None on failure.
+    """
+    versions = versions or {}
+    rows = []
+    for symbol, values in predictions.items():
+        if values is None:
+            continue
+        symbol_versions = _by_horizon(versions.get(symbol))
+        rows.extend(
+            (symbol, float(value), symbol_versions.get(horizon) or LEGACY_MODEL_VERSION, horizon)
+            for horizon, value in _by_horizon(values).items() if value is not None)
+    if not rows:
+        logger.warning("No prediction to save.")
+        return 0
+    query = """
+        INSERT INTO predictions (symbol, predicted_return_pct, model_version, horizon_days)
+        VALUES %s;
     """
-    query = "INSERT INTO predictions (predicted_return_pct, model_version) VALUES (%s, %s);"
     try:
         with get_db_connection(db_config) as conn:
             with conn.cursor() as cursor:
-                # On marque 'v1' pour l'instant, utile pour tes futures améliorations
-                cursor.execute(query, (float(value), 'xgboost_v1'))
-                logger.info(f"Prediction saved: {value}%")
+                extras.execute_values(cursor, query, rows)
+                for symbol, value, _, horizon in rows:
+                    cursor.execute("SELECT pg_notify(%s, %s);",
+                                   (PREDICTION_CHANNEL, f"{symbol}:{horizon}"))
+                    logger.info(f"{horizon}-day prediction saved for {symbol}: {value}%")
+        return len(rows)
     except Exception as e:
         logger.error(f"Failed to save prediction: {e}")
+        return None
@@ -1,11 +1,27 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-import pyarrow.parquet as pq
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import xgboost as xgb
 import logging
+from src.data_lake import PRICE_COLUMNS, parse_numeric, parse_volume, read_data_lake, read_data_lake_table
+from src.model_artifacts import data_hash, load_tuned_params, save_model_artifacts
 
 logger = logging.getLogger(__name__)
 
+# Columns of create_features_for_xgboost the model is trained on, in model order
+FEATURE_NAMES = ["Close", "Volume", "log_ret", "ret_lag1", "ret_lag7", "vol_lag1", "ma_30",
+                 "std_30", "dist_ma30", "daily_range", "day_of_week"]
+# Columns of create_features_for_xgboost, in frame order
+FRAME_COLUMNS = ["Open", "High", "Low"] + FEATURE_NAMES + ["target"]
+# Raw columns the features are computed from, Open is never used
+RAW_COLUMNS = ["High", "Low", "Close", "Volume"]
+ROLLING_WINDOW = 30
+HORIZON = 7
+
 # This must be put in the "main.py" file
 logging.basicConfig(
     level=logging.INFO,
@@ -14,17 +30,13 @@ logging.basicConfig(
 )
 
 
-def extract_df(folder_data_lake):
+def extract_df(folder_data_lake, start_date=None, end_date=None):
     """
-    Extracts data from a Parquet file in the data lake.
+    Extracts data from the partitioned Parquet data lake.
+    Only the partitions overlapping [start_date, end_date] are read.
     """
     logging.info("Extracting data from Parquet data lake...")
-    table = pq.read_table(folder_data_lake)
-    df = table.to_pandas()
-    df = df.reset_index()
-    df.columns = [col[0] for col in df.columns]
-    df = df.drop_duplicates(subset=['Date'], keep='last')
-    return df
+    return read_data_lake(folder_data_lake, start_date=start_date, end_date=end_date)
 
 
 def create_features_for_xgboost(df):
@@ -42,8 +54,7 @@ def create_features_for_xgboost(df):
 
     # Clean 'Volume' (e.g., "10K" -> 10000) if it is a string
     if df['Volume'].dtype == object:
-        df['Volume'] = df['Volume'].replace(
-            {'K': '*1e3', 'M': '*1e6', 'B': '*1e9'}, regex=True).map(pd.eval).astype(float)
+        df['Volume'] = parse_volume(df['Volume'])
 
     # --- Step 1: Feature Engineering ---
 
@@ -85,74 +96,364 @@ def create_features_for_xgboost(df):
     # On calcule la variation entre le prix dans 7 jours et le prix d'aujourd'hui
     df['target'] = np.log(df['Close'].shift(-7) / df['Close'])
 
-    # Remove empty rows (NaNs) created by shifting and rolling
-    df = df.dropna()
+    # Remove empty rows (NaNs) created by shifting and rolling.
+    # Rows without a target (the last 7 days) are kept: the newest one is what we score.
+    feature_columns = [col for col in df.columns if col != 'target']
+    df = df.dropna(subset=feature_columns)
 
     return df
 
 
 def convert_to_float(df):
     """
-    Converts price columns to float after removing commas and dollar signs.
+    Converts price columns to float. The data lake already stores float64 prices, so
+    this is a no-op unless a column arrives as text (e.g. "$1,234.5").
     """
     logging.info("Converting price columns to float...")
-    for col in ['Close', 'High', 'Low', 'Open']:
-        df[col] = df[col].astype(str).str.replace(',', '').str.replace('$', '')
-        df[col] = df[col].astype(float)
+    for col in PRICE_COLUMNS:
+        if df[col].dtype != np.float64:
+            df[col] = parse_numeric(df[col])
     return df
 
 
 def correct_data_types(df):
     """
-    Corrects data types for price columns after removing commas and dollar signs.
+    Corrects the data type of the volume column, expanding text values such as "10K".
+    The prices are handled by convert_to_float.
     """
-    logging.info("Correcting data types for price columns...")
-    df['Low'] = df['Low'].astype(str).str.replace(',', '').str.replace('$', '')
-    df['Low'] = df['Low'].astype(float)
-
-    df['Open'] = df['Open'].astype(str).str.replace(
-        ',', '').str.replace('$', '')
-    df['Open'] = df['Open'].astype(float)
+    logging.info("Correcting data types for the volume column...")
+    if df['Volume'].dtype == object:
+        df['Volume'] = parse_volume(df['Volume'])
     return df
 
 
-def train_xgboost_model(df, features_to_drop=['target', 'Open', 'High', 'Low']):
+def _window_sum(x, window):
     """
-    Trains an XGBoost model to predict future returns based on engineered features.
+    Sums of the trailing windows of x, NaN for the first window - 1 positions.
+    """
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        csum = np.cumsum(x)
+        out[window - 1:] = csum[window - 1:]
+        out[window:] -= csum[:-window]
+    return out
+
+
+def rolling_mean_std(x, window):
+    """
+    Trailing mean and sample std over `window` values from running sums, NaN for
+    the windows holding a NaN, as pandas' rolling(window).mean()/.std().
+    """
+    missing = np.isnan(x)
+    filled = np.where(missing, 0.0, x)
+    total = _window_sum(filled, window)
+    mean = total / window
+    var = (_window_sum(filled * filled, window) - total * mean) / (window - 1)
+    std = np.sqrt(np.maximum(var, 0.0))
+    incomplete = _window_sum(missing.astype(np.float64), window) > 0
+    mean[incomplete] = np.nan
+    std[incomplete] = np.nan
+    return mean, std
+
+
+def build_feature_arrays(dates, high, low, close, volume, dtype=np.float32):
+    """
+    Computes the features of create_features_for_xgboost straight into one
+    preallocated (rows, FEATURE_NAMES) array, without intermediate DataFrames.
+    Args:
+        dates (np.ndarray): datetime64 bar dates, sorted.
+        high, low, close, volume (np.ndarray): float64 raw columns.
+        dtype: dtype of the feature matrix. XGBoost works in float32 internally, so
+            float32 halves the matrix without changing the model.
+    Returns:
+        tuple: The feature matrix and the float64 target (NaN for the last HORIZON bars).
+    """
+    n = len(close)
+    X = np.empty((n, len(FEATURE_NAMES)), dtype=dtype)
+    log_ret = np.full(n, np.nan)
+    if n > 1:
+        log_ret[1:] = np.log(close[1:] / close[:-1])
+    X[:, 0] = close
+    X[:, 1] = volume
+    X[:, 2] = log_ret
+    for column, source, lag in ((3, log_ret, 1), (4, log_ret, 7), (5, volume, 1)):
+        X[:lag, column] = np.nan
+        X[lag:, column] = source[:-lag] if n > lag else []
+    ma_30, _ = rolling_mean_std(close, ROLLING_WINDOW)
+    _, std_30 = rolling_mean_std(log_ret, ROLLING_WINDOW)
+    X[:, 6] = ma_30
+    X[:, 7] = std_30
+    X[:, 8] = close / ma_30 - 1
+    X[:, 9] = (high - low) / close
+    # 1970-01-01 was a Thursday (dayofweek 3)
+    X[:, 10] = (dates.astype('datetime64[D]').astype(np.int64) + 3) % 7
+
+    return X, build_targets(close, [HORIZON])[:, 0]
+
+
+def build_targets(close, horizons):
+    """
+    Computes the log return over each horizon from float64 closes.
+    Returns:
+        np.ndarray: (rows, horizons) targets, NaN where the horizon is past the last bar.
+    """
+    Y = np.full((len(close), len(horizons)), np.nan)
+    for column, horizon in enumerate(horizons):
+        if len(close) > horizon:
+            Y[:-horizon, column] = np.log(close[horizon:] / close[:-horizon])
+    return Y
+
+
+def _rows(mask):
+    """
+    Returns a slice selecting the True rows when they are contiguous, so that the
+    selection is a view, else their positions.
+    """
+    positions = np.flatnonzero(mask)
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return slice(positions[0], positions[-1] + 1)
+    return positions
+
+
+def build_training_arrays(folder_data_lake, start_date=None, end_date=None, dtype=np.float32,
+                          horizons=None):
+    """
+    Reads only RAW_COLUMNS of the data lake and builds the feature matrix with
+    build_feature_arrays. The warm-up bars before start_date are read too, so the
+    first rows match create_features_for_xgboost over the whole history.
+    Args:
+        horizons (list, optional): Return the (rows, horizons) targets of these
+            horizons (see build_targets) instead of the HORIZON one.
+    Returns:
+        tuple: Feature matrix, target and dates of the rows with every feature set.
+    """
+    read_from = None
+    if start_date is not None:
+        read_from = pd.Timestamp(start_date) - pd.Timedelta(days=2 * ROLLING_WINDOW)
+    table = read_data_lake_table(folder_data_lake, start_date=read_from, end_date=end_date,
+                                 columns=RAW_COLUMNS)
+    dates = table.column('Date').to_numpy()
+    high, low, close, volume = (pc.cast(table.column(name), pa.float64()).to_numpy()
+                                for name in RAW_COLUMNS)
+    del table
+    X, y = build_feature_arrays(dates, high, low, close, volume, dtype=dtype)
+    if horizons is not None:
+        y = build_targets(close, horizons)
+    keep = ~np.isnan(X).any(axis=1)
+    if start_date is not None:
+        keep &= dates >= np.datetime64(pd.Timestamp(start_date).date())
+    rows = _rows(keep)
+    return X[rows], y[rows], dates[rows]
+
+
+def thread_budget(workers, cpu_count=None):
+    """
+    Splits the cores evenly between pool workers, so that the XGBoost threads of
+    concurrent fits do not oversubscribe the machine.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, cpu_count // workers)
+
+
+def fit_booster(X, y, params, n_jobs=None, feature_names=FEATURE_NAMES, ref=None):
+    """
+    Fits the model of train_xgboost_model with the native API on a QuantileDMatrix,
+    which bins the features without another full-precision copy.
+    Args:
+        params (dict): XGBRegressor-style hyperparameters, n_estimators included.
+        ref (xgb.QuantileDMatrix, optional): Matrix whose quantile cuts are reused
+            instead of sketching X again.
+    """
+    params = dict(params)
+    num_boost_round = params.pop('n_estimators', 100)
+    params.update(objective='reg:squarederror', tree_method='hist')
+    if n_jobs is not None:
+        params['nthread'] = n_jobs
+    dtrain = xgb.QuantileDMatrix(X, label=y, feature_names=list(feature_names), nthread=n_jobs,
+                                 max_bin=params.get('max_bin', 256), ref=ref)
+    return xgb.train(params, dtrain, num_boost_round=num_boost_round)
+
+
+def train_on_arrays(X, y, dates, feature_names=FEATURE_NAMES, model_dir=None, n_jobs=None):
+    """
+    Trains on the rows with a target and predicts the return of the last row.
+    If model_dir is given, the booster and its feature schema are persisted there, and
+    the hyperparameters of the last tuning run found there (see src.tuning) are reused.
+    Returns:
+        np.ndarray: The predicted return over the next 7 days in percent, as a 1-element array.
     """
-    logging.info("Training XGBoost model...")
     # We remove rows where 'target' is NaN (the last 7 days) because we can't learn from them.
-    df_train = df.dropna(subset=['target'])
-    X_train = df_train.drop(columns=features_to_drop)
-    y_train = df_train['target']
-    X_latest = df.drop(columns=features_to_drop).tail(1)
+    train = _rows(~np.isnan(y))
+    X_train, y_train, train_dates = X[train], y[train], dates[train]
 
-    model = xgb.XGBRegressor(objective='reg:squarederror', n_estimators=100)
-    model.fit(X_train, y_train)
+    params = {'n_estimators': 100}
+    if model_dir is not None:
+        params.update(load_tuned_params(model_dir))
+    booster = fit_booster(X_train, y_train, params, n_jobs, feature_names)
+    if model_dir is not None:
+        save_model_artifacts(booster, feature_names, model_dir, metadata={
+            "train_start": str(pd.Timestamp(train_dates.min()).date()),
+            "train_end": str(pd.Timestamp(train_dates.max()).date()),
+            "train_rows": int(len(y_train)),
+            "data_hash": data_hash(X_train, y_train, feature_names, train_dates),
+            "params": params,
+            "metrics": training_metrics(y_train, booster.inplace_predict(X_train)),
+        })
     # --- Step 3: Predict the Future ---
-    # We use the latest available data (X_latest) to forecast
-    prediction_log_ret = model.predict(X_latest)
+    # We use the latest available data to forecast
+    prediction_log_ret = booster.inplace_predict(X[-1:])
 
     # Convert log return back to percentage for human readability
     predicted_return_pct = (np.exp(prediction_log_ret) - 1) * 100
-    logging.info(f"length of prediction: {len(predicted_return_pct)}")
     logging.info(
         f"Predicted return for the next 7 days: {predicted_return_pct[0]:.2f}%")
     return predicted_return_pct
 
 
-def training_task(output_dir, features_to_drop=['target', 'Open', 'High', 'Low']):
+def train_horizons(X, Y, dates, horizons, feature_names=FEATURE_NAMES, model_dir=None,
+                   n_jobs=None):
+    """
+    Trains one model per horizon on the same feature matrix, concurrently. The
+    quantile cuts are computed once over X and reused by the training matrix of
+    every horizon, which only differ by their last rows (those without a target).
+    Args:
+        Y (np.ndarray): (rows, horizons) targets, see build_targets.
+        horizons (list): Horizons in days, one per column of Y.
+        n_jobs (int, optional): Threads shared by the concurrent fits, all cores by default.
+    Returns:
+        dict: The predicted return in percent over each horizon, from the last row.
+    """
+    params = {'n_estimators': 100}
+    if model_dir is not None:
+        params.update(load_tuned_params(model_dir))
+    workers = min(len(horizons), n_jobs or os.cpu_count() or 1)
+    threads = thread_budget(workers, n_jobs)
+    base = xgb.QuantileDMatrix(X, feature_names=list(feature_names), nthread=n_jobs,
+                               max_bin=params.get('max_bin', 256))
+
+    def fit(column, horizon):
+        train = _rows(~np.isnan(Y[:, column]))
+        X_train, y_train, train_dates = X[train], Y[train, column], dates[train]
+        booster = fit_booster(X_train, y_train, params, threads, feature_names, ref=base)
+        if model_dir is not None:
+            save_model_artifacts(booster, feature_names, model_dir, horizon=horizon, metadata={
+                "train_start": str(pd.Timestamp(train_dates.min()).date()),
+                "train_end": str(pd.Timestamp(train_dates.max()).date()),
+                "train_rows": int(len(y_train)),
+                "data_hash": data_hash(X_train, y_train, feature_names, train_dates),
+                "params": params,
+                "metrics": training_metrics(y_train, booster.inplace_predict(X_train)),
+            })
+        prediction_log_ret = booster.inplace_predict(X[-1:])
+        return horizon, float((np.exp(prediction_log_ret[0]) - 1) * 100)
+
+    logging.info(f"Training {len(horizons)} horizon(s) on {workers} thread(s) of {threads}...")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        predictions = dict(executor.map(fit, range(len(horizons)), horizons))
+    for horizon, value in predictions.items():
+        logging.info(f"Predicted return for the next {horizon} days: {value:.2f}%")
+    return predictions
+
+
+def train_xgboost_model(df, features_to_drop=['target', 'Open', 'High', 'Low'], model_dir=None,
+                        n_jobs=None, dtype=np.float32):
+    """
+    Trains an XGBoost model to predict future returns based on engineered features.
+    The feature columns are copied once into a `dtype` array, see train_on_arrays.
+    n_jobs caps the threads XGBoost uses, all cores by default.
+    """
+    logging.info("Training XGBoost model...")
+    feature_names = [col for col in df.columns if col not in features_to_drop]
+    X = df[feature_names].to_numpy(dtype=dtype)
+    y = df['target'].to_numpy(dtype=np.float64)
+    return train_on_arrays(X, y, df.index.to_numpy(), feature_names, model_dir, n_jobs)
+
+
+def train_xgboost_horizons(df, horizons, features_to_drop=['target', 'Open', 'High', 'Low'],
+                           model_dir=None, n_jobs=None, dtype=np.float32):
+    """
+    Trains one model per horizon on the features of create_features_for_xgboost,
+    see train_horizons. The targets are computed from the 'Close' column.
+    Returns:
+        dict: The predicted return in percent over each horizon.
+    """
+    logging.info("Training XGBoost models...")
+    feature_names = [col for col in df.columns if col not in features_to_drop]
+    X = df[feature_names].to_numpy(dtype=dtype)
+    Y = build_targets(df['Close'].to_numpy(dtype=np.float64), horizons)
+    return train_horizons(X, Y, df.index.to_numpy(), horizons, feature_names, model_dir, n_jobs)
+
+
+def projected_features(features_to_drop):
+    """
+    Returns the columns of FEATURE_NAMES a model trained without features_to_drop
+    uses, or None if it uses a column build_feature_arrays does not compute
+    (Open, High, Low or the target), which only the DataFrame path can train on.
+    """
+    kept = [column for column in FRAME_COLUMNS if column not in features_to_drop]
+    return kept if all(column in FEATURE_NAMES for column in kept) else None
+
+
+def train_from_lake(folder_data_lake, model_dir=None, start_date=None, n_jobs=None,
+                    dtype=np.float32, horizons=None, feature_names=FEATURE_NAMES):
+    """
+    Trains straight from the data lake through build_training_arrays, the leanest path:
+    peak memory stays a small multiple of the projected raw columns.
+    Args:
+        horizons (list, optional): Train one model per horizon on the same feature
+            matrix (see train_horizons) and return their predictions as a dict.
+        feature_names (list): Columns of FEATURE_NAMES to train on, see projected_features.
+    """
+    logging.info("Training XGBoost model from the data lake arrays...")
+    X, y, dates = build_training_arrays(folder_data_lake, start_date=start_date, dtype=dtype,
+                                        horizons=horizons)
+    if list(feature_names) != FEATURE_NAMES:
+        X = np.ascontiguousarray(X[:, [FEATURE_NAMES.index(name) for name in feature_names]])
+    if horizons is not None:
+        return train_horizons(X, y, dates, horizons, feature_names, model_dir, n_jobs)
+    return train_on_arrays(X, y, dates, feature_names, model_dir, n_jobs)
+
+
+def training_metrics(y_true, y_pred):
+    """
+    In-sample fit of the model, stored with it in the registry. The walk-forward
+    backtest (src.backtest) gives the out-of-sample figures.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    error = np.asarray(y_pred, dtype=np.float64) - y_true
+    return {
+        "train_rmse": float(np.sqrt(np.mean(error ** 2))),
+        "train_mae": float(np.mean(np.abs(error))),
+        "train_direction_accuracy": float(np.mean(np.sign(y_pred) == np.sign(y_true))),
+    }
+
+
+def training_task(output_dir, features_to_drop=['target', 'Open', 'High', 'Low'], start_date=None,
+                  model_dir=None, n_jobs=None, dtype=np.float32, horizons=None):
     """
-    Orchestrates the training task: data extraction, preprocessing, feature engineering, and model training.
+    Orchestrates the training task: column-projected extraction, feature engineering into
+    arrays, and model training (see train_from_lake). With several horizons the
+    extraction and the features are done once for all of them.
+    The features kept by features_to_drop are projected from the arrays; keeping a
+    column the arrays do not compute (see projected_features) goes through the
+    DataFrame path (extract_df, create_features_for_xgboost), which reads every column.
     """
-    df = extract_df(output_dir)
-    df = convert_to_float(df)
-    df = correct_data_types(df)
-    df = create_features_for_xgboost(df)
-    predicted_return = train_xgboost_model(df, features_to_drop)
-    return predicted_return
+    feature_names = projected_features(features_to_drop)
+    if feature_names is not None:
+        return train_from_lake(output_dir, model_dir=model_dir, start_date=start_date,
+                               n_jobs=n_jobs, dtype=dtype, horizons=horizons,
+                               feature_names=feature_names)
+    df = create_features_for_xgboost(correct_data_types(convert_to_float(extract_df(output_dir))))
+    if start_date is not None:
+        # Filtered after the features, whose rolling windows need the earlier bars
+        df = df[df.index >= pd.Timestamp(start_date)]
+    if horizons is not None:
+        return train_xgboost_horizons(df, horizons, features_to_drop, model_dir, n_jobs, dtype)
+    return train_xgboost_model(df, features_to_drop, model_dir, n_jobs, dtype)
 
 
 if __name__ == "__main__":
-    predicted_return = training_task()
+    logging.basicConfig(level=logging.INFO)
+    predicted_return = training_task(os.getenv("DATA_LAKE_PATH", "data_lake/btc_usd"),
+                                     model_dir=os.getenv("MODEL_DIR"))
     print(f"Predicted return for the next 7 days: {predicted_return[0]:.2f}%")
@@ -0,0 +1,15 @@
+import pytest
+
+from benchmarks.synthetic import generate_ohlcv
+
+
+@pytest.fixture
+def make_bars():
+    """
+    Returns a factory of deterministic daily OHLCV frames, see generate_ohlcv.
+    """
+    def make(start, days, seed=0):
+        df = generate_ohlcv(days, start=start, seed=seed)
+        df["Date"] = df["Date"].astype("datetime64[ns]")
+        return df
+    return make
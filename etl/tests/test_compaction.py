@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+
+from src.compaction import compact_data_lake
+from src.data_lake import load_manifest, read_data_lake, staging_path, write_partitioned
+
+
+def write_daily_backups(root, bars):
+    for _, bar in bars.iterrows():
+        day = bar["Date"].strftime("%Y-%m-%d")
+        write_partitioned(bar.to_frame().T, root, f"btc_data_{day}")
+
+
+def test_compaction_merges_each_year_into_one_file(tmp_path, make_bars):
+    bars = make_bars("2023-12-01", 62)
+    write_daily_backups(tmp_path, bars)
+    before = read_data_lake(tmp_path)
+
+    removed = compact_data_lake(tmp_path)
+
+    entries = load_manifest(tmp_path)["files"]
+    assert removed == 62
+    assert [(entry["year"], entry["month"], entry["rows"]) for entry in entries] == [
+        (2023, None, 31), (2024, None, 31)]
+    assert all(os.path.exists(os.path.join(tmp_path, entry["path"])) for entry in entries)
+    # No month directory is left behind
+    assert sorted(os.listdir(os.path.join(tmp_path, "year=2024"))) == ["btc_data_2024.parquet"]
+    pd.testing.assert_frame_equal(read_data_lake(tmp_path), before)
+
+
+def test_compaction_keeps_the_latest_revision_of_a_bar(tmp_path, make_bars):
+    bars = make_bars("2024-01-01", 10)
+    write_partitioned(bars, tmp_path, "btc_data_batch")
+    revised = bars.iloc[[3]].assign(Close=-1.0)
+    write_partitioned(revised, tmp_path, "btc_data_2024-01-04")
+    before = read_data_lake(tmp_path)
+
+    compact_data_lake(tmp_path)
+
+    df = read_data_lake(tmp_path)
+    assert len(load_manifest(tmp_path)["files"]) == 1
+    assert df.loc[3, "Close"] == -1.0
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_compaction_is_idempotent_and_skips_small_years(tmp_path, make_bars):
+    write_partitioned(make_bars("2024-01-01", 1), tmp_path, "btc_data_2024-01-01")
+
+    assert compact_data_lake(tmp_path) == 0
+    assert load_manifest(tmp_path)["files"][0]["month"] == 1
+
+    write_daily_backups(tmp_path, make_bars("2024-01-02", 3))
+    assert compact_data_lake(tmp_path) == 4
+    manifest = load_manifest(tmp_path)
+    assert compact_data_lake(tmp_path) == 0
+    assert load_manifest(tmp_path) == manifest
+
+
+def test_compaction_removes_the_scratch_file(tmp_path, make_bars):
+    write_daily_backups(tmp_path, make_bars("2024-01-01", 2))
+    scratch = staging_path(tmp_path)
+    os.makedirs(os.path.dirname(scratch))
+    make_bars("2024-01-03", 1).to_parquet(scratch)
+
+    compact_data_lake(tmp_path)
+
+    assert not os.path.exists(scratch)
+    assert len(read_data_lake(tmp_path)) == 2
@@ -0,0 +1,95 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.data_lake import (
+    LEGACY_DIR, OHLCV_COLUMNS, load_manifest, read_data_lake, select_files, write_partitioned)
+
+
+def assert_same_bars(actual, expected):
+    pd.testing.assert_frame_equal(
+        actual.reset_index(drop=True),
+        expected[["Date"] + OHLCV_COLUMNS].reset_index(drop=True),
+        check_dtype=False)
+
+
+def test_write_then_read_round_trip(tmp_path, make_bars):
+    bars = make_bars("2024-01-15", 90)
+    entries = write_partitioned(bars, tmp_path, "btc_data_batch")
+
+    # One file per month, each recorded in the manifest
+    assert [(entry["year"], entry["month"]) for entry in entries] == [
+        (2024, 1), (2024, 2), (2024, 3), (2024, 4)]
+    assert load_manifest(tmp_path)["files"] == entries
+    assert sum(entry["rows"] for entry in entries) == 90
+    assert_same_bars(read_data_lake(tmp_path), bars)
+
+
+def test_read_range_touches_only_overlapping_files(tmp_path, make_bars):
+    bars = make_bars("2024-01-15", 90)
+    write_partitioned(bars, tmp_path, "btc_data_batch")
+
+    entries = select_files(load_manifest(tmp_path), "2024-02-10", "2024-02-20")
+    assert [entry["month"] for entry in entries] == [2]
+
+    df = read_data_lake(tmp_path, start_date="2024-02-10", end_date="2024-02-20")
+    expected = bars[(bars["Date"] >= "2024-02-10") & (bars["Date"] <= "2024-02-20")]
+    assert_same_bars(df, expected)
+
+
+def test_read_projects_columns(tmp_path, make_bars):
+    write_partitioned(make_bars("2024-01-01", 10), tmp_path, "btc_data_batch")
+
+    df = read_data_lake(tmp_path, columns=["Close"])
+
+    assert list(df.columns) == ["Date", "Close"]
+    assert len(df) == 10
+
+
+def test_later_write_wins_on_overlapping_dates(tmp_path, make_bars):
+    bars = make_bars("2024-01-01", 20)
+    write_partitioned(bars, tmp_path, "btc_data_first")
+    revised = bars.iloc[5:10].assign(Close=bars["Close"].iloc[5:10] * 2)
+    write_partitioned(revised, tmp_path, "btc_data_revision")
+
+    df = read_data_lake(tmp_path)
+
+    assert len(df) == 20
+    expected = bars.copy()
+    expected.loc[5:9, "Close"] = revised["Close"]
+    assert_same_bars(df, expected)
+
+
+def test_rewriting_a_prefix_replaces_its_manifest_entry(tmp_path, make_bars):
+    bars = make_bars("2024-01-01", 10)
+    write_partitioned(bars, tmp_path, "btc_data_batch")
+    write_partitioned(bars, tmp_path, "btc_data_batch")
+
+    assert len(load_manifest(tmp_path)["files"]) == 1
+
+
+def test_empty_lake_reads_an_empty_frame(tmp_path):
+    df = read_data_lake(tmp_path)
+
+    assert df.empty
+    assert list(df.columns) == ["Date"] + OHLCV_COLUMNS
+
+
+def test_flat_layout_is_migrated_on_first_read(tmp_path, make_bars):
+    bars = make_bars("2023-12-20", 30)
+    bars.to_parquet(os.path.join(tmp_path, "btc_data_old.parquet"), index=False)
+
+    assert_same_bars(read_data_lake(tmp_path), bars)
+    assert os.listdir(os.path.join(tmp_path, LEGACY_DIR)) == ["btc_data_old.parquet"]
+    assert {entry["year"] for entry in load_manifest(tmp_path)["files"]} == {2023, 2024}
+
+
+@pytest.mark.parametrize("volume", ["1.5K", "2,000", "3M"])
+def test_text_volumes_are_parsed_before_writing(tmp_path, make_bars, volume):
+    bars = make_bars("2024-01-01", 1).astype({"Volume": object})
+    bars.loc[0, "Volume"] = volume
+    write_partitioned(bars, tmp_path, "btc_data_batch")
+
+    expected = {"1.5K": 1_500, "2,000": 2_000, "3M": 3_000_000}[volume]
+    assert read_data_lake(tmp_path)["Volume"].tolist() == [expected]
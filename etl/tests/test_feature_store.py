@@ -0,0 +1,135 @@
+import pandas as pd
+import pytest
+
+from src import feature_store
+from src.compaction import compact_data_lake
+from src.data_lake import write_partitioned
+from src.feature_store import (
+    build_features, check_consistency, load_state, only_appended, update_feature_store)
+
+
+@pytest.fixture
+def bars(make_bars):
+    return make_bars("2023-09-01", 200)
+
+
+def write_days(lake, bars):
+    for _, bar in bars.iterrows():
+        day = bar["Date"].strftime("%Y-%m-%d")
+        write_partitioned(bar.to_frame().T, lake, f"btc_data_{day}")
+
+
+def assert_matches_rebuild(lake, df):
+    full = build_features(lake)
+    assert check_consistency(df, full)
+    pd.testing.assert_index_equal(df.index, full.index)
+
+
+def test_daily_appends_match_a_full_rebuild(tmp_path, bars):
+    write_partitioned(bars.iloc[:150], tmp_path, "btc_data_history")
+    assert load_state(tmp_path) is None
+    update_feature_store(tmp_path)
+    assert load_state(tmp_path)["mode"] == "rebuild"
+
+    for day in range(150, 200):
+        write_days(tmp_path, bars.iloc[[day]])
+        df = update_feature_store(tmp_path)
+        assert load_state(tmp_path)["mode"] == "incremental"
+
+    assert df.index.max() == bars["Date"].iloc[-1]
+    assert_matches_rebuild(tmp_path, df)
+
+
+def test_revised_last_bar_is_updated_incrementally(tmp_path, bars):
+    write_partitioned(bars.iloc[:150], tmp_path, "btc_data_history")
+    update_feature_store(tmp_path)
+
+    revised = bars.iloc[[149]].assign(Close=bars["Close"].iloc[149] * 1.1)
+    write_days(tmp_path, revised)
+    df = update_feature_store(tmp_path)
+
+    assert load_state(tmp_path)["mode"] == "incremental"
+    assert df["Close"].iloc[-1] == pytest.approx(revised["Close"].iloc[0])
+    assert_matches_rebuild(tmp_path, df)
+
+
+def test_nightly_compaction_keeps_the_store_incremental(tmp_path, bars):
+    write_partitioned(bars.iloc[:115], tmp_path, "btc_data_history")
+    compact_data_lake(tmp_path)
+    update_feature_store(tmp_path)
+
+    # As the pipeline does, across the new year: back up the day, compact, update
+    for day in range(115, 135):
+        write_days(tmp_path, bars.iloc[[day]])
+        compact_data_lake(tmp_path)
+        df = update_feature_store(tmp_path)
+        assert load_state(tmp_path)["mode"] == "incremental"
+
+    assert_matches_rebuild(tmp_path, df)
+
+
+def test_filled_gap_triggers_a_rebuild(tmp_path, bars):
+    write_partitioned(bars.iloc[:100], tmp_path, "btc_data_history")
+    write_partitioned(bars.iloc[120:150], tmp_path, "btc_data_recent")
+    update_feature_store(tmp_path)
+
+    write_partitioned(bars.iloc[100:120], tmp_path, "btc_data_backfill")
+    df = update_feature_store(tmp_path)
+
+    assert load_state(tmp_path)["mode"] == "rebuild"
+    assert_matches_rebuild(tmp_path, df)
+
+
+def test_revised_old_bar_triggers_a_rebuild(tmp_path, bars):
+    write_days(tmp_path, bars.iloc[:60])
+    update_feature_store(tmp_path)
+
+    write_days(tmp_path, bars.iloc[[10]].assign(Close=1.0))
+    df = update_feature_store(tmp_path)
+
+    assert load_state(tmp_path)["mode"] == "rebuild"
+    assert_matches_rebuild(tmp_path, df)
+
+
+def test_changed_feature_code_triggers_a_rebuild(tmp_path, bars, monkeypatch):
+    write_partitioned(bars.iloc[:100], tmp_path, "btc_data_history")
+    update_feature_store(tmp_path)
+    monkeypatch.setattr(feature_store, "features_version", lambda: "other-code")
+
+    write_days(tmp_path, bars.iloc[[100]])
+    update_feature_store(tmp_path)
+
+    assert load_state(tmp_path)["mode"] == "rebuild"
+
+
+def test_verify_keeps_the_incremental_table_when_consistent(tmp_path, bars):
+    write_partitioned(bars.iloc[:100], tmp_path, "btc_data_history")
+    update_feature_store(tmp_path)
+    write_days(tmp_path, bars.iloc[100:103])
+
+    df = update_feature_store(tmp_path, verify=True)
+
+    assert load_state(tmp_path)["mode"] == "incremental"
+    assert_matches_rebuild(tmp_path, df)
+
+
+def test_only_appended_accepts_new_files_and_growth_at_the_end():
+    stored = {"a": ["2024-01-01", "2024-01-10", 10, "t0"]}
+    new_dates = pd.Series(pd.to_datetime(["2024-01-10", "2024-01-11", "2024-01-12"]))
+
+    grown = {"a": ["2024-01-01", "2024-01-12", 12, "t1"]}
+    assert only_appended(stored, grown, "2024-01-10", new_dates)
+    added = {**stored, "b": ["2024-01-11", "2024-01-12", 2, "t1"]}
+    assert only_appended(stored, added, "2024-01-10", new_dates)
+
+
+def test_only_appended_rejects_changes_before_the_last_date():
+    stored = {"a": ["2024-01-01", "2024-01-10", 10, "t0"]}
+    new_dates = pd.Series(pd.to_datetime(["2024-01-10"]))
+
+    rewritten = {"a": ["2024-01-01", "2024-01-10", 10, "t1"]}
+    assert not only_appended(stored, rewritten, "2024-01-10", new_dates)
+    removed = {}
+    assert not only_appended(stored, removed, "2024-01-10", new_dates)
+    backfilled = {**stored, "b": ["2023-12-01", "2023-12-31", 31, "t1"]}
+    assert not only_appended(stored, backfilled, "2024-01-10", new_dates)
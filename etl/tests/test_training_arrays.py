@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from src.data_lake import write_partitioned
+from src.xgboost_training import (
+    FEATURE_NAMES, build_targets, build_training_arrays, convert_to_float, correct_data_types,
+    create_features_for_xgboost, extract_df, projected_features, train_from_lake,
+    train_xgboost_horizons, train_xgboost_model)
+
+FRAME_DROPS = ['target', 'Open', 'High', 'Low']
+
+
+@pytest.fixture
+def lake(tmp_path, make_bars):
+    write_partitioned(make_bars("2023-01-01", 400), tmp_path, "btc_data_history")
+    return tmp_path
+
+
+@pytest.fixture
+def frame(lake):
+    return create_features_for_xgboost(correct_data_types(convert_to_float(extract_df(lake))))
+
+
+def test_arrays_match_the_dataframe_features(lake, frame):
+    X, y, dates = build_training_arrays(lake, dtype=np.float64)
+
+    np.testing.assert_array_equal(dates, frame.index.to_numpy().astype(dates.dtype))
+    np.testing.assert_allclose(X, frame[FEATURE_NAMES].to_numpy(), rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(y, frame['target'].to_numpy(), rtol=1e-12, equal_nan=True)
+
+
+def test_float32_arrays_are_the_rounded_float64_ones(lake):
+    X32, y32, _ = build_training_arrays(lake)
+    X64, y64, _ = build_training_arrays(lake, dtype=np.float64)
+
+    assert X32.dtype == np.float32
+    np.testing.assert_allclose(X32, X64.astype(np.float32), rtol=1e-6)
+    np.testing.assert_array_equal(y32, y64)
+
+
+def test_start_date_keeps_the_warm_up_of_the_full_history(lake):
+    X, y, dates = build_training_arrays(lake, dtype=np.float64)
+    X_from, y_from, dates_from = build_training_arrays(lake, start_date="2023-06-01",
+                                                       dtype=np.float64)
+
+    skipped = np.searchsorted(dates, np.datetime64("2023-06-01"))
+    np.testing.assert_array_equal(dates_from, dates[skipped:])
+    np.testing.assert_allclose(X_from, X[skipped:], rtol=1e-9)
+    np.testing.assert_array_equal(y_from, y[skipped:])
+
+
+def test_horizon_targets_include_the_default_one(lake):
+    _, y, _ = build_training_arrays(lake, dtype=np.float64)
+    _, Y, _ = build_training_arrays(lake, dtype=np.float64, horizons=[1, 7, 30])
+
+    assert Y.shape == (len(y), 3)
+    np.testing.assert_array_equal(Y[:, 1], y)
+    assert np.isnan(Y[-30:, 2]).all() and not np.isnan(Y[:-30, 2]).any()
+
+
+def test_build_targets_handles_horizons_past_the_history():
+    close = np.array([1.0, 2.0, 4.0])
+
+    Y = build_targets(close, [1, 5])
+
+    np.testing.assert_allclose(Y[:, 0], [np.log(2), np.log(2), np.nan])
+    assert np.isnan(Y[:, 1]).all()
+
+
+def test_projected_features_follow_features_to_drop():
+    assert projected_features(FRAME_DROPS) == FEATURE_NAMES
+    assert projected_features(FRAME_DROPS + ['day_of_week']) == FEATURE_NAMES[:-1]
+    # Open, High and Low are not computed by build_feature_arrays
+    assert projected_features(['target', 'Open']) is None
+
+
+def test_lake_training_predicts_as_the_dataframe_path(lake, frame):
+    from_frame = train_xgboost_model(frame.copy(), n_jobs=1)
+    from_lake = train_from_lake(lake, n_jobs=1)
+
+    np.testing.assert_allclose(from_lake, from_frame, rtol=1e-5)
+
+
+def test_projected_lake_training_predicts_as_the_dataframe_path(lake, frame):
+    drops = FRAME_DROPS + ['day_of_week']
+    from_frame = train_xgboost_model(frame.copy(), features_to_drop=drops, n_jobs=1)
+    from_lake = train_from_lake(lake, n_jobs=1, feature_names=projected_features(drops))
+
+    np.testing.assert_allclose(from_lake, from_frame, rtol=1e-5)
+
+
+def test_horizon_training_predicts_as_the_dataframe_path(lake, frame):
+    from_frame = train_xgboost_horizons(frame.copy(), [1, 7], n_jobs=1)
+    from_lake = train_from_lake(lake, n_jobs=1, horizons=[1, 7])
+
+    assert from_lake == pytest.approx(from_frame, rel=1e-5)